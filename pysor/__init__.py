@@ -14,8 +14,45 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from ._version import get_versions
-__version__ = get_versions()['version']
-del get_versions
 
-from .api import sor
+r"""Solve Poisson's equation with successive over-relaxation.
+
+The submodules and the compiled extension are imported on first use (PEP 562), so
+importing the package is cheap and runs no subprocesses; __version__ is resolved on first
+access, too, and is a static string in built packages.
+
+"""
+
+_attributes = dict(
+    sor=('api', 'sor'),
+    sor_batch=('api', 'sor_batch'),
+    sor_async=('aio', 'sor_async'),
+    Solver=('solver', 'Solver'),
+    SolutionCache=('cache', 'SolutionCache'),
+    DiskCache=('cache', 'DiskCache'),
+    tune=('tuning', 'tune'),
+    plan_cost=('cost', 'plan_cost'))
+
+_submodules = (
+    'api', 'backends', 'tuning', 'cost', 'parallel', 'scheduler', 'server', 'domain',
+    'distributed', 'benchmarks')
+
+__all__ = sorted(_attributes) + list(_submodules) + ['__version__']
+
+def __getattr__(name):
+    import importlib
+    if name == '__version__':
+        from ._version import get_versions
+        value = get_versions()['version']
+    elif name in _attributes:
+        module, attribute = _attributes[name]
+        value = getattr(importlib.import_module('.' + module, __name__), attribute)
+    elif name in _submodules:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
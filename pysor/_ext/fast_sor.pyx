@@ -14,58 +14,387 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import mmap
 import numpy as np
 cimport numpy as np
+from libc.stdint cimport int64_t
+from libc.math cimport INFINITY
 
 cdef extern from "src_fast_sor.h":
-    double _sor_step_1d(double *phi, double *rho, int n, double w, double he)
-    double _sor_step_2d(double *phi, double *rho, int n, double w, double he)
-    double _sor_step_3d(double *phi, double *rho, int n, double w, double he)
+    enum: LAYOUT_NATURAL
+    enum: LAYOUT_REDBLACK
+    double _sor_sweep_1d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1)
+    double _sor_sweep_2d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1)
+    double _sor_sweep_3d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1)
+    double _sor_sweep_slice(double *phi, double *rho, int dim, int64_t n, double w, double he, int parity, int *kinds, double *values) nogil
+    int _has_openmp()
+    int _max_threads()
+    void _first_touch(double *dst, double *src, int64_t n, int64_t size, int threads) nogil
+    double _sor_step_parallel(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values, double *errors, int threads) nogil
+    void _sor_batch(double *phi, double *rho, int dim, int64_t n, int64_t batch, double w, double he, int *kinds, double *values, int64_t maxiter, double maxerr, int64_t *iterations, int threads) nogil
+    int64_t _sor_iterate(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values, int64_t maxiter, double maxerr, int layout, double *errors, int threads, int *cancel, double budget, double *error) nogil
+    void _sor_step_multi(double *phi, double *rho, int64_t n, int64_t K, double *w, double he, int *kinds, double *values, double *work, double *error) nogil
+    void _pack_rb(double *natural, double *rb, int dim, int64_t n, int ghosts)
+    void _unpack_rb(double *rb, double *natural, int dim, int64_t n, int ghosts)
+
+cdef check_ghost_layout(np.ndarray phi, np.ndarray rho, np.ndarray kinds, np.ndarray values=None):
+    cdef int d
+    for d in range(rho.ndim):
+        if phi.shape[d] != rho.shape[d] + 2 or rho.shape[d] != rho.shape[0]:
+            raise ValueError("phi must be of shape=(n + 2,) * dim for rho of shape=(n,) * dim")
+    if kinds.shape[0] != rho.ndim or \
+        (values is not None and (values.shape[0] != rho.ndim or values.shape[1] != 2)):
+        raise ValueError("kinds must be of shape=(dim,) and values of shape=(dim, 2)")
+
+cdef check_range(np.ndarray rho, Py_ssize_t start, Py_ssize_t stop):
+    if start < 0 or stop > rho.shape[0] or start > stop:
+        raise ValueError("require 0 <= start <= stop <= n; got start=%d, stop=%d" % (start, stop))
+
+cdef check_cancel(np.ndarray cancel):
+    if cancel is not None and (cancel.dtype != np.intc or cancel.size != 1):
+        raise ValueError("cancel must be of shape=(1,) and dtype=numpy.intc")
+
+#   Run _sor_iterate without the GIL and return the number of iterations and the squared
+#   change of the last one; threads <= 0 uses all available threads. The iteration stops
+#   once budget seconds have passed or another thread sets cancel[0] to nonzero.
+
+cdef iterate(
+    np.ndarray phi, np.ndarray rho, Py_ssize_t n,
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray kinds, np.ndarray values, int layout, int threads, np.ndarray cancel,
+    double budget):
+    cdef:
+        int dim = rho.ndim if layout == LAYOUT_NATURAL else rho.ndim - 1
+        double *p = <double*> np.PyArray_DATA(phi)
+        double *r = <double*> np.PyArray_DATA(rho)
+        int *k = <int*> np.PyArray_DATA(kinds)
+        double *v = <double*> np.PyArray_DATA(values)
+        np.ndarray errors = np.zeros(shape=(n if threads != 1 else 0,), dtype=np.float64)
+        double *e = <double*> np.PyArray_DATA(errors)
+        int *c = NULL
+        int64_t iterations
+        double error
+    check_cancel(cancel)
+    if cancel is not None:
+        c = <int*> np.PyArray_DATA(cancel)
+    with nogil:
+        iterations = _sor_iterate(
+            p, r, dim, n, w, he, k, v, maxiter, maxerr, layout, e, threads, c, budget, &error)
+    return iterations, error
 
 def sor_1d(
     np.ndarray[double, ndim=1, mode='c'] phi not None,
     np.ndarray[double, ndim=1, mode='c'] rho not None,
-    double w, double he, int maxiter, double maxerr):
-    cdef:
-        int i
-        double error
-    for i in range(maxiter):
-        error = _sor_step_1d(
-            <double*> np.PyArray_DATA(phi),
-            <double*> np.PyArray_DATA(rho),
-            phi.shape[0], w, he)
-        if error < maxerr:
-            break
-    return phi
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None,
+    np.ndarray cancel=None, double budget=INFINITY):
+    check_ghost_layout(phi, rho, kinds, values)
+    return iterate(
+        phi, rho, rho.shape[0], w, he, maxiter, maxerr, kinds, values, LAYOUT_NATURAL, 1,
+        cancel, budget)
 
 def sor_2d(
     np.ndarray[double, ndim=2, mode='c'] phi not None,
     np.ndarray[double, ndim=2, mode='c'] rho not None,
-    double w, double he, int maxiter, double maxerr):
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None,
+    int threads=1, np.ndarray cancel=None, double budget=INFINITY):
+    check_ghost_layout(phi, rho, kinds, values)
+    return iterate(
+        phi, rho, rho.shape[0], w, he, maxiter, maxerr, kinds, values, LAYOUT_NATURAL, threads,
+        cancel, budget)
+
+def sor_3d(
+    np.ndarray[double, ndim=3, mode='c'] phi not None,
+    np.ndarray[double, ndim=3, mode='c'] rho not None,
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None,
+    int threads=1, np.ndarray cancel=None, double budget=INFINITY):
+    check_ghost_layout(phi, rho, kinds, values)
+    return iterate(
+        phi, rho, rho.shape[0], w, he, maxiter, maxerr, kinds, values, LAYOUT_NATURAL, threads,
+        cancel, budget)
+
+def sor_batch(
+    np.ndarray phi not None,
+    np.ndarray rho not None,
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None,
+    int threads=1):
+    r"""Run sor_1d, sor_2d, or sor_3d on each member of a stack of padded grids phi with
+    charge densities rho, in parallel across the members; returns the number of iterations
+    of each member."""
     cdef:
-        int i
-        double error
+        int dim = rho.ndim - 1
+        int64_t n = rho.shape[1] if dim > 0 else 0
+        int64_t batch = rho.shape[0]
+        np.ndarray[np.int64_t, ndim=1, mode='c'] iterations = np.zeros(shape=(batch,), dtype=np.int64)
+        double *p
+        double *r
+        int *k
+        double *v
+        int64_t *it
+    check_contiguous(phi)
+    check_contiguous(rho)
+    if dim not in (1, 2, 3) or (<object> rho).shape != (batch,) + (n,) * dim or \
+        (<object> phi).shape != (batch,) + (n + 2,) * dim:
+        raise ValueError("phi must be of shape=(batch,) + (n + 2,) * dim for rho of shape=(batch,) + (n,) * dim")
+    if kinds.shape[0] != dim or values.shape[0] != dim or values.shape[1] != 2:
+        raise ValueError("kinds must be of shape=(dim,) and values of shape=(dim, 2)")
+    p = <double*> np.PyArray_DATA(phi)
+    r = <double*> np.PyArray_DATA(rho)
+    k = <int*> np.PyArray_DATA(kinds)
+    v = <double*> np.PyArray_DATA(values)
+    it = <int64_t*> np.PyArray_DATA(iterations)
+    with nogil:
+        _sor_batch(p, r, dim, n, batch, w, he, k, v, maxiter, maxerr, it, threads)
+    return iterations
+
+def sor_multi_3d(
+    np.ndarray[double, ndim=4, mode='c'] phi not None,
+    np.ndarray[double, ndim=4, mode='c'] rho not None,
+    double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None):
+    r"""Run sor_3d on the K grids phi[..., l] with charge densities rho[..., l] at once,
+    see src_fast_sor.c; each grid stops as soon as it has converged, so grid l equals the
+    result of sor_3d(phi[..., l], rho[..., l], ...). Returns the number of iterations of
+    each grid."""
+    cdef:
+        Py_ssize_t i, l
+        int64_t n = rho.shape[0], K = rho.shape[3]
+        np.ndarray[double, ndim=1, mode='c'] wl = np.full(shape=(K,), fill_value=w, dtype=np.float64)
+        np.ndarray[double, ndim=1, mode='c'] errors = np.zeros(shape=(K,), dtype=np.float64)
+        np.ndarray[double, ndim=1, mode='c'] work = np.zeros(shape=(2 * K,), dtype=np.float64)
+        np.ndarray[np.int64_t, ndim=1, mode='c'] iterations = np.zeros(shape=(K,), dtype=np.int64)
+        Py_ssize_t active = K
+    if (<object> rho).shape != (n, n, n, K) or (<object> phi).shape != (n + 2, n + 2, n + 2, K):
+        raise ValueError("phi must be of shape=(n + 2, n + 2, n + 2, K) for rho of shape=(n, n, n, K)")
+    if kinds.shape[0] != 3 or values.shape[0] != 3 or values.shape[1] != 2:
+        raise ValueError("kinds must be of shape=(3,) and values of shape=(3, 2)")
     for i in range(maxiter):
-        error = _sor_step_2d(
+        if active == 0:
+            break
+        _sor_step_multi(
             <double*> np.PyArray_DATA(phi),
             <double*> np.PyArray_DATA(rho),
-            phi.shape[0], w, he)
-        if error < maxerr:
-            break
-    return phi
+            n, K,
+            <double*> np.PyArray_DATA(wl), he,
+            <int*> np.PyArray_DATA(kinds),
+            <double*> np.PyArray_DATA(values),
+            <double*> np.PyArray_DATA(work),
+            <double*> np.PyArray_DATA(errors))
+        for l in range(K):
+            if wl[l] != 0.0:
+                iterations[l] += 1
+                if errors[l] < maxerr:
+                    wl[l] = 0.0
+                    active -= 1
+    return iterations
 
-def sor_3d(
+def has_openmp():
+    r"""Whether the extension was compiled with OpenMP, i.e., threads != 1 has an effect."""
+    return bool(_has_openmp())
+
+def max_threads():
+    r"""The number of threads used by the parallel kernels for threads <= 0."""
+    return _max_threads()
+
+def first_touch(np.ndarray dst not None, src, bint ghosts, int threads):
+    r"""Fill dst with zeros (src=None) or a copy of src, splitting the first axis among the
+    threads like the parallel sweeps, so the pages end up close to the sweeping threads.
+
+    With ghosts, dst is a padded grid whose ghost slices along the first axis are zeroed by
+    the calling thread and src (if given) covers the interior slices."""
+    cdef:
+        np.ndarray source = None
+        int64_t n = dst.shape[0] - 2 * ghosts
+        int64_t size = dst.size // dst.shape[0] if dst.shape[0] > 0 else 0
+        double *d = <double*> np.PyArray_DATA(dst)
+        double *s = NULL
+    check_contiguous(dst)
+    if src is not None:
+        source = np.ascontiguousarray(src, dtype=np.float64)
+        if source.size != n * size:
+            raise ValueError("src must have %d entries; got %d" % (n * size, source.size))
+        s = <double*> np.PyArray_DATA(source)
+    if ghosts:
+        dst[0] = 0.0
+        dst[dst.shape[0] - 1] = 0.0
+        d += size
+    with nogil:
+        _first_touch(d, s, n, size, threads)
+    return dst
+
+ALIGNMENT = 64
+HUGE_PAGE = 1 << 21
+
+def empty_aligned(shape, alignment=ALIGNMENT, huge_pages=False):
+    r"""An uninitialized float64 array whose data starts at a multiple of alignment bytes.
+
+    With huge_pages, the array is carved out of an anonymous memory map aligned to 2 MiB
+    and advised to use transparent huge pages where the platform supports it. In either
+    case, the pages of large arrays are only faulted in when first written, which should
+    happen via first_touch() from the threads that later sweep them.
+
+    """
+    shape = (int(shape),) if np.ndim(shape) == 0 else tuple(shape)
+    if alignment < 8 or alignment & (alignment - 1):
+        raise ValueError("alignment must be a power of two >= 8; got %d" % alignment)
+    nbytes = 8 * int(np.prod(shape, dtype=np.int64))
+    if huge_pages:
+        alignment = max(alignment, HUGE_PAGE)
+        buf = mmap.mmap(-1, nbytes + alignment)
+        raw = np.frombuffer(buf, dtype=np.uint8)
+    else:
+        raw = np.empty(shape=(nbytes + alignment,), dtype=np.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    if huge_pages and nbytes > 0 and hasattr(buf, 'madvise') and hasattr(mmap, 'MADV_HUGEPAGE'):
+        buf.madvise(mmap.MADV_HUGEPAGE, offset, nbytes)
+    return raw[offset:offset + nbytes].view(np.float64).reshape(shape)
+
+#   The sweeps update the cells of one color in the cells (rows, planes) start <= i < stop
+#   along the first axis without refreshing the ghost layer, e.g., for slab-wise updates;
+#   they return the accumulated squared change.
+
+def sweep_1d(
+    np.ndarray[double, ndim=1, mode='c'] phi not None,
+    np.ndarray[double, ndim=1, mode='c'] rho not None,
+    double w, double he, int color,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    Py_ssize_t start, Py_ssize_t stop):
+    check_ghost_layout(phi, rho, kinds)
+    check_range(rho, start, stop)
+    return _sor_sweep_1d(
+        <double*> np.PyArray_DATA(phi),
+        <double*> np.PyArray_DATA(rho),
+        rho.shape[0], w, he, color,
+        <int*> np.PyArray_DATA(kinds),
+        start, stop)
+
+def sweep_2d(
+    np.ndarray[double, ndim=2, mode='c'] phi not None,
+    np.ndarray[double, ndim=2, mode='c'] rho not None,
+    double w, double he, int color,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    Py_ssize_t start, Py_ssize_t stop):
+    check_ghost_layout(phi, rho, kinds)
+    check_range(rho, start, stop)
+    return _sor_sweep_2d(
+        <double*> np.PyArray_DATA(phi),
+        <double*> np.PyArray_DATA(rho),
+        rho.shape[0], w, he, color,
+        <int*> np.PyArray_DATA(kinds),
+        start, stop)
+
+def sweep_3d(
     np.ndarray[double, ndim=3, mode='c'] phi not None,
     np.ndarray[double, ndim=3, mode='c'] rho not None,
-    double w, double he, int maxiter, double maxerr):
+    double w, double he, int color,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    Py_ssize_t start, Py_ssize_t stop):
+    check_ghost_layout(phi, rho, kinds)
+    check_range(rho, start, stop)
+    return _sor_sweep_3d(
+        <double*> np.PyArray_DATA(phi),
+        <double*> np.PyArray_DATA(rho),
+        rho.shape[0], w, he, color,
+        <int*> np.PyArray_DATA(kinds),
+        start, stop)
+
+def sweep_slice(
+    np.ndarray phi not None,
+    np.ndarray rho not None,
+    double w, double he, int parity,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None):
+    r"""Update one row (plane) phi[1] of a 2D (3D) window of three adjacent padded rows
+    (planes), see src_fast_sor.c; returns the accumulated squared change."""
     cdef:
-        int i
+        int dim = phi.ndim
+        Py_ssize_t n = rho.shape[0]
+        double *p
+        double *r
+        int *k
+        double *v
         double error
-    for i in range(maxiter):
-        error = _sor_step_3d(
-            <double*> np.PyArray_DATA(phi),
-            <double*> np.PyArray_DATA(rho),
-            phi.shape[0], w, he)
-        if error < maxerr:
-            break
-    return phi
+    check_contiguous(phi)
+    check_contiguous(rho)
+    if dim not in (2, 3) or (<object> phi).shape != (3,) + (n + 2,) * (dim - 1) or \
+        (<object> rho).shape != (n,) * (dim - 1):
+        raise ValueError("phi must be of shape=(3,) + (n + 2,) * (dim - 1) for rho of shape=(n,) * (dim - 1)")
+    if kinds.shape[0] != dim or values.shape[0] != dim or values.shape[1] != 2:
+        raise ValueError("kinds must be of shape=(dim,) and values of shape=(dim, 2)")
+    p = <double*> np.PyArray_DATA(phi) + phi.strides[0] // sizeof(double)
+    r = <double*> np.PyArray_DATA(rho)
+    k = <int*> np.PyArray_DATA(kinds)
+    v = <double*> np.PyArray_DATA(values)
+    with nogil:
+        error = _sor_sweep_slice(p, r, dim, n, w, he, parity, k, v)
+    return error
+
+#   The red/black layout keeps both colors of the padded grid in separate contiguous
+#   arrays, stacked along the first axis, see src_fast_sor.c for the index mapping.
+
+def rb_shape(Py_ssize_t n, int dim):
+    r"""The shape of a padded (n,) * dim grid in the red/black layout."""
+    return (2,) + (n + 2,) * (dim - 1) + ((n + 3) // 2,)
+
+cdef check_contiguous(np.ndarray a):
+    if a.dtype != np.float64 or not a.flags.c_contiguous:
+        raise ValueError("arrays must be C-contiguous and of dtype=numpy.float64")
+
+cdef check_rb_layout(np.ndarray natural, np.ndarray rb, int ghosts):
+    check_contiguous(natural)
+    check_contiguous(rb)
+    if natural.ndim not in (1, 2, 3):
+        raise ValueError("dimensionality must be 1, 2, 3; got %d" % natural.ndim)
+    n = natural.shape[0] - 2 * ghosts
+    if natural.shape[0] != natural.shape[natural.ndim - 1] or \
+        (<object> rb).shape != rb_shape(n, natural.ndim):
+        raise ValueError("rb must be of shape=%s" % (rb_shape(n, natural.ndim),))
+    return n
+
+def pack_rb(
+    np.ndarray natural not None,
+    np.ndarray rb not None,
+    bint ghosts):
+    n = check_rb_layout(natural, rb, ghosts)
+    _pack_rb(
+        <double*> np.PyArray_DATA(natural),
+        <double*> np.PyArray_DATA(rb),
+        natural.ndim, n, ghosts)
+    return rb
+
+def unpack_rb(
+    np.ndarray rb not None,
+    np.ndarray natural not None,
+    bint ghosts):
+    n = check_rb_layout(natural, rb, ghosts)
+    _unpack_rb(
+        <double*> np.PyArray_DATA(rb),
+        <double*> np.PyArray_DATA(natural),
+        natural.ndim, n, ghosts)
+    return natural
+
+def sor_rb(
+    np.ndarray phi not None,
+    np.ndarray rho not None,
+    Py_ssize_t n, double w, double he, Py_ssize_t maxiter, double maxerr,
+    np.ndarray[int, ndim=1, mode='c'] kinds not None,
+    np.ndarray[double, ndim=2, mode='c'] values not None,
+    np.ndarray cancel=None, double budget=INFINITY):
+    cdef int dim = phi.ndim - 1
+    check_contiguous(phi)
+    check_contiguous(rho)
+    if dim not in (1, 2, 3) or (<object> phi).shape != rb_shape(n, dim) or \
+        (<object> rho).shape != rb_shape(n, dim):
+        raise ValueError("phi and rho must be of shape=rb_shape(n, dim)")
+    if kinds.shape[0] != dim or values.shape[0] != dim or values.shape[1] != 2:
+        raise ValueError("kinds must be of shape=(dim,) and values of shape=(dim, 2)")
+    return iterate(
+        phi, rho, n, w, he, maxiter, maxerr, kinds, values, LAYOUT_REDBLACK, 1, cancel, budget)
@@ -15,106 +15,803 @@
 *   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 */
 
-inline int even(int value) { return (value % 2 == 0) ? 1 : 0; }
+#define _POSIX_C_SOURCE 199309L
 
-inline int pbc(int i, int n) {
-    while(i >= n) i -= n;
-    while(i < 0) i += n;
-    return i;
+#include <math.h>
+#include <string.h>
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+#include "src_fast_sor.h"
+
+/*  All potential grids carry one ghost cell on either side of each axis, i.e., phi has
+*   (n + 2)^dim entries while rho has n^dim entries. The ghost layer is refreshed from the
+*   boundary conditions before each half-sweep, so the sweeps never wrap indices. Indices
+*   and sizes are 64 bit wide since n^3 exceeds the int range from n = 1291 on.
+*/
+
+static inline double sqr(double value) { return value * value; }
+
+static inline int64_t map2d(int64_t i, int64_t j, int64_t n) { return i * n + j; }
+
+static inline int64_t map3d(int64_t i, int64_t j, int64_t k, int64_t n) { return n * map2d(i, j, n) + k; }
+
+/*  Refresh both ghost faces of one axis with stride sa; the faces are spanned by nb x nc
+*   interior cells with strides sb and sc (use nc=1, sc=0 for faces of lower dimension).
+*/
+static void refresh_axis(
+    double *phi, int64_t n, int kind, double low, double high,
+    int64_t sa, int64_t sb, int64_t nb, int64_t sc, int64_t nc) {
+    int64_t j, k;
+    double *p;
+    for(j=0; j<nb; ++j) {
+        for(k=0; k<nc; ++k) {
+            p = phi + (j + 1) * sb + (k + 1) * sc;
+            switch(kind) {
+                case BC_PERIODIC:
+                    p[0] = p[n * sa];
+                    p[(n + 1) * sa] = p[sa];
+                    break;
+                case BC_DIRICHLET:
+                    p[0] = low;
+                    p[(n + 1) * sa] = high;
+                    break;
+                case BC_NEUMANN:
+                    p[0] = p[sa] + low;
+                    p[(n + 1) * sa] = p[n * sa] + high;
+                    break;
+            }
+        }
+    }
 }
 
-inline double sqr(double value) { return (value == 0.0) ? 0.0 : value * value; }
+void _refresh_ghosts_1d(double *phi, int64_t n, int *kinds, double *values) {
+    refresh_axis(phi, n, kinds[0], values[0], values[1], 1, 0, 1, 0, 1);
+}
 
-double _sor_step_1d(double *phi, double *rho, int n, double w, double he) {
-    int i;
-    double phi_i, error = 0.0;
-    for(i=0; i<n; ++i) {
-        if(even(i) == 1) continue;
-        phi_i = 0.5 * (phi[pbc(i - 1, n)] + phi[pbc(i + 1, n)] + rho[i] * he);
-        phi[i] = (1.0 - w) * phi[i] + w * phi_i;
-        error += sqr(phi[i] - phi_i);
+void _refresh_ghosts_2d(double *phi, int64_t n, int *kinds, double *values) {
+    int64_t N = n + 2;
+    refresh_axis(phi, n, kinds[0], values[0], values[1], N, 1, n, 0, 1);
+    refresh_axis(phi, n, kinds[1], values[2], values[3], 1, N, n, 0, 1);
+}
+
+void _refresh_ghosts_3d(double *phi, int64_t n, int *kinds, double *values) {
+    int64_t N = n + 2;
+    refresh_axis(phi, n, kinds[0], values[0], values[1], N * N, N, n, 1, n);
+    refresh_axis(phi, n, kinds[1], values[2], values[3], N, N * N, n, 1, n);
+    refresh_axis(phi, n, kinds[2], values[4], values[5], 1, N * N, n, N, n);
+}
+
+/*  Each sweep updates the cells of one color, i.e., the cells whose (unpadded) index sum
+*   has the parity of color, and returns the accumulated squared change. For odd n, cells
+*   on opposite faces of a periodic axis share the same color; as soon as the low face is
+*   updated it is mirrored into the high ghost layer to keep the in-place update order.
+*/
+
+static inline int seam(int64_t n, int kind) { return (n % 2 == 1) && (kind == BC_PERIODIC); }
+
+static inline double cell_1d(double *p, double r, double w, double he) {
+    double phi_i = 0.5 * (p[-1] + p[1] + r * he);
+    p[0] = (1.0 - w) * p[0] + w * phi_i;
+    return sqr(p[0] - phi_i);
+}
+
+static inline double cell_2d(double *p, double r, int64_t N, double w, double he) {
+    double phi_ij = 0.25 * (p[-N] + p[N] + p[-1] + p[1] + r * he);
+    p[0] = (1.0 - w) * p[0] + w * phi_ij;
+    return sqr(p[0] - phi_ij);
+}
+
+static inline double cell_3d(double *p, double r, int64_t N, int64_t NN, double w, double he) {
+    double phi_ijk = 0.166666666666666657 * (
+        p[-NN] + p[NN] + p[-N] + p[N] + p[-1] + p[1] + r * he);
+    p[0] = (1.0 - w) * p[0] + w * phi_ijk;
+    return sqr(p[0] - phi_ijk);
+}
+
+/*  The row (plane) kernels update one padded row (plane) phi of a 2D (3D) grid with the
+*   unpadded charge density row (plane) rho: only cells whose index sum along the remaining
+*   axes has the given parity are updated, and the seams of these axes are mirrored.
+*/
+
+double _sor_sweep_row_2d(double *phi, double *rho, int64_t n, double w, double he, int parity, int *kinds) {
+    int64_t j = parity, N = n + 2;
+    double *p = phi + 1, error = 0.0;
+    if(j == 0 && seam(n, kinds[1])) {
+        error += cell_2d(p, rho[0], N, w, he);
+        p[n] = p[0];
+        j = 2;
     }
-    for(i=0; i<n; ++i) {
-        if(even(i) == 0) continue;
-        phi_i = 0.5 * (phi[pbc(i - 1, n)] + phi[pbc(i + 1, n)] + rho[i] * he);
-        phi[i] = (1.0 - w) * phi[i] + w * phi_i;
-        error += sqr(phi[i] - phi_i);
+    for(; j<n; j+=2)
+        error += cell_2d(p + j, rho[j], N, w, he);
+    return error;
+}
+
+double _sor_sweep_plane_3d(double *phi, double *rho, int64_t n, double w, double he, int parity, int *kinds) {
+    int64_t j, k, N = n + 2, NN = N * N;
+    int seam_j = seam(n, kinds[1]), seam_k = seam(n, kinds[2]);
+    double *p, *r, error = 0.0;
+    for(j=0; j<n; ++j) {
+        p = phi + map2d(j + 1, 1, N);
+        r = rho + map2d(j, 0, n);
+        k = (j + parity) % 2;
+        if(k == 0 && seam_k) {
+            error += cell_3d(p, r[0], N, NN, w, he);
+            p[n] = p[0];
+            k = 2;
+        }
+        for(; k<n; k+=2)
+            error += cell_3d(p + k, r[k], N, NN, w, he);
+        if(j == 0 && seam_j) {
+            for(k=0; k<n; ++k)
+                p[map2d(n, k, N)] = p[k];
+        }
     }
     return error;
 }
 
-inline int map2d(int i, int j, int n) { return i * n + j; }
+/*  The sweeps cover the cells (rows, planes) i0 <= i < i1 along the first axis.
+*/
 
-double _sor_step_2d(double *phi, double *rho, int n, double w, double he) {
-    int i, j;
-    double phi_ij, error = 0.0;
-    for(i=0; i<n; ++i) {
-        for(j=0; j<n; ++j) {
-            if(even(i + j) == 1) continue;
-            phi_ij = 0.25 * (
-                phi[map2d(pbc(i - 1, n), j, n)] +
-                phi[map2d(pbc(i + 1, n), j, n)] +
-                phi[map2d(i, pbc(j - 1, n), n)] +
-                phi[map2d(i, pbc(j + 1, n), n)] +
-                rho[map2d(i, j, n)] * he);
-            phi[map2d(i, j, n)] = (1.0 - w) * phi[map2d(i, j, n)] + w * phi_ij;
-            error += sqr(phi[map2d(i, j, n)] - phi_ij);          
+double _sor_sweep_1d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1) {
+    int64_t i = i0 + (i0 + color) % 2;
+    double *p = phi + 1, error = 0.0;
+    if(i == 0 && i1 > 0 && seam(n, kinds[0])) {
+        error += cell_1d(p, rho[0], w, he);
+        p[n] = p[0];
+        i = 2;
+    }
+    for(; i<i1; i+=2)
+        error += cell_1d(p + i, rho[i], w, he);
+    return error;
+}
+
+double _sor_sweep_2d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1) {
+    int64_t i, j, N = n + 2;
+    double *p, error = 0.0;
+    for(i=i0; i<i1; ++i) {
+        p = phi + map2d(i + 1, 0, N);
+        error += _sor_sweep_row_2d(p, rho + map2d(i, 0, n), n, w, he, (int) ((i + color) % 2), kinds);
+        if(i == 0 && seam(n, kinds[0])) {
+            for(j=1; j<=n; ++j)
+                p[map2d(n, j, N)] = p[j];
         }
     }
-    for(i=0; i<n; ++i) {
-        for(j=0; j<n; ++j) {
-            if(even(i + j) == 0) continue;
-            phi_ij = 0.25 * (
-                phi[map2d(pbc(i - 1, n), j, n)] +
-                phi[map2d(pbc(i + 1, n), j, n)] +
-                phi[map2d(i, pbc(j - 1, n), n)] +
-                phi[map2d(i, pbc(j + 1, n), n)] +
-                rho[map2d(i, j, n)] * he);
-            phi[map2d(i, j, n)] = (1.0 - w) * phi[map2d(i, j, n)] + w * phi_ij;
-            error += sqr(phi[map2d(i, j, n)] - phi_ij);          
+    return error;
+}
+
+double _sor_sweep_3d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1) {
+    int64_t i, j, k, N = n + 2;
+    double *p, error = 0.0;
+    for(i=i0; i<i1; ++i) {
+        p = phi + map3d(i + 1, 0, 0, N);
+        error += _sor_sweep_plane_3d(p, rho + map3d(i, 0, 0, n), n, w, he, (int) ((i + color) % 2), kinds);
+        if(i == 0 && seam(n, kinds[0])) {
+            for(j=1; j<=n; ++j) {
+                for(k=1; k<=n; ++k)
+                    p[map3d(n, j, k, N)] = p[map2d(j, k, N)];
+            }
         }
     }
     return error;
 }
 
-inline int map3d(int i, int j, int k, int n) { return n * map2d(i, j, n) + k; } 
+/*  Update the cells of the given parity in one padded row (dim=2) or plane (dim=3) phi
+*   whose neighbouring rows (planes) are adjacent in memory; the ghosts of the row (plane)
+*   are refreshed first, the ghost rows (planes) along the first axis are left to the caller.
+*/
+
+double _sor_sweep_slice(double *phi, double *rho, int dim, int64_t n, double w, double he, int parity, int *kinds, double *values) {
+    if(dim == 2) {
+        _refresh_ghosts_1d(phi, n, kinds + 1, values + 2);
+        return _sor_sweep_row_2d(phi, rho, n, w, he, parity, kinds);
+    }
+    _refresh_ghosts_2d(phi, n, kinds + 1, values + 2);
+    return _sor_sweep_plane_3d(phi, rho, n, w, he, parity, kinds);
+}
+
+/*  A full SOR step: the odd cells first, then the even cells.
+*/
 
-double _sor_step_3d(double *phi, double *rho, int n, double w, double he) {
-    int i, j, k;
-    double phi_ijk, error = 0.0;
+double _sor_step_1d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values) {
+    double error;
+    _refresh_ghosts_1d(phi, n, kinds, values);
+    error = _sor_sweep_1d(phi, rho, n, w, he, 1, kinds, 0, n);
+    _refresh_ghosts_1d(phi, n, kinds, values);
+    return error + _sor_sweep_1d(phi, rho, n, w, he, 0, kinds, 0, n);
+}
+
+double _sor_step_2d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values) {
+    double error;
+    _refresh_ghosts_2d(phi, n, kinds, values);
+    error = _sor_sweep_2d(phi, rho, n, w, he, 1, kinds, 0, n);
+    _refresh_ghosts_2d(phi, n, kinds, values);
+    return error + _sor_sweep_2d(phi, rho, n, w, he, 0, kinds, 0, n);
+}
+
+double _sor_step_3d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values) {
+    double error;
+    _refresh_ghosts_3d(phi, n, kinds, values);
+    error = _sor_sweep_3d(phi, rho, n, w, he, 1, kinds, 0, n);
+    _refresh_ghosts_3d(phi, n, kinds, values);
+    return error + _sor_sweep_3d(phi, rho, n, w, he, 0, kinds, 0, n);
+}
+
+/*  The parallel steps split the first axis statically among the threads, i.e., in the
+*   same way as _first_touch() distributes the slices, so each thread sweeps the memory it
+*   has touched first. The low seam slice is updated (and mirrored) before the others, and
+*   the squared changes are collected per slice and summed in order; thus, the result does
+*   not depend on the number of threads.
+*/
+
+int _has_openmp(void) {
+#ifdef _OPENMP
+    return 1;
+#else
+    return 0;
+#endif
+}
+
+int _max_threads(void) {
+#ifdef _OPENMP
+    return omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+static inline int team(int threads) { return (threads > 0) ? threads : _max_threads(); }
+
+void _first_touch(double *dst, double *src, int64_t n, int64_t size, int threads) {
+    int64_t i, k;
+    #pragma omp parallel for schedule(static) num_threads(team(threads)) private(k)
     for(i=0; i<n; ++i) {
-        for(j=0; j<n; ++j) {
-            for(k=0; k<n; ++k) {
-                if(even(i + j + k) == 1) continue;
-                phi_ijk = 0.166666666666666657 * (
-                    phi[map3d(pbc(i - 1, n), j, k, n)] +
-                    phi[map3d(pbc(i + 1, n), j, k, n)] +
-                    phi[map3d(i, pbc(j - 1, n), k, n)] +
-                    phi[map3d(i, pbc(j + 1, n), k, n)] +
-                    phi[map3d(i, j, pbc(k - 1, n), n)] +
-                    phi[map3d(i, j, pbc(k + 1, n), n)] +
-                    rho[map3d(i, j, k, n)] * he);
-                phi[map3d(i, j, k, n)] = (1.0 - w) * phi[map3d(i, j, k, n)] + w * phi_ijk;
-                error += sqr(phi[map3d(i, j, k, n)] - phi_ijk);                 
+        if(src == NULL) {
+            for(k=0; k<size; ++k) dst[i * size + k] = 0.0;
+        } else {
+            memcpy(dst + i * size, src + i * size, size * sizeof(double));
+        }
+    }
+}
+
+static double sweep_parallel(
+    double *phi, double *rho, int dim, int64_t n, double w, double he,
+    int color, int *kinds, double *errors, int threads) {
+    int64_t i, i0 = 0, S = (dim == 3) ? (n + 2) * (n + 2) : n + 2, R = (dim == 3) ? n * n : n;
+    double error = 0.0;
+    if(seam(n, kinds[0])) {
+        if(dim == 3) errors[0] = _sor_sweep_3d(phi, rho, n, w, he, color, kinds, 0, 1);
+        else errors[0] = _sor_sweep_2d(phi, rho, n, w, he, color, kinds, 0, 1);
+        i0 = 1;
+    }
+    #pragma omp parallel for schedule(static) num_threads(team(threads))
+    for(i=0; i<n; ++i) {
+        if(i < i0) continue;
+        if(dim == 3)
+            errors[i] = _sor_sweep_plane_3d(phi + (i + 1) * S, rho + i * R, n, w, he, (int) ((i + color) % 2), kinds);
+        else
+            errors[i] = _sor_sweep_row_2d(phi + (i + 1) * S, rho + i * R, n, w, he, (int) ((i + color) % 2), kinds);
+    }
+    for(i=0; i<n; ++i)
+        error += errors[i];
+    return error;
+}
+
+double _sor_step_parallel(
+    double *phi, double *rho, int dim, int64_t n, double w, double he,
+    int *kinds, double *values, double *errors, int threads) {
+    double error;
+    if(dim == 3) _refresh_ghosts_3d(phi, n, kinds, values);
+    else _refresh_ghosts_2d(phi, n, kinds, values);
+    error = sweep_parallel(phi, rho, dim, n, w, he, 1, kinds, errors, threads);
+    if(dim == 3) _refresh_ghosts_3d(phi, n, kinds, values);
+    else _refresh_ghosts_2d(phi, n, kinds, values);
+    return error + sweep_parallel(phi, rho, dim, n, w, he, 0, kinds, errors, threads);
+}
+
+/*  Solve a stack of independent grids of equal shape, one member per thread at a time;
+*   each member stops as soon as it has converged and reports its number of iterations.
+*/
+
+static double step(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values) {
+    if(dim == 1) return _sor_step_1d(phi, rho, n, w, he, kinds, values);
+    if(dim == 2) return _sor_step_2d(phi, rho, n, w, he, kinds, values);
+    return _sor_step_3d(phi, rho, n, w, he, kinds, values);
+}
+
+void _sor_batch(
+    double *phi, double *rho, int dim, int64_t n, int64_t batch, double w, double he,
+    int *kinds, double *values, int64_t maxiter, double maxerr, int64_t *iterations, int threads) {
+    int64_t b, i, d, P = 1, R = 1;
+    for(d=0; d<dim; ++d) {
+        P *= n + 2;
+        R *= n;
+    }
+    #pragma omp parallel for schedule(dynamic) num_threads(team(threads)) private(i)
+    for(b=0; b<batch; ++b) {
+        for(i=0; i<maxiter;) {
+            ++i;
+            if(step(phi + b * P, rho + b * R, dim, n, w, he, kinds, values) < maxerr)
+                break;
+        }
+        iterations[b] = i;
+    }
+}
+
+/*  Seconds on a monotonic clock with an arbitrary origin. */
+
+static double now(void) {
+#ifdef _WIN32
+    LARGE_INTEGER count, frequency;
+    QueryPerformanceCounter(&count);
+    QueryPerformanceFrequency(&frequency);
+    return (double) count.QuadPart / (double) frequency.QuadPart;
+#else
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return (double) t.tv_sec + 1.0E-9 * (double) t.tv_nsec;
+#endif
+}
+
+/*  Iterate on a single grid until the squared change drops below maxerr, for at most
+*   maxiter iterations; returns the number of iterations and stores the squared change of
+*   the last one in *error (infinity if there was none). The natural layout runs
+*   _sor_step_parallel with the buffer errors unless threads == 1. The loop stops before
+*   the next iteration once budget seconds have passed or *cancel is nonzero; the flag may
+*   be set by another thread at any time, and cancel may be NULL. The clock is only read
+*   for a finite budget, once per iteration, which is negligible against a sweep.
+*/
+
+int64_t _sor_iterate(
+    double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values,
+    int64_t maxiter, double maxerr, int layout, double *errors, int threads, int *cancel,
+    double budget, double *error) {
+    volatile int *stop = cancel;
+    double start = isinf(budget) ? 0.0 : now();
+    int64_t i;
+    *error = INFINITY;
+    for(i=0; i<maxiter; ++i) {
+        if(stop != NULL && *stop) break;
+        if(!isinf(budget) && now() - start >= budget) break;
+        if(layout == LAYOUT_REDBLACK)
+            *error = _sor_step_rb(phi, rho, dim, n, w, he, kinds, values);
+        else if(threads == 1)
+            *error = step(phi, rho, dim, n, w, he, kinds, values);
+        else
+            *error = _sor_step_parallel(phi, rho, dim, n, w, he, kinds, values, errors, threads);
+        if(*error < maxerr) return i + 1;
+    }
+    return i;
+}
+
+/*  Multiple right-hand sides: K grids sharing n and the boundary conditions are stored
+*   interleaved, i.e., phi[i][j][k][l] is cell (i, j, k) of grid l, so each stencil load
+*   serves all K grids in one SIMD loop. Each grid l has its own relaxation parameter w[l]
+*   and squared change error[l]; w[l] = 0 leaves grid l unchanged. Per grid, the update and
+*   summation order is that of _sor_step_3d.
+*/
+
+/*  Update the cells k0, k0 + 2, ... < n of a row p (rho row r) for the W grids starting
+*   at l0; W is a compile-time constant after inlining, so the squared changes of the row
+*   stay in vector registers.
+*/
+static inline void row_block(
+    double *p, double *r, int64_t n, int64_t k0, int64_t K, int64_t N, int64_t NN,
+    int64_t l0, const int W, double *w, double he, double *error) {
+    int64_t k;
+    int l;
+    double acc[8], wl[8];
+    for(l=0; l<W; ++l) {
+        acc[l] = error[l0 + l];
+        wl[l] = w[l0 + l];
+    }
+    for(k=k0; k<n; k+=2) {
+        double *q = p + k * K + l0, *s = r + k * K + l0;
+        #pragma omp simd
+        for(l=0; l<W; ++l) {
+            double phi_ijk = 0.166666666666666657 * (
+                q[l - NN] + q[l + NN] + q[l - N] + q[l + N] + q[l - K] + q[l + K] + s[l] * he);
+            q[l] = (1.0 - wl[l]) * q[l] + wl[l] * phi_ijk;
+            acc[l] += sqr(q[l] - phi_ijk);
+        }
+    }
+    for(l=0; l<W; ++l) error[l0 + l] = acc[l];
+}
+
+static inline void row_multi(
+    double *p, double *r, int64_t n, int64_t k0, int64_t K, int64_t N, int64_t NN,
+    double *w, double he, double *error) {
+    int64_t l0 = 0;
+    for(; l0+8<=K; l0+=8) row_block(p, r, n, k0, K, N, NN, l0, 8, w, he, error);
+    if(l0 + 4 <= K) {
+        row_block(p, r, n, k0, K, N, NN, l0, 4, w, he, error);
+        l0 += 4;
+    }
+    if(l0 + 2 <= K) {
+        row_block(p, r, n, k0, K, N, NN, l0, 2, w, he, error);
+        l0 += 2;
+    }
+    if(l0 < K) row_block(p, r, n, k0, K, N, NN, l0, 1, w, he, error);
+}
+
+/*  As refresh_axis() for K interleaved grids sharing the boundary conditions; the strides
+*   are given in cells.
+*/
+static void refresh_axis_multi(
+    double *phi, int64_t n, int64_t K, int kind, double low, double high,
+    int64_t sa, int64_t sb, int64_t nb, int64_t sc, int64_t nc) {
+    int64_t j, k, l;
+    double *p, *g0, *g1;
+    for(j=0; j<nb; ++j) {
+        for(k=0; k<nc; ++k) {
+            p = phi + ((j + 1) * sb + (k + 1) * sc) * K;
+            g0 = p;
+            g1 = p + (n + 1) * sa * K;
+            switch(kind) {
+                case BC_PERIODIC:
+                    for(l=0; l<K; ++l) {
+                        g0[l] = p[n * sa * K + l];
+                        g1[l] = p[sa * K + l];
+                    }
+                    break;
+                case BC_DIRICHLET:
+                    for(l=0; l<K; ++l) {
+                        g0[l] = low;
+                        g1[l] = high;
+                    }
+                    break;
+                case BC_NEUMANN:
+                    for(l=0; l<K; ++l) {
+                        g0[l] = p[sa * K + l] + low;
+                        g1[l] = p[n * sa * K + l] + high;
+                    }
+                    break;
             }
         }
     }
+}
+
+static void refresh_multi(double *phi, int64_t n, int64_t K, int *kinds, double *values) {
+    int64_t N = n + 2;
+    refresh_axis_multi(phi, n, K, kinds[0], values[0], values[1], N * N, N, n, 1, n);
+    refresh_axis_multi(phi, n, K, kinds[1], values[2], values[3], N, N * N, n, 1, n);
+    refresh_axis_multi(phi, n, K, kinds[2], values[4], values[5], 1, N * N, n, N, n);
+}
+
+static void sweep_multi(
+    double *phi, double *rho, int64_t n, int64_t K, double *w, double he,
+    int color, int *kinds, double *plane, double *error) {
+    int64_t i, j, k, l, N = (n + 2) * K, NN = (n + 2) * N;
+    int seam_i = seam(n, kinds[0]), seam_j = seam(n, kinds[1]), seam_k = seam(n, kinds[2]);
+    double *p, *r;
+    for(l=0; l<K; ++l) error[l] = 0.0;
     for(i=0; i<n; ++i) {
+        for(l=0; l<K; ++l) plane[l] = 0.0;
         for(j=0; j<n; ++j) {
-            for(k=0; k<n; ++k) {
-                if(even(i + j + k) == 0) continue;
-                phi_ijk = 0.166666666666666657 * (
-                    phi[map3d(pbc(i - 1, n), j, k, n)] +
-                    phi[map3d(pbc(i + 1, n), j, k, n)] +
-                    phi[map3d(i, pbc(j - 1, n), k, n)] +
-                    phi[map3d(i, pbc(j + 1, n), k, n)] +
-                    phi[map3d(i, j, pbc(k - 1, n), n)] +
-                    phi[map3d(i, j, pbc(k + 1, n), n)] +
-                    rho[map3d(i, j, k, n)] * he);
-                phi[map3d(i, j, k, n)] = (1.0 - w) * phi[map3d(i, j, k, n)] + w * phi_ijk;
-                error += sqr(phi[map3d(i, j, k, n)] - phi_ijk);                 
+            p = phi + (i + 1) * NN + (j + 1) * N + K;
+            r = rho + (i * n + j) * n * K;
+            k = (i + j + color) % 2;
+            if(k == 0 && seam_k) {
+                row_multi(p, r, 1, 0, K, N, NN, w, he, plane);
+                memcpy(p + n * K, p, K * sizeof(double));
+                k = 2;
             }
+            row_multi(p, r, n, k, K, N, NN, w, he, plane);
+            if(j == 0 && seam_j)
+                memcpy(p + n * N, p, n * K * sizeof(double));
+        }
+        for(l=0; l<K; ++l) error[l] += plane[l];
+        if(i == 0 && seam_i) {
+            for(j=1; j<=n; ++j)
+                memcpy(phi + (n + 1) * NN + j * N + K, phi + NN + j * N + K, n * K * sizeof(double));
         }
     }
+}
+
+void _sor_step_multi(
+    double *phi, double *rho, int64_t n, int64_t K, double *w, double he,
+    int *kinds, double *values, double *work, double *error) {
+    int64_t l;
+    refresh_multi(phi, n, K, kinds, values);
+    sweep_multi(phi, rho, n, K, w, he, 1, kinds, work, work + K);
+    refresh_multi(phi, n, K, kinds, values);
+    sweep_multi(phi, rho, n, K, w, he, 0, kinds, work, error);
+    for(l=0; l<K; ++l) error[l] = work[K + l] + error[l];
+}
+
+/*  Red/black layout: the padded grid is split by the parity of the padded index sum into
+*   two contiguous arrays of size S each, which store every other cell of a row, i.e.,
+*   cell (i, j, k) of parity q sits at [q][i][j][k / 2]. The neighbours along the leading
+*   axes share the position m = k / 2 in the opposite array, the neighbours along the last
+*   axis sit at m - 1 + s and m + s, where s = k % 2. Thus, all updates are unit-stride.
+*/
+
+static inline int64_t rb_half(int64_t n) { return (n + 3) / 2; }
+
+static inline int64_t rb_size(int dim, int64_t n) {
+    int64_t d, S = rb_half(n);
+    for(d=1; d<dim; ++d) S *= n + 2;
+    return S;
+}
+
+/*  Locate the row with leading coordinates x[0..dim-2]: afterwards, cell k of the row sits
+*   at rows[k % 2][k / 2].
+*/
+static inline void rb_rows(double *rb, int dim, int64_t n, int64_t *x, double **rows) {
+    int64_t d, parity = 0, row = 0;
+    for(d=0; d<dim-1; ++d) {
+        parity += x[d];
+        row = row * (n + 2) + x[d];
+    }
+    rows[parity & 1] = rb + row * rb_half(n);
+    rows[1 - (parity & 1)] = rb + rb_size(dim, n) + row * rb_half(n);
+}
+
+/*  Set the leading coordinates except axis to the index-th combination of interior cells,
+*   stopping at the leading axis first (exclusive).
+*/
+static inline void rb_lead(int64_t *x, int dim, int64_t n, int64_t first, int64_t axis, int64_t index) {
+    int64_t d;
+    for(d=dim-2; d>first; --d) {
+        if(d == axis) continue;
+        x[d] = 1 + index % n;
+        index /= n;
+    }
+}
+
+static inline int64_t rb_count(int dim, int64_t n, int64_t first, int64_t axis) {
+    int64_t d, count = 1;
+    for(d=dim-2; d>first; --d) {
+        if(d != axis) count *= n;
+    }
+    return count;
+}
+
+/*  Copy between a natural grid (padded if ghosts is 1, interior only if ghosts is 0)
+*   and the red/black layout, one row at a time.
+*/
+static void rb_copy(double *natural, double *rb, int dim, int64_t n, int ghosts, int pack) {
+    int64_t i, j, k, kk, x[2], o = 1 - ghosts, M = n + 2 * ghosts;
+    int64_t Mi = (dim > 2) ? M : 1, Mj = (dim > 1) ? M : 1;
+    double *rows[2], *p = natural;
+    for(i=0; i<Mi; ++i) {
+        for(j=0; j<Mj; ++j) {
+            if(dim > 2) x[0] = i + o;
+            if(dim > 1) x[dim - 2] = j + o;
+            rb_rows(rb, dim, n, x, rows);
+            for(k=0; k<M; ++k, ++p) {
+                kk = k + o;
+                if(pack) rows[kk & 1][kk >> 1] = *p;
+                else *p = rows[kk & 1][kk >> 1];
+            }
+        }
+    }
+}
+
+void _pack_rb(double *natural, double *rb, int dim, int64_t n, int ghosts) {
+    rb_copy(natural, rb, dim, n, ghosts, 1);
+}
+
+void _unpack_rb(double *rb, double *natural, int dim, int64_t n, int ghosts) {
+    rb_copy(natural, rb, dim, n, ghosts, 0);
+}
+
+/*  Assign the interior cells of row dst from row src according to the boundary kind, one
+*   half-row (cells k = 2m + t) at a time.
+*/
+static void rb_assign_row(double *rb, int dim, int64_t n, int64_t *dst, int64_t *src, int kind, double value) {
+    int64_t t, m, m1;
+    double *d[2], *s[2];
+    rb_rows(rb, dim, n, dst, d);
+    rb_rows(rb, dim, n, src, s);
+    for(t=0; t<2; ++t) {
+        m1 = (n - t) / 2;
+        switch(kind) {
+            case BC_PERIODIC:
+                for(m=1-t; m<=m1; ++m) d[t][m] = s[t][m];
+                break;
+            case BC_DIRICHLET:
+                for(m=1-t; m<=m1; ++m) d[t][m] = value;
+                break;
+            case BC_NEUMANN:
+                for(m=1-t; m<=m1; ++m) d[t][m] = s[t][m] + value;
+                break;
+        }
+    }
+}
+
+static void rb_refresh_leading(double *rb, int dim, int64_t n, int64_t axis, int kind, double low, double high) {
+    int64_t c, d, count = rb_count(dim, n, -1, axis), dst[2], src[2];
+    for(c=0; c<count; ++c) {
+        rb_lead(dst, dim, n, -1, axis, c);
+        for(d=0; d<dim-1; ++d) src[d] = dst[d];
+        dst[axis] = 0;
+        src[axis] = (kind == BC_PERIODIC) ? n : 1;
+        rb_assign_row(rb, dim, n, dst, src, kind, low);
+        dst[axis] = n + 1;
+        src[axis] = (kind == BC_PERIODIC) ? 1 : n;
+        rb_assign_row(rb, dim, n, dst, src, kind, high);
+    }
+}
+
+static void rb_refresh_last(double *rb, int dim, int64_t n, int kind, double low, double high) {
+    int64_t i, j, x[2], ni = (dim > 2) ? n : 1, nj = (dim > 1) ? n : 1;
+    int64_t lo = (n + 1) & 1, hi = (n + 1) >> 1;
+    double *rows[2];
+    for(i=1; i<=ni; ++i) {
+        for(j=1; j<=nj; ++j) {
+            if(dim > 2) x[0] = i;
+            if(dim > 1) x[dim - 2] = j;
+            rb_rows(rb, dim, n, x, rows);
+            switch(kind) {
+                case BC_PERIODIC:
+                    rows[0][0] = rows[n & 1][n >> 1];
+                    rows[lo][hi] = rows[1][0];
+                    break;
+                case BC_DIRICHLET:
+                    rows[0][0] = low;
+                    rows[lo][hi] = high;
+                    break;
+                case BC_NEUMANN:
+                    rows[0][0] = rows[1][0] + low;
+                    rows[lo][hi] = rows[n & 1][n >> 1] + high;
+                    break;
+            }
+        }
+    }
+}
+
+void _refresh_ghosts_rb(double *rb, int dim, int64_t n, int *kinds, double *values) {
+    int64_t axis;
+    for(axis=0; axis<dim-1; ++axis)
+        rb_refresh_leading(rb, dim, n, axis, kinds[axis], values[2 * axis], values[2 * axis + 1]);
+    rb_refresh_last(rb, dim, n, kinds[dim - 1], values[2 * dim - 2], values[2 * dim - 1]);
+}
+
+/*  Mirror the low face (padded index 1 along axis) behind the fixed leading coordinates
+*   x[0..axis-1] into the high ghost layer, see the seam handling of the natural sweeps.
+*/
+static void rb_mirror(double *rb, int dim, int64_t n, int64_t axis, int64_t *x) {
+    int64_t c, d, count, src[2];
+    double *rows[2];
+    if(axis == dim - 1) {
+        rb_rows(rb, dim, n, x, rows);
+        rows[(n + 1) & 1][(n + 1) >> 1] = rows[1][0];
+        return;
+    }
+    count = rb_count(dim, n, axis, -1);
+    for(c=0; c<count; ++c) {
+        rb_lead(x, dim, n, axis, -1, c);
+        for(d=0; d<dim-1; ++d) src[d] = x[d];
+        src[axis] = 1;
+        x[axis] = n + 1;
+        rb_assign_row(rb, dim, n, x, src, BC_PERIODIC, 0.0);
+    }
+}
+
+/*  Row kernels: d points to the updated row, o to the same row in the opposite array, r to
+*   the row of the packed charge density; a and b are the strides of the leading axes.
+*/
+
+static inline double row_rb_1d(
+    double *restrict d, double *restrict o, double *restrict r,
+    int64_t s, int64_t m0, int64_t m1, double w, double he) {
+    int64_t m;
+    double error = 0.0;
+    #pragma omp simd reduction(+:error)
+    for(m=m0; m<=m1; ++m) {
+        double phi_i = 0.5 * (o[m - 1 + s] + o[m + s] + r[m] * he);
+        d[m] = (1.0 - w) * d[m] + w * phi_i;
+        error += sqr(d[m] - phi_i);
+    }
+    return error;
+}
+
+static inline double row_rb_2d(
+    double *restrict d, double *restrict o, double *restrict r, int64_t a,
+    int64_t s, int64_t m0, int64_t m1, double w, double he) {
+    int64_t m;
+    double error = 0.0;
+    #pragma omp simd reduction(+:error)
+    for(m=m0; m<=m1; ++m) {
+        double phi_ij = 0.25 * (o[m - a] + o[m + a] + o[m - 1 + s] + o[m + s] + r[m] * he);
+        d[m] = (1.0 - w) * d[m] + w * phi_ij;
+        error += sqr(d[m] - phi_ij);
+    }
+    return error;
+}
+
+static inline double row_rb_3d(
+    double *restrict d, double *restrict o, double *restrict r, int64_t a, int64_t b,
+    int64_t s, int64_t m0, int64_t m1, double w, double he) {
+    int64_t m;
+    double error = 0.0;
+    #pragma omp simd reduction(+:error)
+    for(m=m0; m<=m1; ++m) {
+        double phi_ijk = 0.166666666666666657 * (
+            o[m - a] + o[m + a] + o[m - b] + o[m + b] + o[m - 1 + s] + o[m + s] + r[m] * he);
+        d[m] = (1.0 - w) * d[m] + w * phi_ijk;
+        error += sqr(d[m] - phi_ijk);
+    }
+    return error;
+}
+
+/*  The red/black sweeps take the color as the parity of the unpadded index sum like the
+*   natural sweeps; a row of last-axis parity s covers the interior from m0 = 1 - s to
+*   (n - s) / 2. For odd n, the first cell of a row is peeled off to mirror the seam.
+*/
+
+double _sor_sweep_rb_1d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds) {
+    int64_t S = rb_size(1, n), q = (color + 1) & 1, s = q, m0 = 1 - s, x[1];
+    double *d = phi + q * S, *o = phi + (1 - q) * S, *r = rho + q * S, error = 0.0;
+    if(m0 == 0 && seam(n, kinds[0])) {
+        error += row_rb_1d(d, o, r, s, 0, 0, w, he);
+        rb_mirror(phi, 1, n, 0, x);
+        m0 = 1;
+    }
+    return error + row_rb_1d(d, o, r, s, m0, (n - s) / 2, w, he);
+}
+
+double _sor_sweep_rb_2d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds) {
+    int64_t i, s, m0, row, H = rb_half(n), S = rb_size(2, n), q = color & 1, x[2];
+    int seam_i = seam(n, kinds[0]), seam_j = seam(n, kinds[1]);
+    double *d = phi + q * S, *o = phi + (1 - q) * S, *r = rho + q * S, error = 0.0;
+    for(i=1; i<=n; ++i) {
+        s = (q + i) & 1;
+        m0 = 1 - s;
+        row = i * H;
+        if(m0 == 0 && seam_j) {
+            error += row_rb_2d(d + row, o + row, r + row, H, s, 0, 0, w, he);
+            x[0] = i;
+            rb_mirror(phi, 2, n, 1, x);
+            m0 = 1;
+        }
+        error += row_rb_2d(d + row, o + row, r + row, H, s, m0, (n - s) / 2, w, he);
+        if(i == 1 && seam_i)
+            rb_mirror(phi, 2, n, 0, x);
+    }
+    return error;
+}
+
+double _sor_sweep_rb_3d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds) {
+    int64_t i, j, s, m0, row, N = n + 2, H = rb_half(n), S = rb_size(3, n), q = (color + 1) & 1, x[3];
+    int seam_i = seam(n, kinds[0]), seam_j = seam(n, kinds[1]), seam_k = seam(n, kinds[2]);
+    double *d = phi + q * S, *o = phi + (1 - q) * S, *r = rho + q * S, error = 0.0;
+    for(i=1; i<=n; ++i) {
+        for(j=1; j<=n; ++j) {
+            s = (q + i + j) & 1;
+            m0 = 1 - s;
+            row = (i * N + j) * H;
+            if(m0 == 0 && seam_k) {
+                error += row_rb_3d(d + row, o + row, r + row, N * H, H, s, 0, 0, w, he);
+                x[0] = i;
+                x[1] = j;
+                rb_mirror(phi, 3, n, 2, x);
+                m0 = 1;
+            }
+            error += row_rb_3d(d + row, o + row, r + row, N * H, H, s, m0, (n - s) / 2, w, he);
+            if(j == 1 && seam_j) {
+                x[0] = i;
+                rb_mirror(phi, 3, n, 1, x);
+            }
+        }
+        if(i == 1 && seam_i)
+            rb_mirror(phi, 3, n, 0, x);
+    }
     return error;
 }
+
+double _sor_step_rb(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values) {
+    double error;
+    double (*sweep)(double*, double*, int64_t, double, double, int, int*) =
+        (dim == 1) ? _sor_sweep_rb_1d : (dim == 2) ? _sor_sweep_rb_2d : _sor_sweep_rb_3d;
+    _refresh_ghosts_rb(phi, dim, n, kinds, values);
+    error = sweep(phi, rho, n, w, he, 1, kinds);
+    _refresh_ghosts_rb(phi, dim, n, kinds, values);
+    return error + sweep(phi, rho, n, w, he, 0, kinds);
+}
@@ -18,8 +18,49 @@
 #ifndef PYSOR
 #define PYSOR
 
-double _sor_step_1d(double *phi, double *rho, int n, double w, double he);
-double _sor_step_2d(double *phi, double *rho, int n, double w, double he);
-double _sor_step_3d(double *phi, double *rho, int n, double w, double he);
+#include <stdint.h>
+
+#define BC_PERIODIC 0
+#define BC_DIRICHLET 1
+#define BC_NEUMANN 2
+
+#define LAYOUT_NATURAL 0
+#define LAYOUT_REDBLACK 1
+
+void _refresh_ghosts_1d(double *phi, int64_t n, int *kinds, double *values);
+void _refresh_ghosts_2d(double *phi, int64_t n, int *kinds, double *values);
+void _refresh_ghosts_3d(double *phi, int64_t n, int *kinds, double *values);
+
+double _sor_sweep_row_2d(double *phi, double *rho, int64_t n, double w, double he, int parity, int *kinds);
+double _sor_sweep_plane_3d(double *phi, double *rho, int64_t n, double w, double he, int parity, int *kinds);
+
+double _sor_sweep_1d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1);
+double _sor_sweep_2d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1);
+double _sor_sweep_3d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds, int64_t i0, int64_t i1);
+double _sor_sweep_slice(double *phi, double *rho, int dim, int64_t n, double w, double he, int parity, int *kinds, double *values);
+
+double _sor_step_1d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values);
+double _sor_step_2d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values);
+double _sor_step_3d(double *phi, double *rho, int64_t n, double w, double he, int *kinds, double *values);
+
+int _has_openmp(void);
+int _max_threads(void);
+void _first_touch(double *dst, double *src, int64_t n, int64_t size, int threads);
+double _sor_step_parallel(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values, double *errors, int threads);
+void _sor_batch(double *phi, double *rho, int dim, int64_t n, int64_t batch, double w, double he, int *kinds, double *values, int64_t maxiter, double maxerr, int64_t *iterations, int threads);
+
+int64_t _sor_iterate(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values, int64_t maxiter, double maxerr, int layout, double *errors, int threads, int *cancel, double budget, double *error);
+
+void _sor_step_multi(double *phi, double *rho, int64_t n, int64_t K, double *w, double he, int *kinds, double *values, double *work, double *error);
+
+void _pack_rb(double *natural, double *rb, int dim, int64_t n, int ghosts);
+void _unpack_rb(double *rb, double *natural, int dim, int64_t n, int ghosts);
+void _refresh_ghosts_rb(double *rb, int dim, int64_t n, int *kinds, double *values);
+
+double _sor_sweep_rb_1d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds);
+double _sor_sweep_rb_2d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds);
+double _sor_sweep_rb_3d(double *phi, double *rho, int64_t n, double w, double he, int color, int *kinds);
+
+double _sor_step_rb(double *phi, double *rho, int dim, int64_t n, double w, double he, int *kinds, double *values);
 
 #endif
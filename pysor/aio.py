@@ -0,0 +1,83 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""An asyncio front end of api.sor().
+
+The solves run on a dedicated thread pool; the fast kernels release the GIL while
+iterating, so the event loop stays responsive and several solves proceed in parallel.
+Cancelling the awaiting task, e.g., by asyncio.wait_for() running out of time, raises a
+flag that the kernel checks before each iteration, so the worker thread is freed after at
+most one more iteration instead of running to maxiter.
+
+"""
+
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from . import api
+
+_lock = threading.Lock()
+_executor = None
+
+def default_executor():
+    r"""The thread pool shared by all calls of sor_async() without an explicit executor;
+    it has one thread per CPU."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix='pysor')
+        return _executor
+
+async def sor_async(rho, h, executor=None, **kwargs):
+    r"""Solve the Poisson equation without blocking the event loop.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray() or arraylike of float
+        The charge density grid, see api.sor().
+    h : float
+        The grid spacing along each axis.
+    executor : concurrent.futures.Executor, optional, default=None
+        Run the solve on this executor instead of the shared pool of default_executor().
+    **kwargs
+        Further keyword arguments of api.sor(), except cancel.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid.
+
+    Examples
+    --------
+    >>> phi = await asyncio.wait_for(pysor.sor_async(rho, 0.1), timeout=1.0)
+
+    """
+    if 'cancel' in kwargs:
+        raise TypeError("sor_async() manages cancel itself")
+    cancel = np.zeros(shape=(1,), dtype=np.intc)
+    future = asyncio.get_running_loop().run_in_executor(
+        executor or default_executor(),
+        functools.partial(api.sor, rho, h, cancel=cancel, **kwargs))
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancel[0] = 1
+        raise
@@ -14,12 +14,33 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import numpy as np
-import _ext.fast_sor as fs
-import naive_sor as ns
-import laplacian as lp
+from . import boundary as bc
+from . import backends as bk
 
-def sor(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None, fast=True):
+def scaled_spacing(h, epsilon, dim):
+    r"""The factor h^dim / epsilon applied to the charge density in the fast kernels."""
+    if dim == 1:
+        return h / epsilon
+    elif dim == 2:
+        return h * h / epsilon
+    return h * h * h / epsilon
+
+def allocate(shape, threads, src=None, ghosts=False):
+    r"""A 64-byte aligned grid, zeroed or copied from src by the threads that sweep it;
+    grids spanning several huge pages are backed by transparent huge pages."""
+    if threads == 1 and src is not None:
+        return src
+    nbytes = 8 * int(np.prod(shape))
+    from ._ext import fast_sor as fs
+    phi = fs.empty_aligned(shape, huge_pages=nbytes >= 4 * fs.HUGE_PAGE)
+    return fs.first_touch(phi, src, ghosts, threads)
+
+def sor(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None, fast=True,
+    boundary='periodic', boundary_value=0.0, layout=None, out=None, threads=None,
+    cache=None, phi0=None, cancel=None, deadline=None, time_budget=None, full_output=False,
+    backend=None, method='sor'):
     r"""Solve the dim-D Poisson equation using the successive overrelaxation method.
 
     Parameters
@@ -37,40 +58,314 @@ def sor(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None, fast=True):
     w : float, optional, default=None
         Overwrite the automatically computed SOR parameter.
     fast : boolean, optional, default=True
-        Use a fast version of the SOR code instead of a slow but simple
-        reference implementation.
+        Use a fast version of the SOR code (backend='auto') instead of a slow but simple
+        reference implementation (backend='python'); ignored if backend is given.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann';
+        a single string applies to all axes.
+    boundary_value : float or sequence, optional, default=0.0
+        For dirichlet axes the potential on the boundary, for neumann axes the outward
+        normal derivative of the potential. Either a single value for all faces, one
+        value per axis, or a (low, high) pair per axis; ignored for periodic axes.
+    layout : str, optional, default=None
+        The storage layout of the fast version: 'natural' sweeps the grid in place,
+        'redblack' packs both colors into separate contiguous arrays for unit-stride
+        updates; both give identical results. By default the tuned layout (see
+        tuning.py) for backend='auto', 'natural' otherwise.
+    out : numpy.ndarray(shape=rho.shape, dtype=numpy.float64), optional, default=None
+        Write the potential into this array. If rho or out is a numpy.memmap, the fast
+        version streams 2D and 3D grids slab by slab instead of loading them into memory,
+        see outofcore.sor_slabs(); the layout is ignored in this case.
+    threads : int, optional, default=None
+        The number of threads for the fast version of 2D and 3D grids in the natural
+        layout; use 0 for all available threads. The result does not depend on it. By
+        default the tuned number (see tuning.py) for backend='auto', 1 otherwise.
+    cache : cache.SolutionCache, optional, default=None
+        Serve the solution from this cache of normalized solutions, see cache.py.
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential, e.g., a solution for a similar density;
+        zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        A flag checked before each iteration; once another thread sets cancel[0] to
+        nonzero, the solver stops and returns the current iterate. The fast version
+        releases the GIL while iterating.
+    deadline : float, optional, default=None
+        A time.monotonic() value; the solver stops before the next iteration once it has
+        passed and returns the current iterate.
+    time_budget : float, optional, default=None
+        The same as deadline=time.monotonic() + time_budget; the earlier of both applies.
+    full_output : boolean, optional, default=False
+        Also return a dict with the number of 'iterations', the squared change 'error' of
+        the last one, whether the solver 'converged', and the 'status' it stopped with:
+        'converged', 'maxiter', 'deadline', 'cancelled', or 'cached'.
+    backend : str, optional, default=None
+        The implementation: 'c' for the single-threaded fast version, 'openmp' for the
+        same with OpenMP threads, 'numba' or 'numpy' for its JIT compiled or vectorized
+        NumPy counterparts with identical results, 'python' for the reference
+        implementation, the name of a plugin backend, or 'auto' for the fastest available
+        backend supporting the request (see pysor.backends); by default 'auto' if fast is
+        True and 'python' otherwise. The 'numba' backend requires the optional numba
+        package.
+    method : str, optional, default='sor'
+        The solution method: 'sor', 'fft' (periodic boundaries only), 'direct' (a dense
+        solve for small grids), or 'auto' for the one of the lowest predicted run time
+        that fits into memory, see cost.py. The non-iterative methods solve to machine
+        precision, fix the free constant of periodic and neumann problems by a zero mean,
+        and ignore the parameters of the iteration and the cache.
 
     Returns
     -------
     numpy.ndarray(shape=rho.shape, dtype=rho.dtype)
         The potential grid.
+    dict
+        The solver information, only if full_output is True.
 
     """
-    rho = np.asarray(rho, dtype=np.float64)
-    dim = rho.ndim
-    if fast:
-        phi = np.zeros(shape=rho.shape, dtype=rho.dtype)
+    if backend is None:
+        backend = 'auto' if fast else 'python'
+    if time_budget is not None:
+        expiry = time.monotonic() + time_budget
+        deadline = expiry if deadline is None else min(deadline, expiry)
+    info = dict()
+    if method == 'auto':
+        from . import cost
+        method = cost.choose(
+            np.shape(rho), h=h, epsilon=epsilon, boundary=boundary, maxerr=maxerr,
+            maxiter=maxiter, rho=rho)
+    if method in ('fft', 'direct'):
+        return _solve_direct(
+            rho, h, epsilon, boundary, boundary_value, out, method, info, maxiter, maxerr,
+            cancel, full_output)
+    elif method != 'sor':
+        raise ValueError("method must be 'sor', 'fft', 'direct', or 'auto'; got %r" % (method,))
+    if cache is not None:
+        return cache.sor(
+            rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w, fast=fast,
+            boundary=boundary, boundary_value=boundary_value, layout=layout, out=out,
+            threads=threads, phi0=phi0, cancel=cancel, deadline=deadline,
+            full_output=full_output, backend=backend)
+    if backend in ('auto', 'c', 'openmp') and np.ndim(rho) in (2, 3) and \
+        (isinstance(rho, np.memmap) or isinstance(out, np.memmap)) and bk.get('c').available:
+        from . import outofcore as ooc
+        kinds, values = bc.parse(boundary, boundary_value, rho.ndim, h)
         if w is None:
             w = 2.0 / (1.0 + np.pi / float(rho.shape[0]))
-        if dim == 1:
-            return fs.sor_1d(phi, rho, w, h / epsilon, maxiter, maxerr)
-        elif dim == 2:
-            return fs.sor_2d(phi, rho, w, h * h / epsilon, maxiter, maxerr)
-        elif dim == 3:
-            return fs.sor_3d(phi, rho, w, h * h * h / epsilon, maxiter, maxerr)
-        else:
-            raise ValueError("dimensionality must be 1, 2, 3; got %d" % dim)
+        if out is None:
+            out = np.zeros(shape=rho.shape, dtype=np.float64)
+        phi = ooc.sor_slabs(
+            rho, out, w, scaled_spacing(h, epsilon, rho.ndim), kinds, values,
+            maxiter=maxiter, maxerr=maxerr, phi0=phi0, cancel=cancel, deadline=deadline,
+            info=info)
+        return _finish(phi, info, maxiter, maxerr, cancel, full_output)
+    rho = np.asarray(rho)
+    tuned = None
+    if backend == 'auto' and (layout is None or threads is None):
+        from . import tuning
+        tuned = tuning.lookup(rho.shape)
+    if tuned is not None and tuned['backend'] in bk.names():
+        candidate = bk.get(tuned['backend'])
+        tuned_layout = tuned['layout'] if layout is None else layout
+        if candidate.available and (threads in (None, 1) or candidate.threads) and \
+            candidate.supports(rho.ndim, rho.dtype, boundary, tuned_layout):
+            backend, layout = candidate, tuned_layout
+            threads = tuned['threads'] if threads is None else threads
+    layout = 'natural' if layout is None else layout
+    threads = 1 if threads is None else threads
+    if backend == 'auto':
+        backend = bk.select(rho.ndim, rho.dtype, boundary, layout, threads)
     else:
+        if not isinstance(backend, bk.Backend):
+            backend = bk.get(backend)
+        if not backend.available:
+            raise ImportError("backend %r is not available" % backend.name)
+        if not backend.supports(rho.ndim, rho.dtype, boundary, layout):
+            raise ValueError(
+                "backend %r does not support dim=%d, dtype=%s, boundary=%r, layout=%r" % (
+                    backend.name, rho.ndim, rho.dtype, boundary, layout))
+        if threads != 1 and not backend.threads:
+            raise ValueError("backend %r runs on one thread; got threads=%d" % (
+                backend.name, threads))
+    dtype = next((d for d in backend.dtypes if np.can_cast(rho.dtype, d)), np.float64)
+    rho = np.ascontiguousarray(rho, dtype=dtype)
+    if out is not None:
+        if out.shape != rho.shape:
+            raise ValueError("out must be of shape=%s; got %s" % (rho.shape, out.shape))
+        out[...], info = sor(
+            rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w,
+            backend=backend.name, boundary=boundary, boundary_value=boundary_value,
+            layout=layout, threads=threads, phi0=phi0, cancel=cancel, deadline=deadline,
+            full_output=True)
+        return (out, info) if full_output else out
+    if phi0 is not None and np.shape(phi0) != rho.shape:
+        raise ValueError("phi0 must be of shape=%s; got %s" % (rho.shape, np.shape(phi0)))
+    phi = backend.function(
+        rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w, boundary=boundary,
+        boundary_value=boundary_value, layout=layout, threads=threads, phi0=phi0,
+        cancel=cancel, deadline=deadline, info=info)
+    return _finish(phi, info, maxiter, maxerr, cancel, full_output)
+
+def _sor_c(rho, h, epsilon, maxiter, maxerr, w, boundary, boundary_value, layout, threads,
+    phi0, cancel, deadline, info):
+    from ._ext import fast_sor as fs
+    dim = rho.ndim
+    if dim not in (1, 2, 3):
+        raise ValueError("dimensionality must be 1, 2, 3; got %d" % dim)
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(rho.shape[0]))
+    he = scaled_spacing(h, epsilon, dim)
+    budget = np.inf if deadline is None else deadline - time.monotonic()
+    if layout == 'natural':
+        phi = allocate(tuple(s + 2 for s in rho.shape), threads, ghosts=True)
+        if phi0 is not None:
+            bc.interior(phi)[...] = phi0
         if dim == 1:
-            return ns.sor_1d(rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w)
+            iterations, error = fs.sor_1d(
+                phi, rho, w, he, maxiter, maxerr, kinds, values, cancel, budget)
         elif dim == 2:
-            return ns.sor_2d(rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w)
-        elif dim == 3:
-            return ns.sor_3d(rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w)
+            iterations, error = fs.sor_2d(
+                phi, allocate(rho.shape, threads, src=rho), w, he, maxiter, maxerr,
+                kinds, values, threads, cancel, budget)
         else:
-            raise ValueError("dimensionality must be 1, 2, 3; got %d" % dim)
+            iterations, error = fs.sor_3d(
+                phi, allocate(rho.shape, threads, src=rho), w, he, maxiter, maxerr,
+                kinds, values, threads, cancel, budget)
+        phi = bc.interior(phi).copy()
+    elif layout == 'redblack':
+        n = rho.shape[0]
+        phi = np.zeros(shape=fs.rb_shape(n, dim), dtype=rho.dtype)
+        if phi0 is not None:
+            fs.pack_rb(np.ascontiguousarray(phi0, dtype=np.float64), phi, False)
+        rho_rb = fs.pack_rb(rho, np.zeros_like(phi), False)
+        iterations, error = fs.sor_rb(
+            phi, rho_rb, n, w, he, maxiter, maxerr, kinds, values, cancel, budget)
+        phi = fs.unpack_rb(phi, np.empty_like(rho), False)
+    else:
+        raise ValueError("layout must be 'natural' or 'redblack'; got %r" % (layout,))
+    info.update(iterations=iterations, error=error)
+    return phi
+
+def _sor_numba(rho, h, layout, **kwargs):
+    from . import numba_sor
+    return numba_sor.sor(rho, h, **kwargs)
+
+def _sor_numpy(rho, h, layout, threads, **kwargs):
+    from . import numpy_sor as nps
+    return nps.sor(rho, h, **kwargs)
+
+def _sor_python(rho, h, layout, threads, **kwargs):
+    from . import naive_sor as ns
+    if rho.ndim == 1:
+        return ns.sor_1d(rho, h, **kwargs)
+    elif rho.ndim == 2:
+        return ns.sor_2d(rho, h, **kwargs)
+    elif rho.ndim == 3:
+        return ns.sor_3d(rho, h, **kwargs)
+    raise ValueError("dimensionality must be 1, 2, 3; got %d" % rho.ndim)
+
+def _has_extension():
+    from ._ext import fast_sor as fs
+    return True
+
+def _has_openmp():
+    from ._ext import fast_sor as fs
+    return fs.has_openmp()
+
+def _has_numba():
+    import numba
+    return True
+
+bk.register(bk.Backend(
+    'openmp', _sor_c, priority=40, layouts=('natural', 'redblack'), threads=True,
+    available=_has_openmp))
+bk.register(bk.Backend(
+    'c', _sor_c, priority=30, layouts=('natural', 'redblack'),
+    available=_has_extension))
+bk.register(bk.Backend('numba', _sor_numba, priority=20, threads=True, available=_has_numba))
+bk.register(bk.Backend('numpy', _sor_numpy, priority=10))
+bk.register(bk.Backend('python', _sor_python, priority=0))
+
+def _solve_direct(rho, h, epsilon, boundary, boundary_value, out, method, info, maxiter,
+    maxerr, cancel, full_output):
+    from . import direct
+    rho = np.asarray(rho, dtype=np.float64)
+    dim = rho.ndim
+    if dim not in (1, 2, 3) or rho.shape != (rho.shape[0],) * dim:
+        raise ValueError("rho must be of shape=(n,) * dim with dim=1, 2, 3; got %s" % (rho.shape,))
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    he = scaled_spacing(h, epsilon, dim)
+    if method == 'fft':
+        if np.any(kinds != bc.PERIODIC):
+            raise ValueError("method 'fft' requires periodic boundaries on all axes")
+        phi = direct.fft(rho, he)
+    else:
+        phi = direct.dense(rho, he, kinds, values)
+    if out is not None:
+        out[...] = phi
+        phi = out
+    info.update(iterations=1, error=0.0, converged=True, status='converged')
+    return (phi, info) if full_output else phi
+
+def _finish(phi, info, maxiter, maxerr, cancel, full_output):
+    if not full_output:
+        return phi
+    info['converged'] = info['error'] < maxerr
+    if info['converged']:
+        info['status'] = 'converged'
+    elif cancel is not None and cancel[0]:
+        info['status'] = 'cancelled'
+    elif info['iterations'] >= maxiter:
+        info['status'] = 'maxiter'
+    else:
+        info['status'] = 'deadline'
+    return phi, info
+
+def sor_batch(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, threads=1):
+    r"""Solve a stack of independent dim-D Poisson equations of equal shape.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray() or arraylike of float
+        The charge density grids stacked along the first axis; allowed shapes are
+        (batch, n), (batch, n, n), and (batch, n, n, n).
+    h : float
+        The grid spacing along each axis.
+    epsilon : float, optional, default=1.0
+        The vacuum permittivity.
+    maxerr : float, optional, default=1.0E-7
+        The convergence criterion, applied to each member separately.
+    maxiter : int, optional, default=1000
+        The number of iterations.
+    w : float, optional, default=None
+        Overwrite the automatically computed SOR parameter.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis, see sor().
+    boundary_value : float or sequence, optional, default=0.0
+        The boundary values, shared by all members, see sor().
+    threads : int, optional, default=1
+        The number of members solved in parallel; use 0 for all available threads.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grids; member i equals sor(rho[i], h, ...).
+
+    """
+    from ._ext import fast_sor as fs
+    rho = np.ascontiguousarray(rho, dtype=np.float64)
+    dim = rho.ndim - 1
+    if dim not in (1, 2, 3):
+        raise ValueError("dimensionality must be 1, 2, 3; got %d" % dim)
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(rho.shape[1]))
+    phi = np.zeros(shape=rho.shape[:1] + tuple(s + 2 for s in rho.shape[1:]), dtype=rho.dtype)
+    fs.sor_batch(
+        phi, rho, w, scaled_spacing(h, epsilon, dim), maxiter, maxerr, kinds, values, threads)
+    return phi[(slice(None),) + (slice(1, -1),) * dim].copy()
 
-def laplacian(n, dim):
+def laplacian(n, dim, boundary='periodic'):
     r"""The dim-D Laplace operator independent of the grid spacing.
     
     Parameters
@@ -79,6 +374,8 @@ def laplacian(n, dim):
         The number of grid points along each axis.
     dim : int
         The number of axes; allowed are the values 1, 2, and 3.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann'.
     
     Returns
     -------
@@ -86,11 +383,12 @@ def laplacian(n, dim):
         The Laplace operator matrix.
     
     """
+    from . import laplacian as lp
     if dim == 1:
-        return lp.laplacian_1d(n)
+        return lp.laplacian_1d(n, boundary=boundary)
     elif dim == 2:
-        return lp.laplacian_2d(n)
+        return lp.laplacian_2d(n, boundary=boundary)
     elif dim == 3:
-        return lp.laplacian_3d(n)
+        return lp.laplacian_3d(n, boundary=boundary)
     else:
         raise ValueError("dim must be 1, 2, 3; got %d" % dim)
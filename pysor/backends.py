@@ -0,0 +1,171 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""The registry of solver backends used by api.sor().
+
+A backend wraps one implementation of the SOR iteration with its capabilities: the
+dimensions, input dtypes, boundary conditions, and layouts it handles, and whether it runs
+on several threads. api.sor(backend='auto') picks the available backend of the highest
+priority that supports the request, preferring threaded backends when threads != 1.
+
+Third-party packages can add backends through the 'pysor.backends' entry point group; each
+entry point must load a Backend instance, e.g.
+
+    entry_points={'pysor.backends': ['cuda = pysor_cuda:backend']}
+
+A backend function takes the positional arguments (rho, h) and the keyword arguments
+epsilon, maxiter, maxerr, w, boundary, boundary_value, layout, threads, phi0, cancel,
+deadline, and info (see api.sor()); it returns the potential and stores the 'iterations'
+and the squared change 'error' of the last one in info.
+
+"""
+
+import warnings
+import numpy as np
+
+ENTRY_POINTS = 'pysor.backends'
+
+class Backend(object):
+    r"""A solver implementation and its capabilities.
+
+    Parameters
+    ----------
+    name : str
+        The name passed as api.sor(backend=name).
+    function : callable
+        The implementation, see the module docstring.
+    priority : int, optional, default=0
+        The rank among the backends supporting a request; 'auto' picks the highest.
+    dims : sequence of int, optional, default=(1, 2, 3)
+        The supported dimensions.
+    dtypes : sequence of str, optional, default=('float64',)
+        The dtypes computed in; inputs that cast safely to one of them are accepted.
+    boundaries : sequence of str, optional, default=('periodic', 'dirichlet', 'neumann')
+        The supported boundary conditions.
+    layouts : sequence of str, optional, default=('natural',)
+        The supported memory layouts.
+    threads : boolean, optional, default=False
+        Whether the implementation can run on several threads.
+    available : callable, optional, default=None
+        Returns whether the backend can run here, e.g., whether an optional dependency is
+        installed; always available by default.
+
+    """
+    def __init__(self, name, function, priority=0, dims=(1, 2, 3), dtypes=('float64',),
+        boundaries=('periodic', 'dirichlet', 'neumann'), layouts=('natural',), threads=False,
+        available=None):
+        self.name = name
+        self.function = function
+        self.priority = priority
+        self.dims = tuple(dims)
+        self.dtypes = tuple(np.dtype(d) for d in dtypes)
+        self.boundaries = tuple(boundaries)
+        self.layouts = tuple(layouts)
+        self.threads = threads
+        self._available = available
+
+    @property
+    def available(self):
+        r"""Whether the backend can run here."""
+        if self._available is None:
+            return True
+        try:
+            return bool(self._available())
+        except ImportError:
+            return False
+
+    def supports(self, dim, dtype=np.float64, boundary='periodic', layout='natural'):
+        r"""Whether the backend handles grids of this dimension, dtype, boundary
+        condition(s), and layout."""
+        if isinstance(boundary, str):
+            boundary = [boundary]
+        return dim in self.dims and layout in self.layouts and \
+            all(str(b).lower() in self.boundaries for b in boundary) and \
+            any(np.can_cast(dtype, d, casting='safe') for d in self.dtypes)
+
+    def __repr__(self):
+        return "Backend(%r, priority=%d, dims=%s, threads=%s)" % (
+            self.name, self.priority, self.dims, self.threads)
+
+_registry = dict()
+_plugins_loaded = False
+
+def register(backend, replace=False):
+    r"""Add a Backend to the registry; an existing name is only replaced with replace=True."""
+    if not isinstance(backend, Backend):
+        raise TypeError("backend must be a Backend instance; got %r" % (backend,))
+    if backend.name in _registry and not replace:
+        raise ValueError("backend %r is already registered" % backend.name)
+    _registry[backend.name] = backend
+
+def unregister(name):
+    r"""Remove a backend from the registry."""
+    _load_plugins()
+    del _registry[name]
+
+def _load_plugins():
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    from . import api  # registers the built-in backends
+    from importlib import metadata
+    try:
+        entry_points = metadata.entry_points(group=ENTRY_POINTS)
+    except TypeError:
+        entry_points = metadata.entry_points().get(ENTRY_POINTS, [])
+    for entry_point in entry_points:
+        try:
+            register(entry_point.load())
+        except Exception as e:
+            warnings.warn("cannot load pysor backend %r: %s" % (entry_point.name, e))
+
+def get(name):
+    r"""The registered Backend of this name."""
+    _load_plugins()
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError("backend must be one of %s, or 'auto'; got %r" % (
+            ', '.join(names()), name))
+
+def names(available=False):
+    r"""The names of the registered (and, optionally, only the available) backends, from
+    the highest to the lowest priority."""
+    _load_plugins()
+    backends = sorted(_registry.values(), key=lambda b: -b.priority)
+    return tuple(b.name for b in backends if not available or b.available)
+
+def select(dim, dtype=np.float64, boundary='periodic', layout='natural', threads=1):
+    r"""The available Backend of the highest priority supporting the request; with
+    threads != 1, threaded backends come first.
+
+    Raises
+    ------
+    ValueError
+        If no available backend supports the request.
+
+    """
+    _load_plugins()
+    candidates = [
+        b for b in _registry.values() if b.supports(dim, dtype, boundary, layout)]
+    candidates.sort(key=lambda b: (threads != 1 and b.threads, b.priority), reverse=True)
+    for backend in candidates:
+        if backend.available:
+            return backend
+    raise ValueError("no available backend supports dim=%d, dtype=%s, boundary=%r, layout=%r" % (
+        dim, np.dtype(dtype), boundary, layout))
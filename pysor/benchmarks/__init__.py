@@ -0,0 +1,39 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""The benchmark suite of pysor.
+
+Run it from the command line,
+
+    python -m pysor.benchmarks --dims 2 3 --backends c numpy --threads 1 4 -o results.json
+
+or through run(); every case records its wall time, sweeps, cell updates per second,
+effective memory bandwidth, and peak resident memory, see suite.py. To check two builds or
+git revisions for performance regressions, run
+
+    python -m pysor.benchmarks.compare master HEAD --dims 2 3 --markdown report.md
+
+see compare.py.
+
+"""
+
+from .suite import Case
+from .suite import cases
+from .suite import density
+from .suite import measure
+from .suite import run
+from .suite import main
@@ -0,0 +1,309 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Compare the performance of two pysor builds on the same benchmark cases.
+
+Usage: python -m pysor.benchmarks.compare BASELINE CANDIDATE [options]
+
+A build is given as
+    - a Python executable of an environment with pysor installed,
+    - a directory containing a built source tree (it is put first on PYTHONPATH), or
+    - a git revision of the current repository, which is checked out into a temporary
+      worktree and built in place.
+
+The cases are those of suite.cases(). Each build runs them in fresh interpreters through a
+runner that only relies on pysor.sor(), so old revisions without the newer options can be
+measured as well; cases a build cannot express are skipped. The rounds of the two builds
+alternate to spread drift of the machine over both. Every case gets warmup runs and then
+repeated timings; a case is a regression if the whole confidence interval of the ratio of
+the median times (candidate / baseline, bootstrapped) lies above 1 + threshold, and an
+improvement if it lies below 1 - threshold. The report is written as Markdown and JSON; the
+exit status is 1 if there is a regression.
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import inspect
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from . import suite
+
+RUNNER = r'''
+import sys, json, time, inspect
+import numpy as np
+from pysor import sor
+%s
+cases, params = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+accepted = inspect.signature(sor).parameters
+results = []
+for case in cases:
+    kwargs = dict(maxiter=params['sweeps'], maxerr=0.0)
+    if case['method'] != 'sor':
+        kwargs['method'] = case['method']
+    elif case['backend'] in ('c', 'openmp', 'python') and 'backend' not in accepted:
+        kwargs['fast'] = case['backend'] != 'python'
+    else:
+        kwargs['backend'] = case['backend']
+    if case['layout'] not in (None, 'natural'):
+        kwargs['layout'] = case['layout']
+    if case['threads'] != 1:
+        kwargs['threads'] = case['threads']
+    missing = [key for key in kwargs if key not in accepted]
+    if missing:
+        results.append(dict(skipped="sor() has no parameter %%s" %% ', '.join(missing)))
+        continue
+    rho, h = density(case['n'], case['dim'])
+    sweeps = None
+    try:
+        if 'full_output' in accepted:
+            sweeps = sor(rho, h, full_output=True, **kwargs)[1]['iterations']
+        for r in range(params['warmup']):
+            sor(rho, h, **kwargs)
+    except (ValueError, ImportError) as e:
+        results.append(dict(skipped=str(e)))
+        continue
+    samples = []
+    for r in range(params['repeat']):
+        start = time.perf_counter()
+        sor(rho, h, **kwargs)
+        samples.append(time.perf_counter() - start)
+    results.append(dict(samples=samples, sweeps=sweeps))
+print(json.dumps(results))
+'''
+
+class Build(object):
+    r"""A pysor build to benchmark, see the module docstring for the accepted specs."""
+    def __init__(self, spec, log=None):
+        self.spec, self.log = spec, log
+        self.python, self.path, self._worktree = sys.executable, None, None
+        if os.path.isfile(spec) and os.access(spec, os.X_OK):
+            self.python = spec
+        elif os.path.isdir(spec):
+            self.path = os.path.abspath(spec)
+        else:
+            self._checkout(spec)
+    def _checkout(self, revision):
+        root = subprocess.check_output(
+            ['git', 'rev-parse', '--show-toplevel']).decode().strip()
+        self._worktree = tempfile.mkdtemp(prefix='pysor-compare-')
+        self._root = root
+        subprocess.check_call(
+            ['git', '-C', root, 'worktree', 'add', '--detach', self._worktree, revision],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if self.log is not None:
+            self.log.write("building %s in %s\n" % (revision, self._worktree))
+        subprocess.check_call(
+            [sys.executable, 'setup.py', 'build_ext', '--inplace'], cwd=self._worktree,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.path = self._worktree
+    def run(self, cases, **params):
+        r"""The runner results (samples or skip reason) of the cases in a fresh interpreter."""
+        env = dict(os.environ)
+        if self.path is not None:
+            env['PYTHONPATH'] = os.pathsep.join(
+                [self.path] + [p for p in [env.get('PYTHONPATH')] if p])
+        process = subprocess.run(
+            [self.python, '-c', RUNNER % inspect.getsource(suite.density),
+                json.dumps([c._asdict() for c in cases]), json.dumps(params)],
+            env=env, cwd=tempfile.gettempdir(), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            raise RuntimeError("build %r cannot run the benchmarks:\n%s" % (
+                self.spec, process.stderr.decode().strip()))
+        return json.loads(process.stdout.decode().splitlines()[-1])
+    def close(self):
+        r"""Remove the temporary worktree of a git revision."""
+        if self._worktree is not None:
+            subprocess.call(
+                ['git', '-C', self._root, 'worktree', 'remove', '--force', self._worktree],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.rmtree(self._worktree, ignore_errors=True)
+            self._worktree = None
+
+def ratio_interval(baseline, candidate, confidence=0.95, resamples=2000, seed=0):
+    r"""The ratio of the median times (candidate / baseline) and its bootstrap confidence
+    interval (low, high)."""
+    baseline, candidate = np.asarray(baseline), np.asarray(candidate)
+    random = np.random.RandomState(seed)
+    ratios = np.median(
+        candidate[random.randint(0, candidate.size, (resamples, candidate.size))], axis=1) / \
+        np.median(baseline[random.randint(0, baseline.size, (resamples, baseline.size))], axis=1)
+    tail = 50.0 * (1.0 - confidence)
+    low, high = np.percentile(ratios, [tail, 100.0 - tail])
+    return float(np.median(candidate) / np.median(baseline)), float(low), float(high)
+
+def verdict(low, high, threshold):
+    r"""'regression', 'improvement', or 'unchanged' for a ratio confidence interval."""
+    if low > 1.0 + threshold:
+        return 'regression'
+    elif high < 1.0 - threshold:
+        return 'improvement'
+    return 'unchanged'
+
+def compare(baseline, candidate, cases, repeat=10, warmup=2, rounds=2, sweeps=50,
+    threshold=0.05, confidence=0.95, log=None):
+    r"""Benchmark the cases with two builds and evaluate the differences.
+
+    Parameters
+    ----------
+    baseline, candidate : Build
+        The builds.
+    cases : sequence of suite.Case
+        The benchmark cases.
+    repeat : int, optional, default=10
+        The timings per case, build, and round.
+    warmup : int, optional, default=2
+        The untimed runs per case, build, and round.
+    rounds : int, optional, default=2
+        The alternating rounds of the two builds; the samples of all rounds are pooled.
+    sweeps : int, optional, default=50
+        The SOR iterations per run.
+    threshold : float, optional, default=0.05
+        The relative slowdown (or speedup) that counts.
+    confidence : float, optional, default=0.95
+        The confidence level of the ratio intervals.
+    log : file, optional, default=None
+        Print the progress to this stream.
+
+    Returns
+    -------
+    dict
+        The builds, parameters, and per-case 'results', and the number of 'regressions'.
+
+    """
+    params = dict(repeat=repeat, warmup=warmup, sweeps=sweeps)
+    samples = dict(baseline=[[] for c in cases], candidate=[[] for c in cases])
+    skipped = dict(baseline=[None] * len(cases), candidate=[None] * len(cases))
+    sweep_counts = [None] * len(cases)
+    for r in range(rounds):
+        for name, build in (('baseline', baseline), ('candidate', candidate)):
+            if log is not None:
+                log.write("round %d/%d: %s (%s)\n" % (r + 1, rounds, name, build.spec))
+            for i, result in enumerate(build.run(cases, **params)):
+                if 'skipped' in result:
+                    skipped[name][i] = result['skipped']
+                else:
+                    samples[name][i].extend(result['samples'])
+                    sweep_counts[i] = sweep_counts[i] or result['sweeps']
+    results = []
+    for i, case in enumerate(cases):
+        record = case._asdict()
+        record.update(sweeps=sweep_counts[i], baseline=samples['baseline'][i],
+            candidate=samples['candidate'][i])
+        reason = skipped['baseline'][i] or skipped['candidate'][i]
+        if reason is not None:
+            record.update(verdict='skipped', reason=reason)
+        else:
+            ratio, low, high = ratio_interval(
+                samples['baseline'][i], samples['candidate'][i], confidence)
+            record.update(
+                baseline_median=float(np.median(samples['baseline'][i])),
+                candidate_median=float(np.median(samples['candidate'][i])),
+                ratio=ratio, interval=[low, high], verdict=verdict(low, high, threshold))
+        results.append(record)
+    return dict(
+        baseline=baseline.spec, candidate=candidate.spec, machine=suite.machine(),
+        parameters=dict(params, rounds=rounds, threshold=threshold, confidence=confidence),
+        results=results,
+        regressions=sum(r['verdict'] == 'regression' for r in results))
+
+def markdown(report):
+    r"""The report as a Markdown document."""
+    p = report['parameters']
+    lines = [
+        "# pysor performance: %s vs. %s" % (report['candidate'], report['baseline']),
+        "",
+        "%d regression(s); threshold %g%%, %g%% confidence, %d rounds of %d timings "
+        "after %d warmups, %d sweeps per run." % (
+            report['regressions'], 100.0 * p['threshold'], 100.0 * p['confidence'],
+            p['rounds'], p['repeat'], p['warmup'], p['sweeps']),
+        "",
+        "| case | baseline [ms] | candidate [ms] | ratio | %g%% interval | verdict |" % (
+            100.0 * p['confidence']),
+        "|---|---:|---:|---:|---|---|"]
+    for r in report['results']:
+        case = "%dD n=%d %s" % (r['dim'], r['n'], r['method'])
+        if r['backend'] is not None:
+            case += " %s/%s/%d" % (r['backend'], r['layout'], r['threads'])
+        if r['verdict'] == 'skipped':
+            lines.append("| %s | | | | | skipped: %s |" % (case, r['reason']))
+        else:
+            lines.append("| %s | %.3f | %.3f | %.3f | [%.3f, %.3f] | %s |" % (
+                case, 1000.0 * r['baseline_median'], 1000.0 * r['candidate_median'],
+                r['ratio'], r['interval'][0], r['interval'][1],
+                "**regression**" if r['verdict'] == 'regression' else r['verdict']))
+    return "\n".join(lines) + "\n"
+
+def main(argv=None):
+    r"""The command line interface, see python -m pysor.benchmarks.compare --help."""
+    parser = argparse.ArgumentParser(
+        prog='python -m pysor.benchmarks.compare',
+        description="Compare the performance of two pysor builds (Python executables, "
+        "source directories, or git revisions).")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--dims', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--sizes', type=int, nargs='+', default=None)
+    parser.add_argument('--methods', nargs='+', default=['sor'])
+    parser.add_argument('--backends', nargs='+', default=['c'])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1])
+    parser.add_argument('--layouts', nargs='+', default=['natural'])
+    parser.add_argument('--sweeps', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--threshold', type=float, default=0.05)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--json', default=None, help="write the JSON report here")
+    parser.add_argument('--markdown', default=None,
+        help="write the Markdown report here (default: standard output)")
+    args = parser.parse_args(argv)
+    cases = suite.cases(
+        dims=args.dims, sizes=args.sizes, methods=args.methods, backends=args.backends,
+        threads=args.threads, layouts=args.layouts)
+    baseline = Build(args.baseline, log=sys.stderr)
+    try:
+        candidate = Build(args.candidate, log=sys.stderr)
+        try:
+            report = compare(
+                baseline, candidate, cases, repeat=args.repeat, warmup=args.warmup,
+                rounds=args.rounds, sweeps=args.sweeps, threshold=args.threshold,
+                confidence=args.confidence, log=sys.stderr)
+        finally:
+            candidate.close()
+    except RuntimeError as e:
+        sys.stderr.write("%s\n" % e)
+        return 2
+    finally:
+        baseline.close()
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.markdown is not None:
+        with open(args.markdown, 'w') as f:
+            f.write(markdown(report))
+    else:
+        sys.stdout.write(markdown(report))
+    return 1 if report['regressions'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Benchmark the cost of importing pysor in a fresh interpreter.
+
+Usage: python -m pysor.benchmarks.import_time [--repeat N] [statement]
+
+Times `python -c "<statement>"` against an empty interpreter start and prints the median
+overhead together with the slowest modules of one `python -X importtime` run.
+
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+
+def timings(code, repeat):
+    times = []
+    for r in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+def slowest(code, count=10):
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stderr=subprocess.PIPE, check=True).stderr.decode()
+    rows = []
+    for line in stderr.splitlines()[1:]:
+        fields = line.split('|')
+        if len(fields) == 3:
+            rows.append((int(fields[1]), fields[2].rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+def overhead(code='import pysor', repeat=20):
+    r"""The median seconds code adds to the start of a fresh interpreter, and the median
+    start time itself."""
+    baseline = timings('pass', repeat)[repeat // 2]
+    return timings(code, repeat)[repeat // 2] - baseline, baseline
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('statement', nargs='?', default='import pysor')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    median, baseline = overhead(args.statement, args.repeat)
+    print("%r: %.1f ms (interpreter start %.1f ms)" % (
+        args.statement, 1000.0 * median, 1000.0 * baseline))
+    for cumulative, module in slowest(args.statement):
+        print("%10.1f ms  %s" % (cumulative / 1000.0, module))
+
+if __name__ == '__main__':
+    main()
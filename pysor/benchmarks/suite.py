@@ -0,0 +1,263 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Benchmark cases over dimensions, grid sizes, backends, thread counts, and methods.
+
+Each case solves the two-Gaussian density of the former benchmarks notebook with a fixed
+number of sweeps (maxerr=0), or to the tolerance with converge=True, and records
+
+    seconds            the best wall time of `repeat` runs
+    sweeps             the SOR iterations of one run (1 for the non-iterative methods)
+    updates_per_second cells * sweeps / seconds
+    bandwidth          the effective memory bandwidth in bytes per second, assuming one
+                       read of rho and one read and write of phi per cell update
+                       (BYTES_PER_UPDATE); None for the non-iterative methods
+    peak_rss           the peak resident memory of the process in bytes; with isolate=True
+                       each case runs in a fresh interpreter, so this is the peak of the case
+
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import subprocess
+from collections import namedtuple
+import numpy as np
+
+BYTES_PER_UPDATE = 3 * 8
+
+SIZES = {1: (1024, 4096), 2: (128, 256), 3: (32, 64)}
+
+#   The dense direct solver is only benchmarked up to this many cells.
+DIRECT_CELLS = 1024
+
+Case = namedtuple('Case', ['dim', 'n', 'method', 'backend', 'layout', 'threads'])
+
+def density(n, dim):
+    r"""The benchmark density (a positive and a negative Gaussian, zero mean) and spacing."""
+    g = np.linspace(0.0, 1.0, n, endpoint=False)
+    h = g[1] - g[0] if n > 1 else 1.0
+    g += 0.5 * h
+    centers = [(0.3, 0.7), (0.3, 0.7), (0.5, 0.5)]
+    x = np.meshgrid(*([g] * dim), indexing='ij')
+    rho = np.exp(-1000.0 * sum((x[d] - centers[d][0])**2 for d in range(dim))) - \
+        np.exp(-1000.0 * sum((x[d] - centers[d][1])**2 for d in range(dim)))
+    return rho - rho.mean(), h
+
+def cases(dims=(1, 2, 3), sizes=None, methods=('sor', 'fft', 'direct'), backends=None,
+    threads=(1,), layouts=('natural',)):
+    r"""The valid benchmark cases of all combinations of the given choices.
+
+    Parameters
+    ----------
+    dims : sequence of int, optional, default=(1, 2, 3)
+        The dimensions.
+    sizes : sequence of int, optional, default=None
+        The grid sizes n for all dimensions; SIZES[dim] by default.
+    methods : sequence of str, optional, default=('sor', 'fft', 'direct')
+        The solution methods; 'direct' is skipped beyond DIRECT_CELLS cells.
+    backends : sequence of str, optional, default=None
+        The backends of the 'sor' method; all available ones except 'python' by default.
+    threads : sequence of int, optional, default=(1,)
+        The thread counts of threaded backends; other backends run single-threaded.
+    layouts : sequence of str, optional, default=('natural',)
+        The layouts, each used with the backends supporting it.
+
+    Returns
+    -------
+    list of Case
+
+    """
+    from .. import backends as bk
+    if backends is None:
+        backends = [b for b in bk.names(available=True) if b != 'python']
+    result = []
+    for dim in dims:
+        for n in (SIZES[dim] if sizes is None else sizes):
+            for method in methods:
+                if method != 'sor':
+                    if method != 'direct' or n**dim <= DIRECT_CELLS:
+                        result.append(Case(dim, n, method, None, None, 1))
+                    continue
+                for name in backends:
+                    backend = bk.get(name)
+                    if not backend.available or not backend.supports(dim):
+                        continue
+                    for layout in layouts:
+                        if layout not in backend.layouts:
+                            continue
+                        counts = threads if backend.threads and layout == 'natural' else (1,)
+                        for count in sorted(set(counts)):
+                            result.append(Case(dim, n, method, name, layout, count))
+    return result
+
+def peak_rss():
+    r"""The peak resident memory of this process in bytes, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(case, sweeps=50, repeat=3, converge=False, maxerr=1.0E-10):
+    r"""Run one case and return its record, see the module docstring.
+
+    Parameters
+    ----------
+    case : Case
+        The benchmark case.
+    sweeps : int, optional, default=50
+        The number of SOR iterations per run, or the upper bound with converge=True.
+    repeat : int, optional, default=3
+        The number of timed runs; one untimed run precedes them.
+    converge : boolean, optional, default=False
+        Stop at maxerr instead of running a fixed number of sweeps.
+    maxerr : float, optional, default=1.0E-10
+        The tolerance with converge=True.
+
+    Returns
+    -------
+    dict
+
+    """
+    from ..api import sor
+    rho, h = density(case.n, case.dim)
+    kwargs = dict(
+        maxiter=sweeps, maxerr=maxerr if converge else 0.0, method=case.method,
+        full_output=True)
+    if case.method == 'sor':
+        kwargs.update(backend=case.backend, layout=case.layout, threads=case.threads)
+    phi, info = sor(rho, h, **kwargs)
+    seconds = np.inf
+    for r in range(repeat):
+        start = time.perf_counter()
+        phi, info = sor(rho, h, **kwargs)
+        seconds = min(seconds, time.perf_counter() - start)
+    updates = float(rho.size) * info['iterations']
+    record = case._asdict()
+    record.update(
+        cells=rho.size, seconds=seconds, sweeps=info['iterations'], status=info['status'],
+        updates_per_second=updates / seconds if seconds > 0 else None,
+        bandwidth=BYTES_PER_UPDATE * updates / seconds
+            if case.method == 'sor' and seconds > 0 else None,
+        peak_rss=peak_rss())
+    return record
+
+def _measure_isolated(case, **kwargs):
+    code = "import json, sys; from pysor.benchmarks.suite import Case, measure; " \
+        "print(json.dumps(measure(Case(*json.loads(sys.argv[1])), **json.loads(sys.argv[2]))))"
+    output = subprocess.check_output(
+        [sys.executable, '-c', code, json.dumps(list(case)), json.dumps(kwargs)])
+    return json.loads(output.decode().splitlines()[-1])
+
+def machine():
+    r"""A description of the machine and software the benchmarks ran on."""
+    from .. import backends as bk
+    from .import_time import overhead
+    info = dict(
+        host=socket.gethostname(), platform=platform.platform(),
+        processor=platform.processor(), cpu_count=os.cpu_count(),
+        python=platform.python_version(), numpy=np.__version__,
+        backends=list(bk.names(available=True)),
+        import_seconds=overhead(repeat=5)[0])
+    try:
+        from .. import __version__
+        info['pysor'] = __version__
+    except Exception:
+        info['pysor'] = None
+    return info
+
+def run(cases, isolate=True, output=None, log=None, **kwargs):
+    r"""Measure the cases and collect the records with a machine description.
+
+    Parameters
+    ----------
+    cases : sequence of Case
+        The cases, see cases().
+    isolate : boolean, optional, default=True
+        Run each case in a fresh interpreter, so peak_rss belongs to that case.
+    output : str, optional, default=None
+        Also write the results as JSON to this file.
+    log : file, optional, default=None
+        Print a line per case to this stream.
+    **kwargs
+        The parameters of measure().
+
+    Returns
+    -------
+    dict
+        The 'machine' description, the measure() 'parameters', and the 'results'.
+
+    """
+    results = []
+    for case in cases:
+        record = _measure_isolated(case, **kwargs) if isolate else measure(case, **kwargs)
+        results.append(record)
+        if log is not None:
+            log.write("%dD n=%-5d %-6s %-6s %-8s threads=%-2d %10.3f ms %10.3g updates/s\n" % (
+                case.dim, case.n, case.method, case.backend or '-', case.layout or '-',
+                case.threads, 1000.0 * record['seconds'], record['updates_per_second'] or 0.0))
+            log.flush()
+    report = dict(machine=machine(), parameters=kwargs, results=results)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+def main(argv=None):
+    r"""The command line interface, see python -m pysor.benchmarks --help."""
+    parser = argparse.ArgumentParser(
+        prog='python -m pysor.benchmarks', description="Run the pysor benchmark suite.")
+    parser.add_argument('--dims', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+        help="grid sizes n for all dimensions (default: %s)" % (SIZES,))
+    parser.add_argument('--methods', nargs='+', default=['sor', 'fft', 'direct'])
+    parser.add_argument('--backends', nargs='+', default=None,
+        help="backends of the sor method (default: all available but python)")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1])
+    parser.add_argument('--layouts', nargs='+', default=['natural'])
+    parser.add_argument('--sweeps', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--converge', action='store_true',
+        help="solve to --maxerr instead of running a fixed number of sweeps")
+    parser.add_argument('--maxerr', type=float, default=1.0E-10)
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+        help="run all cases in this process (peak_rss is then cumulative)")
+    parser.add_argument('-o', '--output', default=None, help="write the JSON report here")
+    parser.add_argument('--calibrate', action='store_true',
+        help="also calibrate the cost model of method='auto' for this host")
+    args = parser.parse_args(argv)
+    selected = cases(
+        dims=args.dims, sizes=args.sizes, methods=args.methods, backends=args.backends,
+        threads=args.threads, layouts=args.layouts)
+    report = run(
+        selected, isolate=args.isolate, output=args.output, log=sys.stderr,
+        sweeps=args.sweeps, repeat=args.repeat, converge=args.converge, maxerr=args.maxerr)
+    if args.calibrate:
+        from .. import cost
+        report['cost'] = cost.calibrate()
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=1)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write("\n")
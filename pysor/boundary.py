@@ -0,0 +1,121 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+PERIODIC = 0
+DIRICHLET = 1
+NEUMANN = 2
+
+KINDS = dict(periodic=PERIODIC, dirichlet=DIRICHLET, neumann=NEUMANN)
+
+def parse(boundary, boundary_value, dim, h):
+    r"""Translate a user-level boundary specification into the ghost layer encoding.
+
+    Parameters
+    ----------
+    boundary : str or sequence of str
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann';
+        a single string applies to all axes.
+    boundary_value : float or sequence
+        For 'dirichlet' axes the potential in the ghost layer, for 'neumann' axes the
+        outward normal derivative of the potential. Either a single value for all faces,
+        one value per axis, or a (low, high) pair per axis (a plain pair for dim=1);
+        ignored for periodic axes.
+    dim : int
+        The number of axes.
+    h : float
+        The grid spacing.
+
+    Returns
+    -------
+    kinds : numpy.ndarray(shape=(dim,), dtype=numpy.intc)
+        The boundary type code of each axis.
+    values : numpy.ndarray(shape=(dim, 2), dtype=numpy.float64)
+        The ghost values for dirichlet faces and the ghost-minus-neighbour offsets for
+        neumann faces, indexed by axis and side (low, high).
+
+    """
+    if isinstance(boundary, str):
+        boundary = [boundary] * dim
+    if len(boundary) != dim:
+        raise ValueError("boundary must have one entry per axis; got %d for dim=%d" % (
+            len(boundary), dim))
+    try:
+        kinds = np.asarray([KINDS[b.lower()] for b in boundary], dtype=np.intc)
+    except (KeyError, AttributeError):
+        raise ValueError(
+            "boundary must be 'periodic', 'dirichlet', or 'neumann'; got %r" % (boundary,))
+    values = np.asarray(boundary_value, dtype=np.float64)
+    if values.ndim == 0:
+        values = np.full((dim, 2), float(values))
+    elif dim == 1 and values.shape == (2,):
+        values = values.reshape((1, 2))
+    elif values.shape == (dim,):
+        values = np.repeat(values[:, None], 2, axis=1)
+    elif values.shape != (dim, 2):
+        raise ValueError(
+            "boundary_value must be a scalar, of shape (dim,), or of shape (dim, 2)")
+    values = np.ascontiguousarray(values)
+    values[kinds == NEUMANN] *= h
+    values[kinds == PERIODIC] = 0.0
+    return kinds, values
+
+def refresh_ghosts(phi, kinds, values):
+    r"""Update the ghost layer of a padded potential grid in place.
+
+    Parameters
+    ----------
+    phi : numpy.ndarray(shape=(n + 2,) * dim)
+        The potential grid including one ghost cell on either side of each axis.
+    kinds : numpy.ndarray(shape=(dim,))
+        The boundary type code of each axis, see parse().
+    values : numpy.ndarray(shape=(dim, 2))
+        The encoded boundary values, see parse().
+
+    """
+    dim = phi.ndim
+    for axis in range(dim):
+        def face(index):
+            return tuple(index if a == axis else slice(1, -1) for a in range(dim))
+        if kinds[axis] == PERIODIC:
+            phi[face(0)] = phi[face(-2)]
+            phi[face(-1)] = phi[face(1)]
+        elif kinds[axis] == DIRICHLET:
+            phi[face(0)] = values[axis, 0]
+            phi[face(-1)] = values[axis, 1]
+        elif kinds[axis] == NEUMANN:
+            phi[face(0)] = phi[face(1)] + values[axis, 0]
+            phi[face(-1)] = phi[face(-2)] + values[axis, 1]
+        else:
+            raise ValueError("unknown boundary type code %d" % kinds[axis])
+
+def mirror_seam(phi, index, kinds):
+    r"""Copy a freshly updated cell on the low face of a periodic axis into the opposite ghost.
+
+    Sweeping over an odd number of periodic cells updates both faces with the same color;
+    mirroring the low face right away keeps the in-place update order across the seam.
+
+    """
+    for axis, kind in enumerate(kinds):
+        if kind == PERIODIC and index[axis] == 1:
+            ghost = list(index)
+            ghost[axis] = phi.shape[axis] - 1
+            phi[tuple(ghost)] = phi[index]
+
+def interior(phi):
+    r"""The view on the physical cells of a padded grid."""
+    return phi[(slice(1, -1),) * phi.ndim]
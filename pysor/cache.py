@@ -0,0 +1,329 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Caches of solutions exploiting the linearity of Poisson's equation.
+
+With homogeneous boundary conditions (periodic, or dirichlet/neumann with zero values), the
+potential for (rho, h, epsilon) is s * phi1, where phi1 solves the problem for rho / m with
+unit scaling, m = max(abs(rho)), and s = m * he (he as in api.sor()). The caches key phi1 by
+a content hash of rho / m and the grid parameters, so scaled copies of a density and changes
+of h or epsilon hit the same entry. SOR stops once the sum of squared changes drops below
+maxerr, and these changes scale with s^2; thus, an entry computed for the tolerance
+maxerr / s^2 serves all requests whose normalized tolerance is at least as loose. Only
+converged solutions are stored, so that a hit is always reported as converged.
+Inhomogeneous boundary conditions are cached without rescaling, i.e., keyed by the full
+parameter set.
+
+Entries with the same grid parameters form a group; on a miss, the entry of the group whose
+coarse fingerprint is closest to the requested density seeds the solver as a warm start.
+
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from . import api
+from . import boundary as bc
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#   Normalized densities are quantized to this resolution before hashing, so that the
+#   rounding of scaled copies does not change the key.
+QUANTUM = 2.0**-40
+
+def fingerprint(rho, bins=4):
+    r"""The block means of rho on a coarse grid of (at most) bins cells per axis."""
+    f = rho
+    for axis in range(rho.ndim):
+        f = np.stack(
+            [c.mean(axis=axis) for c in np.array_split(f, min(bins, f.shape[axis]), axis=axis)],
+            axis=axis)
+    return f.ravel()
+
+class SolutionCache(object):
+    r"""A memory-bounded LRU cache of normalized solutions.
+
+    The cache may be shared by threads; its entries and statistics are guarded by a lock,
+    which is not held while solving.
+
+    Parameters
+    ----------
+    maxbytes : int, optional, default=256 MiB
+        The upper bound for the memory taken by the cached potentials.
+
+    Examples
+    --------
+    >>> cache = SolutionCache()
+    >>> phi = pysor.sor(rho, 0.1, cache=cache)
+    >>> phi2 = pysor.sor(2.0 * rho, 0.05, cache=cache)  # hit
+    >>> cache.stats()
+
+    """
+    def __init__(self, maxbytes=1 << 28):
+        self.maxbytes = int(maxbytes)
+        self._mutex = threading.Lock()
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.warm_starts = 0
+    def __len__(self):
+        return len(self._entries)
+    def stats(self):
+        r"""The hit/miss statistics and the current occupancy."""
+        with self._mutex:
+            return dict(
+                hits=self.hits, misses=self.misses, evictions=self.evictions,
+                warm_starts=self.warm_starts, entries=len(self._entries),
+                nbytes=self.nbytes, maxbytes=self.maxbytes)
+    def clear(self):
+        r"""Drop all entries; the statistics are kept."""
+        with self._mutex:
+            self._entries.clear()
+            self.nbytes = 0
+    def key(self, rho, params):
+        r"""The group digest of params and the entry key, which adds the content hash of the
+        density rho (normalized by the caller)."""
+        group = hashlib.sha1(repr(params).encode()).hexdigest()
+        digest = hashlib.sha1(group.encode())
+        digest.update(np.rint(rho / QUANTUM).astype(np.int64).tobytes())
+        return group, digest.hexdigest()
+    def get(self, key, maxerr, maxiter):
+        r"""The cached potential for key if it is converged at least as tightly as requested."""
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None or entry['maxerr'] > maxerr or entry['maxiter'] < maxiter:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['phi']
+    def put(self, key, phi, maxerr, maxiter, group, fingerprint):
+        r"""Store the potential phi computed with the given tolerance and iteration limit."""
+        if phi.nbytes > self.maxbytes:
+            return
+        phi = np.array(phi, dtype=np.float64)
+        phi.flags.writeable = False
+        with self._mutex:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old['phi'].nbytes
+            self._entries[key] = dict(
+                phi=phi, maxerr=maxerr, maxiter=maxiter, group=group, fingerprint=fingerprint)
+            self.nbytes += phi.nbytes
+            while self.nbytes > self.maxbytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted['phi'].nbytes
+                self.evictions += 1
+    def nearest(self, group, fingerprint):
+        r"""The potential of the group whose fingerprint is closest to the given one."""
+        best, distance = None, np.inf
+        with self._mutex:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if entry['group'] == group:
+                d = np.linalg.norm(entry['fingerprint'] - fingerprint)
+                if d < distance:
+                    best, distance = entry['phi'], d
+        return best
+    def sor(self, rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+        boundary='periodic', boundary_value=0.0, **kwargs):
+        r"""api.sor() served from the cache; see there for the parameters."""
+        rho = np.ascontiguousarray(rho, dtype=np.float64)
+        dim = rho.ndim
+        kinds, values = bc.parse(boundary, boundary_value, dim, h)
+        if w is None:
+            w = 2.0 / (1.0 + np.pi / float(rho.shape[0]))
+        m = float(np.max(np.abs(rho))) if rho.size > 0 else 0.0
+        out = kwargs.pop('out', None)
+        phi0 = kwargs.pop('phi0', None)
+        full_output = kwargs.pop('full_output', False)
+        kwargs = dict(kwargs, w=w, boundary=boundary, boundary_value=boundary_value)
+        if m == 0.0 or not np.isfinite(m):
+            return api.sor(
+                rho, h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, out=out, phi0=phi0,
+                full_output=full_output, **kwargs)
+        if np.all(values == 0.0):
+            scale = m * api.scaled_spacing(h, epsilon, dim)
+            params = (rho.shape, kinds.tolist(), w)
+            rho_n, h_n, epsilon_n, maxerr_n = rho / m, 1.0, 1.0, maxerr / (scale * scale)
+        else:
+            scale = 1.0
+            params = (rho.shape, kinds.tolist(), values.tolist(), w, h, epsilon, m)
+            rho_n, h_n, epsilon_n, maxerr_n = rho / m, h, epsilon, maxerr
+        group, key = self.key(rho_n, params)
+        phi = self.get(key, maxerr_n, maxiter)
+        info = dict(iterations=0, error=np.nan, converged=True, status='cached')
+        if phi is None:
+            seed = fingerprint(rho_n)
+            if phi0 is not None:
+                phi0 = np.asarray(phi0) / scale
+            else:
+                phi0 = self.nearest(group, seed)
+                with self._mutex:
+                    self.warm_starts += phi0 is not None
+            phi, info = api.sor(
+                rho if scale == 1.0 else rho_n, h_n, epsilon=epsilon_n, maxiter=maxiter,
+                maxerr=maxerr_n, phi0=phi0, full_output=True, **kwargs)
+            if info['converged']:
+                self.put(key, phi, maxerr_n, maxiter, group, seed)
+            info['error'] *= scale * scale
+        if out is None:
+            out = phi * scale
+        else:
+            np.multiply(phi, scale, out=out)
+        return (out, info) if full_output else out
+
+class DiskCache(SolutionCache):
+    r"""A size-capped LRU store of normalized solutions in a directory.
+
+    Each entry is a memory-mappable .npy file next to a .json file with its tolerance,
+    iteration limit, group, and fingerprint. Files are written under temporary names and
+    renamed into place, so readers in other processes see either a complete entry or none;
+    renames and evictions are serialized by an exclusive lock on the file .lock. The LRU
+    order is the modification time of the .npy files, which is refreshed on each hit.
+
+    Parameters
+    ----------
+    directory : str
+        The directory holding the entries; it is created if necessary.
+    maxbytes : int, optional, default=4 GiB
+        The upper bound for the size of all .npy files.
+
+    """
+    def __init__(self, directory, maxbytes=1 << 32):
+        super(DiskCache, self).__init__(maxbytes=maxbytes)
+        self.directory = str(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    def _meta(self, key):
+        try:
+            with open(self._path(key, '.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, IOError, ValueError):
+            return None
+    def _keys(self):
+        return [name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')]
+    def _load(self, key):
+        try:
+            return np.load(self._path(key, '.npy'), mmap_mode='r')
+        except (OSError, IOError, ValueError):
+            return None
+    def _sizes(self):
+        sizes = []
+        for key in self._keys():
+            try:
+                st = os.stat(self._path(key, '.npy'))
+            except OSError:
+                continue
+            sizes.append((st.st_mtime, st.st_size, key))
+        return sizes
+    def __len__(self):
+        return len(self._keys())
+    def stats(self):
+        stats = super(DiskCache, self).stats()
+        sizes = self._sizes()
+        stats.update(entries=len(sizes), nbytes=sum(size for _, size, _ in sizes))
+        return stats
+    def clear(self):
+        with self._lock():
+            for key in self._keys():
+                self._remove(key)
+    def _remove(self, key):
+        for suffix in ('.json', '.npy'):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+    def get(self, key, maxerr, maxiter):
+        meta = self._meta(key)
+        phi = None
+        if meta is not None and meta['maxerr'] <= maxerr and meta['maxiter'] >= maxiter:
+            phi = self._load(key)
+        if phi is None:
+            with self._mutex:
+                self.misses += 1
+            return None
+        try:
+            os.utime(self._path(key, '.npy'), None)
+        except OSError:
+            pass
+        with self._mutex:
+            self.hits += 1
+        return phi
+    def _write(self, suffix, write):
+        fd, path = tempfile.mkstemp(suffix=suffix + '.tmp', dir=self.directory)
+        with os.fdopen(fd, 'wb' if suffix == '.npy' else 'w') as f:
+            write(f)
+        return path
+    def put(self, key, phi, maxerr, maxiter, group, fingerprint):
+        phi = np.asarray(phi, dtype=np.float64)
+        if phi.nbytes > self.maxbytes:
+            return
+        meta = dict(
+            maxerr=maxerr, maxiter=maxiter, group=group, fingerprint=fingerprint.tolist())
+        npy = self._write('.npy', lambda f: np.save(f, phi))
+        try:
+            meta_path = self._write('.json', lambda f: json.dump(meta, f))
+        except Exception:
+            os.remove(npy)
+            raise
+        with self._lock():
+            os.replace(npy, self._path(key, '.npy'))
+            os.replace(meta_path, self._path(key, '.json'))
+            sizes = sorted(self._sizes())
+            total = sum(size for _, size, _ in sizes)
+            for _, size, evicted in sizes:
+                if total <= self.maxbytes:
+                    break
+                if evicted == key:
+                    continue
+                self._remove(evicted)
+                total -= size
+                with self._mutex:
+                    self.evictions += 1
+    def nearest(self, group, fingerprint):
+        best, distance = None, np.inf
+        for key in self._keys():
+            meta = self._meta(key)
+            if meta is None or meta['group'] != group:
+                continue
+            d = np.linalg.norm(np.asarray(meta['fingerprint']) - fingerprint)
+            if d < distance:
+                best, distance = key, d
+        return None if best is None else self._load(best)
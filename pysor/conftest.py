@@ -0,0 +1,29 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pytest
+
+@pytest.fixture(autouse=True, scope='session')
+def tuning_path(tmp_path_factory):
+    r"""Keep the tests from reading or writing the user's tuning results."""
+    old = os.environ.get('PYSOR_TUNING')
+    os.environ['PYSOR_TUNING'] = str(tmp_path_factory.mktemp('tuning').joinpath('tuning.json'))
+    yield
+    if old is None:
+        del os.environ['PYSOR_TUNING']
+    else:
+        os.environ['PYSOR_TUNING'] = old
@@ -0,0 +1,211 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""A cost model of the solution methods of api.sor() for method='auto' and capacity planning.
+
+For a grid of N = n^dim cells, the model predicts
+
+    sor:    iterations * N * sor_cell             seconds,  8 * ((n + 2)^dim + 2 * N) bytes
+    fft:    N * log2(N) * fft_cell                seconds,  8 * 5 * N bytes
+    direct: N * direct_build + N^3 * direct_cell  seconds,  8 * 2 * N^2 bytes
+
+plus a fixed overhead per call, where the SOR iteration count is estimated as
+
+    iterations = min(maxiter, ceil(sor_rate * n * log(E / maxerr))),  E = (he * n)^2 * sum(rho^2)
+
+which follows from the spectral radius 1 - O(1/n) of SOR with the default relaxation. The
+fft method requires periodic boundaries on all axes; direct uses a least-squares solve (the
+direct_lstsq coefficient) if no axis is dirichlet. The coefficients below are typical
+values; calibrate() measures them on this machine and stores them per host next to the
+tuning file (see tuning.py), where later processes pick them up.
+
+"""
+
+import os
+import json
+import time
+import socket
+import numpy as np
+from . import boundary as bc
+
+METHODS = ('sor', 'fft', 'direct')
+
+COEFFICIENTS = dict(
+    overhead=5.0E-5,
+    sor_cell=3.0E-9,
+    sor_rate=0.07,
+    fft_cell=1.6E-9,
+    direct_build=1.0E-5,
+    direct_cell=3.0E-11,
+    direct_lstsq=4.0E-10)
+
+def default_path():
+    r"""The per-host file of calibrated coefficients."""
+    path = os.environ.get('PYSOR_COST')
+    if path:
+        return path
+    from .tuning import default_path as tuning_path
+    return os.path.join(
+        os.path.dirname(tuning_path()), 'cost-%s.json' % socket.gethostname())
+
+_coefficients = dict()
+
+def coefficients(path=None):
+    r"""The calibrated coefficients of this host, or the defaults for missing ones."""
+    path = default_path() if path is None else path
+    if path not in _coefficients:
+        values = dict(COEFFICIENTS)
+        try:
+            with open(path) as f:
+                values.update(json.load(f))
+        except (IOError, ValueError):
+            pass
+        _coefficients[path] = values
+    return _coefficients[path]
+
+def plan_cost(shape, h=1.0, epsilon=1.0, boundary='periodic', maxerr=1.0E-7, maxiter=1000,
+    rho=None, methods=METHODS, path=None):
+    r"""Predict the run time and memory of each applicable method for a problem.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The grid shape (n,) * dim.
+    h, epsilon, boundary, maxerr, maxiter : optional
+        The solver parameters, see api.sor().
+    rho : numpy.ndarray(shape=shape), optional, default=None
+        The charge density, which sets the expected SOR iteration count; a density of unit
+        root mean square is assumed without it.
+    methods : sequence of str, optional, default=METHODS
+        The methods to predict.
+    path : str, optional, default=None
+        The file of calibrated coefficients, default_path() by default.
+
+    Returns
+    -------
+    dict
+        For each applicable method a dict with the predicted 'seconds', the peak
+        'bytes', and the 'iterations' (1 for the non-iterative methods).
+
+    """
+    shape = tuple(int(s) for s in shape)
+    dim = len(shape)
+    if dim not in (1, 2, 3) or shape != (shape[0],) * dim:
+        raise ValueError("shape must be (n,) * dim with dim=1, 2, 3; got %s" % (shape,))
+    c = coefficients(path)
+    kinds, _ = bc.parse(boundary, 0.0, dim, h)
+    n, N = shape[0], float(shape[0])**dim
+    he = h**dim / epsilon
+    plans = dict()
+    for method in methods:
+        if method == 'sor':
+            norm = N if rho is None else float(np.sum(np.square(rho)))
+            scale = (he * n)**2 * norm / maxerr if maxerr > 0 else np.inf
+            iterations = maxiter if scale == np.inf else int(min(
+                maxiter, max(1, np.ceil(c['sor_rate'] * n * np.log(max(scale, np.e))))))
+            plans[method] = dict(
+                seconds=float(c['overhead'] + iterations * N * c['sor_cell']),
+                bytes=int(8 * ((n + 2)**dim + 2 * N)), iterations=iterations)
+        elif method == 'fft':
+            if np.all(kinds == bc.PERIODIC):
+                plans[method] = dict(
+                    seconds=float(c['overhead'] + N * max(np.log2(N), 1.0) * c['fft_cell']),
+                    bytes=int(8 * 5 * N), iterations=1)
+        elif method == 'direct':
+            cell = c['direct_cell'] if np.any(kinds == bc.DIRICHLET) else c['direct_lstsq']
+            plans[method] = dict(
+                seconds=float(c['overhead'] + N * c['direct_build'] + N**3 * cell),
+                bytes=int(8 * 2 * N**2), iterations=1)
+        else:
+            raise ValueError("method must be one of %s; got %r" % (', '.join(METHODS), method))
+    return plans
+
+def memory_limit():
+    r"""The default memory budget of method='auto': half of the physical memory."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 2
+    except (AttributeError, ValueError, OSError):
+        return np.inf
+
+def choose(shape, memory=None, **kwargs):
+    r"""The method of the lowest predicted run time whose memory fits into memory bytes
+    (memory_limit() by default); the keyword arguments are those of plan_cost()."""
+    memory = memory_limit() if memory is None else memory
+    plans = plan_cost(shape, **kwargs)
+    fitting = [m for m in plans if plans[m]['bytes'] <= memory] or ['sor']
+    return min(fitting, key=lambda m: plans[m]['seconds'])
+
+def _elapsed(function, repeat=3):
+    best = np.inf
+    for r in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def calibrate(save=True, path=None):
+    r"""Measure the coefficients on this machine with a few small problems.
+
+    Parameters
+    ----------
+    save : boolean, optional, default=True
+        Store the coefficients in the per-host file for later processes.
+    path : str, optional, default=None
+        The file of calibrated coefficients, default_path() by default.
+
+    Returns
+    -------
+    dict
+        The measured coefficients.
+
+    """
+    from .api import sor, scaled_spacing
+    from . import direct
+    random = np.random.RandomState(0)
+    c = dict()
+    c['overhead'] = _elapsed(lambda: sor(np.zeros(4), 1.0, maxiter=1), repeat=10)
+    rho = random.rand(48, 48, 48) - 0.5
+    iterations = 10
+    seconds = _elapsed(lambda: sor(rho, 1.0, maxiter=iterations, maxerr=0.0))
+    c['sor_cell'] = max(seconds - c['overhead'], 0.0) / (iterations * rho.size)
+    rates = []
+    for n in (32, 64):
+        g = np.linspace(0.0, 1.0, n, endpoint=False)
+        rho = np.exp(-50.0 * sum((x - 0.3)**2 for x in np.meshgrid(g, g)))
+        rho -= rho.mean()
+        for maxerr in (1.0E-9, 1.0E-13):
+            phi, info = sor(rho, 1.0 / n, maxerr=maxerr, maxiter=100000, full_output=True)
+            scale = (n * scaled_spacing(1.0 / n, 1.0, 2))**2 * np.sum(rho**2) / maxerr
+            rates.append(info['iterations'] / (n * np.log(max(scale, np.e))))
+    c['sor_rate'] = max(rates)
+    rho = random.rand(128, 128) - 0.5
+    c['fft_cell'] = _elapsed(lambda: direct.fft(rho, 1.0)) / (rho.size * np.log2(rho.size))
+    from .laplacian import laplacian_2d
+    rho = random.rand(20, 20) - 0.5
+    build = _elapsed(lambda: laplacian_2d(20, boundary='dirichlet'), repeat=1)
+    c['direct_build'] = build / rho.size
+    for key, boundary in (('direct_cell', 'dirichlet'), ('direct_lstsq', 'periodic')):
+        kinds, values = bc.parse(boundary, 0.0, 2, 1.0)
+        seconds = _elapsed(lambda: direct.dense(rho, 1.0, kinds, values), repeat=1)
+        c[key] = max(seconds - build, 0.0) / rho.size**3
+    if save:
+        path = default_path() if path is None else path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(c, f, indent=1, sort_keys=True)
+        _coefficients.pop(path, None)
+    return c
@@ -0,0 +1,106 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Non-iterative solvers of the discretized Poisson equation of api.sor().
+
+Both solve the same linear system as SOR, laplacian(n, dim) . phi = -he * rho (with the
+boundary values moved to the right-hand side), to machine precision instead of to the
+tolerance maxerr. For periodic (and all-neumann) boundaries, the potential is only defined
+up to a constant; these solvers return the solution with zero mean.
+
+"""
+
+import numpy as np
+from . import boundary as bc
+
+def eigenvalues(n, dim):
+    r"""The eigenvalues of the periodic dim-D Laplace operator for the modes of numpy.fft.rfftn
+    on (n,) * dim grids."""
+    full = 2.0 * np.cos(2.0 * np.pi * np.arange(n) / n) - 2.0
+    half = full[:n // 2 + 1]
+    shape = [1] * dim
+    total = 0.0
+    for axis in range(dim):
+        shape[axis] = -1
+        total = total + (half if axis == dim - 1 else full).reshape(shape)
+        shape[axis] = 1
+    return total
+
+def fft(rho, he):
+    r"""Solve the periodic problem with the discrete Fourier transform.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray(shape=(n,) * dim)
+        The charge density grid, dim=1, 2, or 3.
+    he : float
+        The scaled spacing h^dim / epsilon, see api.scaled_spacing().
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The zero-mean potential; the mean of rho, which has no periodic solution, is
+        ignored.
+
+    """
+    rho = np.asarray(rho, dtype=np.float64)
+    axes = tuple(range(rho.ndim))
+    spectrum = np.fft.rfftn(rho, axes=axes)
+    scale = eigenvalues(rho.shape[0], rho.ndim)
+    scale.flat[0] = 1.0
+    spectrum *= -he / scale
+    spectrum.flat[0] = 0.0
+    return np.fft.irfftn(spectrum, s=rho.shape, axes=axes)
+
+def dense(rho, he, kinds, values):
+    r"""Solve the problem with a dense LU decomposition of the Laplace operator, or with a
+    least-squares solution if no axis has dirichlet boundaries.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray(shape=(n,) * dim)
+        The charge density grid, dim=1, 2, or 3.
+    he : float
+        The scaled spacing h^dim / epsilon, see api.scaled_spacing().
+    kinds, values : numpy.ndarray
+        The boundary encoding of boundary.parse().
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid.
+
+    """
+    from .laplacian import laplacian_1d, laplacian_2d, laplacian_3d
+    rho = np.asarray(rho, dtype=np.float64)
+    n, dim = rho.shape[0], rho.ndim
+    names = [name for kind in kinds for name, code in bc.KINDS.items() if code == kind]
+    matrix = (laplacian_1d, laplacian_2d, laplacian_3d)[dim - 1](
+        n, boundary=names).reshape((n**dim, n**dim))
+    rhs = -he * rho
+    for axis in range(dim):
+        if kinds[axis] != bc.PERIODIC:
+            low = [slice(None)] * dim
+            low[axis] = 0
+            rhs[tuple(low)] -= values[axis, 0]
+            low[axis] = n - 1
+            rhs[tuple(low)] -= values[axis, 1]
+    if np.any(kinds == bc.DIRICHLET):
+        phi = np.linalg.solve(matrix, rhs.reshape(-1))
+    else:
+        phi = np.linalg.lstsq(matrix, rhs.reshape(-1), rcond=None)[0]
+    return phi.reshape(rho.shape)
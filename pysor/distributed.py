@@ -0,0 +1,351 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Multi-node domain decomposition over TCP sockets.
+
+Rank r of N owns the slices lo <= i < hi of the first axis in a padded array of its own and
+talks to its neighbours r - 1 and r + 1 (wrapping around for a periodic first axis) over
+plain TCP connections; there is no MPI dependency. Each connection has a reader and a
+writer thread, so a rank sweeps its interior slices while the halo slices travel, and only
+then waits for its ghost slices and sweeps its two boundary slices.
+
+The slice updates are those of the in-core sweep, so the potential matches api.sor() bit by
+bit: the squared changes are summed in slice order by passing the running sum from rank 0
+to rank N - 1, which broadcasts the stop decision back along the chain. For an odd number
+of periodic slices, rank 0 updates slice 0 first and sends it right away; the last rank uses
+it as the mirrored seam, as the in-core sweep does.
+
+Each rank runs 'python -m pysor.distributed' with the addresses of all ranks, a density
+.npy file readable by all ranks (memory-mapped, each rank reads its slab only), and an
+output .npy file into which each rank writes its slab; launch() does so on localhost.
+
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from ._ext import fast_sor as fs
+from . import boundary as bc
+from .api import scaled_spacing
+from .domain import _refresh
+
+#   Message tags: halo slices travelling left and right, the running error sums (rightward),
+#   and the stop decision (leftward).
+LEFT, RIGHT, SUM, STOP = b'L', b'R', b'A', b'S'
+
+_HEADER = struct.Struct('<cQ')
+
+class _Link(object):
+    r"""A connection to a neighbour with a reader thread that sorts incoming messages into
+    one queue per tag, and a writer thread that sends outgoing ones in order."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbox = {tag: queue.Queue() for tag in (LEFT, RIGHT, SUM, STOP)}
+        self.outbox = queue.Queue()
+        self.error = None
+        self._threads = [
+            threading.Thread(target=self._read, daemon=True),
+            threading.Thread(target=self._write, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+    def _receive(self, size):
+        buf = bytearray(size)
+        view, got = memoryview(buf), 0
+        while got < size:
+            count = self.sock.recv_into(view[got:])
+            if count == 0:
+                raise EOFError
+            got += count
+        return buf
+    def _read(self):
+        try:
+            while True:
+                tag, size = _HEADER.unpack(bytes(self._receive(_HEADER.size)))
+                self.inbox[tag].put(np.frombuffer(self._receive(size), dtype=np.float64))
+        except (EOFError, OSError) as error:
+            self.error = error
+            for inbox in self.inbox.values():
+                inbox.put(None)
+    def _write(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            try:
+                self.sock.sendall(message)
+            except OSError as error:
+                self.error = error
+                return
+    def send(self, tag, array):
+        data = np.ascontiguousarray(array, dtype=np.float64).tobytes()
+        self.outbox.put(_HEADER.pack(tag, len(data)) + data)
+    def receive(self, tag):
+        message = self.inbox[tag].get()
+        if message is None:
+            raise ConnectionError("lost the connection to a neighbour: %s" % self.error)
+        return message
+    def close(self):
+        self.outbox.put(None)
+        self._threads[1].join()
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        self._threads[0].join(timeout=10.0)
+        self.sock.close()
+
+class _Loopback(object):
+    r"""The link of a single rank to itself along a periodic axis."""
+    def __init__(self):
+        self.inbox = {tag: queue.Queue() for tag in (LEFT, RIGHT, SUM, STOP)}
+    def send(self, tag, array):
+        self.inbox[tag].put(np.array(array, dtype=np.float64).ravel())
+    def receive(self, tag):
+        return self.inbox[tag].get()
+    def close(self):
+        pass
+
+def _address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def connect(rank, addresses, periodic, timeout=60.0):
+    r"""The links (left, right) of rank to its neighbours; None where there is none.
+
+    Every rank listens on its own address, connects to its right neighbour (retrying until
+    that one listens), and accepts the connection of its left neighbour.
+
+    """
+    size = len(addresses)
+    if size == 1:
+        link = _Loopback() if periodic else None
+        return link, link
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(_address(addresses[rank]))
+    listener.listen(1)
+    left, right = None, None
+    try:
+        if rank < size - 1 or periodic:
+            start = time.monotonic()
+            while True:
+                try:
+                    sock = socket.create_connection(_address(addresses[(rank + 1) % size]))
+                    break
+                except OSError:
+                    if time.monotonic() - start > timeout:
+                        raise
+                    time.sleep(0.05)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            right = _Link(sock)
+        if rank > 0 or periodic:
+            listener.settimeout(timeout)
+            sock, _ = listener.accept()
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            left = _Link(sock)
+    finally:
+        listener.close()
+    return left, right
+
+def bounds(rank, size, n):
+    r"""The slices lo <= i < hi of the first axis owned by rank."""
+    return rank * n // size, (rank + 1) * n // size
+
+def sor_rank(rank, addresses, rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0):
+    r"""Run one rank of the distributed solver.
+
+    Parameters
+    ----------
+    rank : int
+        The rank of this process, 0 <= rank < len(addresses).
+    addresses : sequence of str
+        The 'host:port' address each rank listens on.
+    rho : numpy.ndarray(shape=(n,) * dim) or numpy.memmap
+        The global charge density grid, dim=2 or dim=3; only the slab of this rank is read.
+    h, epsilon, maxiter, maxerr, w, boundary, boundary_value : optional
+        The solver parameters, see api.sor().
+
+    Returns
+    -------
+    phi : numpy.ndarray(shape=(hi - lo,) + (n,) * (dim - 1), dtype=numpy.float64)
+        The potential on the slab of this rank.
+    lo, hi : int
+        The slab bounds, see bounds().
+    iterations : int
+        The number of iterations.
+
+    """
+    dim, n, size = rho.ndim, rho.shape[0], len(addresses)
+    if dim not in (2, 3) or rho.shape != (n,) * dim:
+        raise ValueError("rho must be of shape=(n, n) or (n, n, n); got %s" % (rho.shape,))
+    if not 0 <= rank < size <= n:
+        raise ValueError("require 0 <= rank < len(addresses) <= n")
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(n))
+    he = scaled_spacing(h, epsilon, dim)
+    lo, hi = bounds(rank, size, n)
+    m = hi - lo
+    inner = (slice(1, -1),) * (dim - 1)
+    shape = (n,) * (dim - 1)
+    rho = np.ascontiguousarray(rho[lo:hi], dtype=np.float64)
+    phi = np.zeros(shape=(m + 2,) + (n + 2,) * (dim - 1), dtype=np.float64)
+    errors = np.zeros(shape=(2, m), dtype=np.float64)
+    periodic = kinds[0] == bc.PERIODIC
+    seam = periodic and n % 2 == 1
+    def sweep(l, color):
+        errors[color, l - 1] = fs.sweep_slice(
+            phi[l - 1:l + 2], rho[l - 1], w, he, (lo + l - 1 + color) % 2, kinds, values)
+    def ghost(side):
+        if side == 0:
+            if left is None:
+                _refresh(phi, m, kinds, values, 0, inner)
+            else:
+                phi[0][inner] = left.receive(RIGHT).reshape(shape)
+        else:
+            if right is None:
+                _refresh(phi, m, kinds, values, 1, inner)
+            else:
+                phi[m + 1][inner] = right.receive(LEFT).reshape(shape)
+    left, right = connect(rank, addresses, periodic)
+    try:
+        if left is not None and not (seam and rank == 0):
+            left.send(LEFT, phi[1][inner])
+        if right is not None:
+            right.send(RIGHT, phi[m][inner])
+        for iteration in range(maxiter):
+            for color in (1, 0):
+                if seam and rank == 0:
+                    #   the seam slice goes first and is sent before the interior is swept
+                    ghost(0)
+                    if m == 1:
+                        ghost(1)
+                    sweep(1, color)
+                    left.send(LEFT, phi[1][inner])
+                    for l in range(2, m):
+                        sweep(l, color)
+                    if m > 1:
+                        ghost(1)
+                        sweep(m, color)
+                else:
+                    for l in range(2, m):
+                        sweep(l, color)
+                    ghost(0)
+                    ghost(1)
+                    sweep(1, color)
+                    if m > 1:
+                        sweep(m, color)
+                    if left is not None:
+                        left.send(LEFT, phi[1][inner])
+                if right is not None:
+                    right.send(RIGHT, phi[m][inner])
+            sums = [0.0, 0.0] if rank == 0 else left.receive(SUM).tolist()
+            for color in (1, 0):
+                for e in errors[color].tolist():
+                    sums[1 - color] += e
+            if rank < size - 1:
+                right.send(SUM, sums)
+                stop = right.receive(STOP)[0]
+            else:
+                stop = float(sums[0] + sums[1] < maxerr)
+            if rank > 0:
+                left.send(STOP, [stop])
+            if stop:
+                break
+        iterations = iteration + 1 if maxiter > 0 else 0
+    finally:
+        for link in set(link for link in (left, right) if link is not None):
+            link.close()
+    return phi[(slice(1, -1),) + inner].copy(), lo, hi, iterations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pysor.distributed', description="Run one rank of the distributed solver.")
+    parser.add_argument('rank', type=int, help="the rank of this process")
+    parser.add_argument('addresses', help="comma-separated host:port of all ranks")
+    parser.add_argument('rho', help="the density .npy file")
+    parser.add_argument('out', help="the existing potential .npy file")
+    parser.add_argument('--params', default='{}', help="the solver parameters as JSON")
+    args = parser.parse_args(argv)
+    params = json.loads(args.params)
+    rho = np.load(args.rho, mmap_mode='r')
+    phi, lo, hi, iterations = sor_rank(
+        args.rank, args.addresses.split(','), rho, **params)
+    out = np.load(args.out, mmap_mode='r+')
+    out[lo:hi] = phi
+    out.flush()
+    print(json.dumps(dict(rank=args.rank, iterations=iterations)))
+    return 0
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def launch(rho, h, ranks=2, full_output=False, timeout=None, **params):
+    r"""Solve on ranks processes on localhost, see sor_rank() for the parameters.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid, identical to api.sor(rho, h, ...).
+    int
+        The number of iterations, only if full_output is True.
+
+    """
+    rho = np.ascontiguousarray(rho, dtype=np.float64)
+    params = dict(params, h=h)
+    addresses = ','.join('127.0.0.1:%d' % _free_port() for rank in range(ranks))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    with tempfile.TemporaryDirectory() as directory:
+        rho_path = os.path.join(directory, 'rho.npy')
+        out_path = os.path.join(directory, 'phi.npy')
+        np.save(rho_path, rho)
+        np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=rho.shape).flush()
+        processes = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'pysor.distributed', str(rank), addresses, rho_path,
+                    out_path, '--params', json.dumps(params)],
+                stdout=subprocess.PIPE, env=env)
+            for rank in range(ranks)]
+        try:
+            outputs = [process.communicate(timeout=timeout)[0] for process in processes]
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+        if any(process.returncode != 0 for process in processes):
+            raise RuntimeError("a rank of the distributed solver failed")
+        phi = np.array(np.load(out_path))
+    iterations = json.loads(outputs[0].decode())['iterations']
+    return (phi, iterations) if full_output else phi
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Domain decomposition across worker processes.
+
+The padded potential, the charge density, and the squared changes per slice live in shared
+memory; each worker owns a contiguous slab of slices along the first axis and updates it
+with the slice kernel of the out-of-core solver. Since all workers map the same padded
+grid, the one-slice halo of a slab is the neighbouring slab's boundary slice, and exchanging
+halos amounts to a barrier after each half-sweep. Per half-sweep, the first worker refreshes
+the low ghost slice and the last one the high ghost slice; for an odd number of periodic
+slices, the first worker updates (and mirrors) slice 0 before the others start, as in the
+in-core sweep.
+
+The squared changes are stored per slice and summed in slice order by every worker, which
+reproduces the in-core summation: the convergence decision, the number of iterations, and
+the potential are identical to api.sor() bit by bit.
+
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from ._ext import fast_sor as fs
+from . import boundary as bc
+from .api import scaled_spacing
+
+def _bounds(rank, workers, n):
+    return rank * n // workers, (rank + 1) * n // workers
+
+def _attach(name, shape, dtype=np.float64):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape=shape, dtype=dtype, buffer=block.buf)
+
+def _refresh(phi, n, kinds, values, side, inner):
+    if side == 0:
+        if kinds[0] == bc.PERIODIC:
+            phi[0][inner] = phi[n][inner]
+        elif kinds[0] == bc.DIRICHLET:
+            phi[0][inner] = values[0, 0]
+        else:
+            phi[0][inner] = phi[1][inner] + values[0, 0]
+    else:
+        if kinds[0] == bc.PERIODIC:
+            phi[n + 1][inner] = phi[1][inner]
+        elif kinds[0] == bc.DIRICHLET:
+            phi[n + 1][inner] = values[0, 1]
+        else:
+            phi[n + 1][inner] = phi[n][inner] + values[0, 1]
+
+def _worker(rank, workers, names, dim, n, w, he, kinds, values, maxiter, maxerr, barrier):
+    phi_block, phi = _attach(names[0], (n + 2,) * dim)
+    rho_block, rho = _attach(names[1], (n,) * dim)
+    errors_block, errors = _attach(names[2], (2, n))
+    iterations_block, iterations = _attach(names[3], (1,), np.int64)
+    lo, hi = _bounds(rank, workers, n)
+    inner = (slice(1, -1),) * (dim - 1)
+    seam = kinds[0] == bc.PERIODIC and n % 2 == 1
+    def sweep(i, color):
+        errors[color, i] = fs.sweep_slice(phi[i:i + 3], rho[i], w, he, (i + color) % 2, kinds, values)
+    try:
+        for iteration in range(maxiter):
+            for color in (1, 0):
+                if rank == 0:
+                    _refresh(phi, n, kinds, values, 0, inner)
+                if rank == workers - 1:
+                    _refresh(phi, n, kinds, values, 1, inner)
+                barrier.wait()
+                start = lo
+                if seam:
+                    if rank == 0:
+                        sweep(0, color)
+                        phi[n + 1][inner] = phi[1][inner]
+                    barrier.wait()
+                    start = max(lo, 1)
+                for i in range(start, hi):
+                    sweep(i, color)
+                barrier.wait()
+            if rank == 0:
+                iterations[0] = iteration + 1
+            if np.cumsum(errors[1])[-1] + np.cumsum(errors[0])[-1] < maxerr:
+                break
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        del phi, rho, errors, iterations
+        for block in (phi_block, rho_block, errors_block, iterations_block):
+            block.close()
+
+def sor_domains(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, workers=2, full_output=False):
+    r"""Solve a 2D or 3D Poisson equation on slabs owned by worker processes.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray() or arraylike of float
+        The charge density grid; allowed shapes are (n, n) and (n, n, n).
+    h, epsilon, maxiter, maxerr, w, boundary, boundary_value : optional
+        The solver parameters, see api.sor().
+    workers : int, optional, default=2
+        The number of worker processes, each owning about n / workers slices.
+    full_output : boolean, optional, default=False
+        Also return the number of iterations.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid, identical to api.sor(rho, h, ...).
+    int
+        The number of iterations, only if full_output is True.
+
+    """
+    rho = np.ascontiguousarray(rho, dtype=np.float64)
+    dim, n = rho.ndim, rho.shape[0]
+    if dim not in (2, 3) or rho.shape != (n,) * dim:
+        raise ValueError("rho must be of shape=(n, n) or (n, n, n); got %s" % (rho.shape,))
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(n))
+    workers = max(1, min(int(workers), n))
+    blocks = []
+    def create(shape, dtype=np.float64):
+        block = shared_memory.SharedMemory(
+            create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+        blocks.append(block)
+        array = np.ndarray(shape=shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        return array
+    try:
+        phi = create((n + 2,) * dim)
+        create((n,) * dim)[...] = rho
+        create((2, n))
+        iterations = create((1,), np.int64)
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(workers)
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(
+                    rank, workers, [block.name for block in blocks], dim, n, w,
+                    scaled_spacing(h, epsilon, dim), kinds, values, maxiter, maxerr, barrier))
+            for rank in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("a worker of sor_domains() failed")
+        result = bc.interior(phi).copy(), int(iterations[0])
+        del phi, iterations
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return result if full_output else result[0]
@@ -16,14 +16,28 @@
 
 import numpy as np
 from numpy.testing import assert_array_equal
+from . import boundary as bc
 
-def laplacian_1d(n):
+def _neighbour(i, shift, n, kind):
+    r"""The cell coupled to cell i via shift, or None for a dirichlet ghost cell."""
+    j = i + shift
+    if 0 <= j < n:
+        return j
+    elif kind == bc.PERIODIC:
+        return j % n
+    elif kind == bc.NEUMANN:
+        return i
+    return None
+
+def laplacian_1d(n, boundary='periodic'):
     r"""The 1D Laplace operator independent of the grid spacing.
     
     Parameters
     ----------
     n : int
         The number of grid points along the discretized axis.
+    boundary : str, optional, default='periodic'
+        The boundary condition: 'periodic', 'dirichlet', or 'neumann'.
     
     Returns
     -------
@@ -31,20 +45,25 @@ def laplacian_1d(n):
         The Laplace operator matrix.
     
     """
+    kinds, _ = bc.parse(boundary, 0.0, 1, 1.0)
     laplacian = np.zeros(shape=(n, n), dtype=np.float64)
     for i in range(n):
         laplacian[i, i] = -2.0
-        laplacian[i, (i + 1) % n] += 1.0
-        laplacian[i, (i - 1) % n] += 1.0
+        for shift in (1, -1):
+            x = _neighbour(i, shift, n, kinds[0])
+            if x is not None:
+                laplacian[i, x] += 1.0
     return laplacian
 
-def laplacian_2d(n):
+def laplacian_2d(n, boundary='periodic'):
     r"""The 2D Laplace operator independent of the grid spacing.
     
     Parameters
     ----------
     n : int
         The number of grid points along each axis.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann'.
     
     Returns
     -------
@@ -52,23 +71,29 @@ def laplacian_2d(n):
         The Laplace operator matrix.
     
     """
+    kinds, _ = bc.parse(boundary, 0.0, 2, 1.0)
     laplacian = np.zeros(shape=(n, n, n, n), dtype=np.float64)
     for i in range(n):
         for j in range(n):
             laplacian[i, j, i, j] = -4.0
-            laplacian[i, j, (i + 1) % n, j] += 1.0
-            laplacian[i, j, (i - 1) % n, j] += 1.0
-            laplacian[i, j, i, (j + 1) % n] += 1.0
-            laplacian[i, j, i, (j - 1) % n] += 1.0
+            for shift in (1, -1):
+                x = _neighbour(i, shift, n, kinds[0])
+                if x is not None:
+                    laplacian[i, j, x, j] += 1.0
+                y = _neighbour(j, shift, n, kinds[1])
+                if y is not None:
+                    laplacian[i, j, i, y] += 1.0
     return laplacian.reshape((n * n, -1))
 
-def laplacian_3d(n):
+def laplacian_3d(n, boundary='periodic'):
     r"""The 3D Laplace operator independent of the grid spacing.
     
     Parameters
     ----------
     n : int
         The number of grid points along each axis.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann'.
     
     Returns
     -------
@@ -76,15 +101,20 @@ def laplacian_3d(n):
         The Laplace operator matrix.
     
     """
+    kinds, _ = bc.parse(boundary, 0.0, 3, 1.0)
     laplacian = np.zeros(shape=(n, n, n, n, n, n), dtype=np.float64)
     for i in range(n):
         for j in range(n):
             for k in range(n):
                 laplacian[i, j, k, i, j, k] = -6.0
-                laplacian[i, j, k, (i + 1) % n, j, k] += 1.0
-                laplacian[i, j, k, (i - 1) % n, j, k] += 1.0
-                laplacian[i, j, k, i, (j + 1) % n, k] += 1.0
-                laplacian[i, j, k, i, (j - 1) % n, k] += 1.0
-                laplacian[i, j, k, i, j, (k + 1) % n] += 1.0
-                laplacian[i, j, k, i, j, (k - 1) % n] += 1.0
+                for shift in (1, -1):
+                    x = _neighbour(i, shift, n, kinds[0])
+                    if x is not None:
+                        laplacian[i, j, k, x, j, k] += 1.0
+                    y = _neighbour(j, shift, n, kinds[1])
+                    if y is not None:
+                        laplacian[i, j, k, i, y, k] += 1.0
+                    z = _neighbour(k, shift, n, kinds[2])
+                    if z is not None:
+                        laplacian[i, j, k, i, j, z] += 1.0
     return laplacian.reshape((n * n * n, -1))
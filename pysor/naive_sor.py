@@ -14,9 +14,13 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import numpy as np
+from . import boundary as bc
 
-def sor_1d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
+def sor_1d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, phi0=None, cancel=None,
+    deadline=None, info=None):
     r"""Solve the 1D Poisson equation using the successive overrelaxation method.
 
     Parameters
@@ -33,6 +37,19 @@ def sor_1d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
         The number of iterations.
     w : float, optional, default=None
         Overwrite the automatically computed SOR parameter.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition: 'periodic', 'dirichlet', or 'neumann'.
+    boundary_value : float or sequence, optional, default=0.0
+        The dirichlet potential or neumann outward derivative on the boundary.
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential; zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next iteration once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next iteration once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one (infinity
+        if there was none) under the keys 'iterations' and 'error'.
 
     Returns
     -------
@@ -42,33 +59,49 @@ def sor_1d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
     """
     if rho.ndim != 1:
         raise ValueError("rho must be of shape=(n,)")
-    phi = np.zeros(shape=rho.shape, dtype=rho.dtype)
+    kinds, values = bc.parse(boundary, boundary_value, 1, h)
+    phi = np.zeros(shape=(rho.shape[0] + 2,), dtype=rho.dtype)
+    if phi0 is not None:
+        bc.interior(phi)[...] = phi0
     n = rho.shape[0]
     if w is None:
         w = 2.0 / (1.0 + np.pi / float(n))
+    iterations, error = 0, np.inf
     for iteration in range(maxiter):
+        if (cancel is not None and cancel[0]) or \
+            (deadline is not None and time.monotonic() >= deadline):
+            break
+        iterations += 1
         error = 0.0
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             if x % 2 == 0: continue
             phi_x = (
-                phi[(x - 1) % n] + \
-                phi[(x + 1) % n] + \
+                phi[x] + \
+                phi[x + 2] + \
                 rho[x] * h / epsilon) / 2.0
-            phi[x] = (1.0 - w) * phi[x] + w * phi_x
-            error += (phi[x] - phi_x)**2
+            phi[x + 1] = (1.0 - w) * phi[x + 1] + w * phi_x
+            error += (phi[x + 1] - phi_x)**2
+            bc.mirror_seam(phi, (x + 1,), kinds)
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             if x % 2 != 0: continue
             phi_x = (
-                phi[(x - 1) % n] + \
-                phi[(x + 1) % n] + \
+                phi[x] + \
+                phi[x + 2] + \
                 rho[x] * h / epsilon) / 2.0
-            phi[x] = (1.0 - w) * phi[x] + w * phi_x
-            error += (phi[x] - phi_x)**2
+            phi[x + 1] = (1.0 - w) * phi[x + 1] + w * phi_x
+            error += (phi[x + 1] - phi_x)**2
+            bc.mirror_seam(phi, (x + 1,), kinds)
         if error < maxerr:
             break
-    return phi
+    if info is not None:
+        info.update(iterations=iterations, error=error)
+    return bc.interior(phi).copy()
 
-def sor_2d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
+def sor_2d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, phi0=None, cancel=None,
+    deadline=None, info=None):
     r"""Solve the 2D Poisson equation using the successive overrelaxation method.
 
     Parameters
@@ -85,6 +118,19 @@ def sor_2d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
         The number of iterations.
     w : float, optional, default=None
         Overwrite the automatically computed SOR parameter.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann'.
+    boundary_value : float or sequence, optional, default=0.0
+        The dirichlet potential or neumann outward derivative on the boundary.
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential; zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next iteration once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next iteration once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one (infinity
+        if there was none) under the keys 'iterations' and 'error'.
 
     Returns
     -------
@@ -94,39 +140,55 @@ def sor_2d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
     """
     if rho.ndim != 2 or rho.shape[0] != rho.shape[1]:
         raise ValueError("rho must be of shape=(n, n)")
-    phi = np.zeros(shape=rho.shape, dtype=rho.dtype)
+    kinds, values = bc.parse(boundary, boundary_value, 2, h)
+    phi = np.zeros(shape=(rho.shape[0] + 2,) * 2, dtype=rho.dtype)
+    if phi0 is not None:
+        bc.interior(phi)[...] = phi0
     n = rho.shape[0]
     if w is None:
         w = 2.0 / (1.0 + np.pi / float(n))
+    iterations, error = 0, np.inf
     for iteration in range(maxiter):
+        if (cancel is not None and cancel[0]) or \
+            (deadline is not None and time.monotonic() >= deadline):
+            break
+        iterations += 1
         error = 0.0
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             for y in range(n):
                 if (x + y) % 2 == 0: continue
                 phi_xy = (
-                    phi[(x - 1) % n, y] + \
-                    phi[(x + 1) % n, y] + \
-                    phi[x, (y - 1) % n] + \
-                    phi[x, (y + 1) % n] + \
+                    phi[x, y + 1] + \
+                    phi[x + 2, y + 1] + \
+                    phi[x + 1, y] + \
+                    phi[x + 1, y + 2] + \
                     rho[x, y] * h * h / epsilon) / 4.0
-                phi[x, y] = (1.0 - w) * phi[x, y] + w * phi_xy
-                error += (phi[x, y] - phi_xy)**2
+                phi[x + 1, y + 1] = (1.0 - w) * phi[x + 1, y + 1] + w * phi_xy
+                error += (phi[x + 1, y + 1] - phi_xy)**2
+                bc.mirror_seam(phi, (x + 1, y + 1), kinds)
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             for y in range(n):
                 if (x + y) % 2 != 0: continue
                 phi_xy = (
-                    phi[(x - 1) % n, y] + \
-                    phi[(x + 1) % n, y] + \
-                    phi[x, (y - 1) % n] + \
-                    phi[x, (y + 1) % n] + \
+                    phi[x, y + 1] + \
+                    phi[x + 2, y + 1] + \
+                    phi[x + 1, y] + \
+                    phi[x + 1, y + 2] + \
                     rho[x, y] * h * h / epsilon) / 4.0
-                phi[x, y] = (1.0 - w) * phi[x, y] + w * phi_xy
-                error += (phi[x, y] - phi_xy)**2
+                phi[x + 1, y + 1] = (1.0 - w) * phi[x + 1, y + 1] + w * phi_xy
+                error += (phi[x + 1, y + 1] - phi_xy)**2
+                bc.mirror_seam(phi, (x + 1, y + 1), kinds)
         if error < maxerr:
             break
-    return phi
+    if info is not None:
+        info.update(iterations=iterations, error=error)
+    return bc.interior(phi).copy()
 
-def sor_3d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
+def sor_3d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, phi0=None, cancel=None,
+    deadline=None, info=None):
     r"""Solve the 3D Poisson equation using the successive overrelaxation method.
     
     Parameters
@@ -141,6 +203,19 @@ def sor_3d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
         The number of iterations.
     w : float, optional, default=None
         Overwrite the automatically computed SOR parameter.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis: 'periodic', 'dirichlet', or 'neumann'.
+    boundary_value : float or sequence, optional, default=0.0
+        The dirichlet potential or neumann outward derivative on the boundary.
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential; zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next iteration once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next iteration once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one (infinity
+        if there was none) under the keys 'iterations' and 'error'.
     
     Returns
     -------
@@ -150,41 +225,55 @@ def sor_3d(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None):
     """
     if rho.ndim != 3 or rho.shape[0] != rho.shape[1] != rho.shape[2]:
         raise ValueError("rho must be of shape=(n, n, n)")
-    phi = np.zeros(shape=rho.shape, dtype=rho.dtype)
+    kinds, values = bc.parse(boundary, boundary_value, 3, h)
+    phi = np.zeros(shape=(rho.shape[0] + 2,) * 3, dtype=rho.dtype)
+    if phi0 is not None:
+        bc.interior(phi)[...] = phi0
     n = rho.shape[0]
     if w is None:
         w = 2.0 / (1.0 + np.pi / float(n))
     errors = []
+    iterations, error = 0, np.inf
     for iteration in range(maxiter):
+        if (cancel is not None and cancel[0]) or \
+            (deadline is not None and time.monotonic() >= deadline):
+            break
+        iterations += 1
         error = 0.0
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             for y in range(n):
                 for z in range(n):
                     if (x + y + z) % 2 == 0: continue
                     phi_xyz = (
-                        phi[(x - 1) % n, y, z] + \
-                        phi[(x + 1) % n, y, z] + \
-                        phi[x, (y - 1) % n, z] + \
-                        phi[x, (y + 1) % n, z] + \
-                        phi[x, y, (z - 1) % n] + \
-                        phi[x, y, (z + 1) % n] + \
+                        phi[x, y + 1, z + 1] + \
+                        phi[x + 2, y + 1, z + 1] + \
+                        phi[x + 1, y, z + 1] + \
+                        phi[x + 1, y + 2, z + 1] + \
+                        phi[x + 1, y + 1, z] + \
+                        phi[x + 1, y + 1, z + 2] + \
                         rho[x, y, z] * h * h * h / epsilon) / 6.0
-                    phi[x, y, z] = (1.0 - w) * phi[x, y, z] + w * phi_xyz
-                    error += (phi[x, y, z] - phi_xyz)**2
+                    phi[x + 1, y + 1, z + 1] = (1.0 - w) * phi[x + 1, y + 1, z + 1] + w * phi_xyz
+                    error += (phi[x + 1, y + 1, z + 1] - phi_xyz)**2
+                    bc.mirror_seam(phi, (x + 1, y + 1, z + 1), kinds)
+        bc.refresh_ghosts(phi, kinds, values)
         for x in range(n):
             for y in range(n):
                 for z in range(n):
                     if (x + y + z) % 2 != 0: continue
                     phi_xyz = (
-                        phi[(x - 1) % n, y, z] + \
-                        phi[(x + 1) % n, y, z] + \
-                        phi[x, (y - 1) % n, z] + \
-                        phi[x, (y + 1) % n, z] + \
-                        phi[x, y, (z - 1) % n] + \
-                        phi[x, y, (z + 1) % n] + \
+                        phi[x, y + 1, z + 1] + \
+                        phi[x + 2, y + 1, z + 1] + \
+                        phi[x + 1, y, z + 1] + \
+                        phi[x + 1, y + 2, z + 1] + \
+                        phi[x + 1, y + 1, z] + \
+                        phi[x + 1, y + 1, z + 2] + \
                         rho[x, y, z] * h * h * h / epsilon) / 6.0
-                    phi[x, y, z] = (1.0 - w) * phi[x, y, z] + w * phi_xyz
-                    error += (phi[x, y, z] - phi_xyz)**2
+                    phi[x + 1, y + 1, z + 1] = (1.0 - w) * phi[x + 1, y + 1, z + 1] + w * phi_xyz
+                    error += (phi[x + 1, y + 1, z + 1] - phi_xyz)**2
+                    bc.mirror_seam(phi, (x + 1, y + 1, z + 1), kinds)
         if error < maxerr:
             break
-    return phi
+    if info is not None:
+        info.update(iterations=iterations, error=error)
+    return bc.interior(phi).copy()
@@ -0,0 +1,316 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""A Numba implementation of the fast SOR kernels for targets without a C compiler.
+
+The kernels follow src_fast_sor.c statement by statement, so the results are identical to
+the C version. The 2D and 3D sweeps update the rows (planes) of a color in parallel with
+prange, after the low seam row (plane) of an odd periodic axis, and sum the squared changes
+per row (plane) in order, as the OpenMP version does. The compiled functions are cached on
+disk, so only the first import on a machine pays for the compilation; see
+benchmark_startup().
+
+Numba is an optional dependency: importing this module raises ImportError without it.
+
+"""
+
+import sys
+import time
+import subprocess
+import numpy as np
+from numba import njit
+from numba import prange
+import numba
+from . import boundary as bc
+
+@njit(cache=True)
+def _refresh_1d(phi, n, kinds, values):
+    if kinds[0] == 0:
+        phi[0] = phi[n]
+        phi[n + 1] = phi[1]
+    elif kinds[0] == 1:
+        phi[0] = values[0, 0]
+        phi[n + 1] = values[0, 1]
+    else:
+        phi[0] = phi[1] + values[0, 0]
+        phi[n + 1] = phi[n] + values[0, 1]
+
+@njit(cache=True)
+def _refresh_2d(phi, n, kinds, values):
+    for j in range(1, n + 1):
+        if kinds[0] == 0:
+            phi[0, j] = phi[n, j]
+            phi[n + 1, j] = phi[1, j]
+        elif kinds[0] == 1:
+            phi[0, j] = values[0, 0]
+            phi[n + 1, j] = values[0, 1]
+        else:
+            phi[0, j] = phi[1, j] + values[0, 0]
+            phi[n + 1, j] = phi[n, j] + values[0, 1]
+    for i in range(1, n + 1):
+        if kinds[1] == 0:
+            phi[i, 0] = phi[i, n]
+            phi[i, n + 1] = phi[i, 1]
+        elif kinds[1] == 1:
+            phi[i, 0] = values[1, 0]
+            phi[i, n + 1] = values[1, 1]
+        else:
+            phi[i, 0] = phi[i, 1] + values[1, 0]
+            phi[i, n + 1] = phi[i, n] + values[1, 1]
+
+@njit(cache=True)
+def _refresh_3d(phi, n, kinds, values):
+    for j in range(1, n + 1):
+        for k in range(1, n + 1):
+            if kinds[0] == 0:
+                phi[0, j, k] = phi[n, j, k]
+                phi[n + 1, j, k] = phi[1, j, k]
+            elif kinds[0] == 1:
+                phi[0, j, k] = values[0, 0]
+                phi[n + 1, j, k] = values[0, 1]
+            else:
+                phi[0, j, k] = phi[1, j, k] + values[0, 0]
+                phi[n + 1, j, k] = phi[n, j, k] + values[0, 1]
+    for i in range(1, n + 1):
+        for k in range(1, n + 1):
+            if kinds[1] == 0:
+                phi[i, 0, k] = phi[i, n, k]
+                phi[i, n + 1, k] = phi[i, 1, k]
+            elif kinds[1] == 1:
+                phi[i, 0, k] = values[1, 0]
+                phi[i, n + 1, k] = values[1, 1]
+            else:
+                phi[i, 0, k] = phi[i, 1, k] + values[1, 0]
+                phi[i, n + 1, k] = phi[i, n, k] + values[1, 1]
+    for i in range(1, n + 1):
+        for j in range(1, n + 1):
+            if kinds[2] == 0:
+                phi[i, j, 0] = phi[i, j, n]
+                phi[i, j, n + 1] = phi[i, j, 1]
+            elif kinds[2] == 1:
+                phi[i, j, 0] = values[2, 0]
+                phi[i, j, n + 1] = values[2, 1]
+            else:
+                phi[i, j, 0] = phi[i, j, 1] + values[2, 0]
+                phi[i, j, n + 1] = phi[i, j, n] + values[2, 1]
+
+@njit(cache=True)
+def _cell_1d(phi, r, i, w, he):
+    value = 0.5 * (phi[i - 1] + phi[i + 1] + r * he)
+    phi[i] = (1.0 - w) * phi[i] + w * value
+    return (phi[i] - value) * (phi[i] - value)
+
+@njit(cache=True)
+def _cell_2d(phi, r, i, j, w, he):
+    value = 0.25 * (phi[i - 1, j] + phi[i + 1, j] + phi[i, j - 1] + phi[i, j + 1] + r * he)
+    phi[i, j] = (1.0 - w) * phi[i, j] + w * value
+    return (phi[i, j] - value) * (phi[i, j] - value)
+
+@njit(cache=True)
+def _cell_3d(phi, r, i, j, k, w, he):
+    value = 0.166666666666666657 * (
+        phi[i - 1, j, k] + phi[i + 1, j, k] + phi[i, j - 1, k] + phi[i, j + 1, k] +
+        phi[i, j, k - 1] + phi[i, j, k + 1] + r * he)
+    phi[i, j, k] = (1.0 - w) * phi[i, j, k] + w * value
+    return (phi[i, j, k] - value) * (phi[i, j, k] - value)
+
+@njit(cache=True)
+def _sweep_1d(phi, rho, n, w, he, color, seam):
+    error = 0.0
+    i = color
+    if i == 0 and n > 0 and seam:
+        error += _cell_1d(phi, rho[0], 1, w, he)
+        phi[n + 1] = phi[1]
+        i = 2
+    while i < n:
+        error += _cell_1d(phi, rho[i], i + 1, w, he)
+        i += 2
+    return error
+
+@njit(cache=True)
+def _row_2d(phi, rho, i, n, w, he, parity, seam):
+    error = 0.0
+    j = parity
+    if j == 0 and seam:
+        error += _cell_2d(phi, rho[i, 0], i + 1, 1, w, he)
+        phi[i + 1, n + 1] = phi[i + 1, 1]
+        j = 2
+    while j < n:
+        error += _cell_2d(phi, rho[i, j], i + 1, j + 1, w, he)
+        j += 2
+    return error
+
+@njit(cache=True)
+def _plane_3d(phi, rho, i, n, w, he, parity, seam_j, seam_k):
+    error = 0.0
+    for j in range(n):
+        k = (j + parity) % 2
+        if k == 0 and seam_k:
+            error += _cell_3d(phi, rho[i, j, 0], i + 1, j + 1, 1, w, he)
+            phi[i + 1, j + 1, n + 1] = phi[i + 1, j + 1, 1]
+            k = 2
+        while k < n:
+            error += _cell_3d(phi, rho[i, j, k], i + 1, j + 1, k + 1, w, he)
+            k += 2
+        if j == 0 and seam_j:
+            for k in range(1, n + 1):
+                phi[i + 1, n + 1, k] = phi[i + 1, 1, k]
+    return error
+
+@njit(cache=True, parallel=True)
+def _sweep_2d(phi, rho, n, w, he, color, seams, errors):
+    start = 0
+    if seams[0]:
+        errors[0] = _row_2d(phi, rho, 0, n, w, he, color % 2, seams[1])
+        for j in range(1, n + 1):
+            phi[n + 1, j] = phi[1, j]
+        start = 1
+    for i in prange(start, n):
+        errors[i] = _row_2d(phi, rho, i, n, w, he, (i + color) % 2, seams[1])
+    error = 0.0
+    for i in range(n):
+        error += errors[i]
+    return error
+
+@njit(cache=True, parallel=True)
+def _sweep_3d(phi, rho, n, w, he, color, seams, errors):
+    start = 0
+    if seams[0]:
+        errors[0] = _plane_3d(phi, rho, 0, n, w, he, color % 2, seams[1], seams[2])
+        for j in range(1, n + 1):
+            for k in range(1, n + 1):
+                phi[n + 1, j, k] = phi[1, j, k]
+        start = 1
+    for i in prange(start, n):
+        errors[i] = _plane_3d(phi, rho, i, n, w, he, (i + color) % 2, seams[1], seams[2])
+    error = 0.0
+    for i in range(n):
+        error += errors[i]
+    return error
+
+@njit(cache=True)
+def _step_1d(phi, rho, n, w, he, kinds, values, seams, errors):
+    _refresh_1d(phi, n, kinds, values)
+    error = _sweep_1d(phi, rho, n, w, he, 1, seams[0])
+    _refresh_1d(phi, n, kinds, values)
+    return error + _sweep_1d(phi, rho, n, w, he, 0, seams[0])
+
+@njit(cache=True)
+def _step_2d(phi, rho, n, w, he, kinds, values, seams, errors):
+    _refresh_2d(phi, n, kinds, values)
+    error = _sweep_2d(phi, rho, n, w, he, 1, seams, errors)
+    _refresh_2d(phi, n, kinds, values)
+    return error + _sweep_2d(phi, rho, n, w, he, 0, seams, errors)
+
+@njit(cache=True)
+def _step_3d(phi, rho, n, w, he, kinds, values, seams, errors):
+    _refresh_3d(phi, n, kinds, values)
+    error = _sweep_3d(phi, rho, n, w, he, 1, seams, errors)
+    _refresh_3d(phi, n, kinds, values)
+    return error + _sweep_3d(phi, rho, n, w, he, 0, seams, errors)
+
+_STEPS = (_step_1d, _step_2d, _step_3d)
+
+def sor(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, phi0=None, threads=1, cancel=None,
+    deadline=None, info=None):
+    r"""Solve the dim-D Poisson equation like the fast version, using Numba kernels.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray(shape=(n,) * dim)
+        The charge density grid, dim=1, 2, or 3.
+    h, epsilon, maxiter, maxerr, w, boundary, boundary_value : optional
+        The solver parameters, see api.sor().
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential; zero by default.
+    threads : int, optional, default=1
+        The number of Numba threads of the 2D and 3D sweeps; 0 uses all of them.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next iteration once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next iteration once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one under the
+        keys 'iterations' and 'error'.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid, identical to the fast version.
+
+    """
+    rho = np.ascontiguousarray(rho, dtype=np.float64)
+    dim, n = rho.ndim, rho.shape[0]
+    if dim not in (1, 2, 3) or rho.shape != (n,) * dim:
+        raise ValueError("rho must be of shape=(n,) * dim with dim=1, 2, 3; got %s" % (rho.shape,))
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(n))
+    if dim == 1:
+        he = h / epsilon
+    elif dim == 2:
+        he = h * h / epsilon
+    else:
+        he = h * h * h / epsilon
+    phi = np.zeros(shape=(n + 2,) * dim, dtype=np.float64)
+    if phi0 is not None:
+        bc.interior(phi)[...] = phi0
+    seams = np.array([kind == bc.PERIODIC and n % 2 == 1 for kind in kinds])
+    errors = np.zeros(shape=(n,), dtype=np.float64)
+    step = _STEPS[dim - 1]
+    previous = numba.get_num_threads()
+    numba.set_num_threads(numba.config.NUMBA_NUM_THREADS if threads <= 0 else min(
+        threads, numba.config.NUMBA_NUM_THREADS))
+    try:
+        iterations, error = 0, np.inf
+        for iteration in range(maxiter):
+            if (cancel is not None and cancel[0]) or \
+                (deadline is not None and time.monotonic() >= deadline):
+                break
+            iterations += 1
+            error = step(phi, rho, n, w, he, kinds, values, seams, errors)
+            if error < maxerr:
+                break
+    finally:
+        numba.set_num_threads(previous)
+    if info is not None:
+        info.update(iterations=iterations, error=error)
+    return bc.interior(phi).copy()
+
+def warmup():
+    r"""Compile (or load from the disk cache) the kernels for all dimensions."""
+    for dim in (1, 2, 3):
+        sor(np.zeros((3,) * dim), 1.0, maxiter=1)
+
+def benchmark_startup(repeat=3):
+    r"""The wall-clock seconds of fresh interpreters importing this module and running
+    warmup(); the first run may compile and fill the disk cache, the later ones load it.
+
+    Returns
+    -------
+    list of float
+        One time per run.
+
+    """
+    times = []
+    for r in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call(
+            [sys.executable, '-c', 'import pysor.numba_sor as m; m.warmup()'])
+        times.append(time.perf_counter() - start)
+    return times
@@ -0,0 +1,145 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""A vectorized NumPy implementation of the fast SOR kernels.
+
+Each half-sweep updates all cells of one color at once from slices of the padded grid; the
+arithmetic and the summation order of the squared changes are those of src_fast_sor.c, so
+the potential and the number of iterations are identical to the C version. For an odd
+number of cells along a periodic axis, the cells on both faces share a color, and the C
+sweep updates the high face after the low face has been mirrored into the high ghosts.
+Thus, the cells of a color are updated in stages: stage s holds the cells that lie on the
+high face of s such axes, and the low faces are mirrored after each stage.
+
+"""
+
+import time
+import numpy as np
+from . import boundary as bc
+
+#   The stencil weights of src_fast_sor.c
+WEIGHTS = (0.5, 0.25, 0.166666666666666657)
+
+def _stencil(phi, rho_he, dim, index=None):
+    r"""The Jacobi value of all interior cells, or of the interior cells at index, summed in
+    the order of the C kernels: neighbours along axis 0, 1, ..., then the charge."""
+    if index is None:
+        def neighbour(axis, offset):
+            return phi[tuple(
+                slice(1 + offset, phi.shape[a] - 1 + offset) if a == axis else slice(1, -1)
+                for a in range(dim))]
+        total = rho_he
+    else:
+        def neighbour(axis, offset):
+            return phi[tuple(i + 1 + offset if a == axis else i + 1 for a, i in enumerate(index))]
+        total = rho_he[index]
+    value = neighbour(0, -1) + neighbour(0, 1)
+    for axis in range(1, dim):
+        value = (value + neighbour(axis, -1)) + neighbour(axis, 1)
+    return WEIGHTS[dim - 1] * (value + total)
+
+def _mirror(phi, seams):
+    for axis in seams:
+        phi[tuple(-1 if a == axis else slice(1, -1) for a in range(phi.ndim))] = \
+            phi[tuple(1 if a == axis else slice(1, -1) for a in range(phi.ndim))]
+
+def _total(errors):
+    r"""Sum the squared changes of a sweep like the C kernels: rows (planes) in order, and
+    within each row (plane) the cells in order."""
+    if errors.ndim > 1:
+        errors = np.cumsum(errors.reshape(errors.shape[0], -1), axis=1)[:, -1]
+    return np.cumsum(errors)[-1] if errors.size > 0 else 0.0
+
+def sor(rho, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+    boundary='periodic', boundary_value=0.0, phi0=None, cancel=None, deadline=None,
+    info=None):
+    r"""Solve the dim-D Poisson equation like the fast version, using NumPy only.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray(shape=(n,) * dim)
+        The charge density grid, dim=1, 2, or 3.
+    h, epsilon, maxiter, maxerr, w, boundary, boundary_value : optional
+        The solver parameters, see api.sor().
+    phi0 : numpy.ndarray(shape=rho.shape), optional, default=None
+        The initial guess for the potential; zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next iteration once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next iteration once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one under the
+        keys 'iterations' and 'error'.
+
+    Returns
+    -------
+    numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential grid, identical to the fast version.
+
+    """
+    rho = np.ascontiguousarray(rho, dtype=np.float64)
+    dim, n = rho.ndim, rho.shape[0]
+    if dim not in (1, 2, 3) or rho.shape != (n,) * dim:
+        raise ValueError("rho must be of shape=(n,) * dim with dim=1, 2, 3; got %s" % (rho.shape,))
+    kinds, values = bc.parse(boundary, boundary_value, dim, h)
+    if w is None:
+        w = 2.0 / (1.0 + np.pi / float(n))
+    if dim == 1:
+        he = h / epsilon
+    elif dim == 2:
+        he = h * h / epsilon
+    else:
+        he = h * h * h / epsilon
+    rho_he = rho * he
+    phi = np.zeros(shape=(n + 2,) * dim, dtype=np.float64)
+    interior = bc.interior(phi)
+    if phi0 is not None:
+        interior[...] = phi0
+    seams = [axis for axis in range(dim) if kinds[axis] == bc.PERIODIC and n % 2 == 1]
+    grid = np.indices(rho.shape)
+    stage = sum((grid[axis] == n - 1).astype(np.intp) for axis in seams) if seams else 0
+    masks, indices = [], []
+    for color in (0, 1):
+        mask = grid.sum(axis=0) % 2 == color
+        masks.append(mask & (stage == 0))
+        indices.append([np.nonzero(mask & (stage == s)) for s in range(1, len(seams) + 1)])
+    iterations, error = 0, np.inf
+    for iteration in range(maxiter):
+        if (cancel is not None and cancel[0]) or \
+            (deadline is not None and time.monotonic() >= deadline):
+            break
+        iterations += 1
+        error = 0.0
+        for color in (1, 0):
+            bc.refresh_ghosts(phi, kinds, values)
+            value = _stencil(phi, rho_he, dim)
+            update = (1.0 - w) * interior + w * value
+            errors = np.where(masks[color], (update - value)**2, 0.0)
+            np.copyto(interior, update, where=masks[color])
+            _mirror(phi, seams)
+            for index in indices[color]:
+                value = _stencil(phi, rho_he, dim, index)
+                update = (1.0 - w) * interior[index] + w * value
+                errors[index] = (update - value)**2
+                interior[index] = update
+                _mirror(phi, seams)
+            error = _total(errors) if color == 1 else error + _total(errors)
+        if error < maxerr:
+            break
+    if info is not None:
+        info.update(iterations=iterations, error=error)
+    return interior.copy()
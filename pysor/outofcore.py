@@ -0,0 +1,255 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Out-of-core SOR for grids that do not fit into the main memory.
+
+The potential is kept in the (memory-mapped) output array and streamed slab by slab along
+the first axis through a small window of padded slices. Each pass over the grid applies
+several half-sweeps in a wavefront: stage s of the pipeline updates the slice s positions
+behind stage 0, so every slice is read and written once per pass while the update order,
+and thus the result, matches the in-core solver bit by bit.
+
+"""
+
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ._ext import fast_sor as fs
+from . import boundary as bc
+
+SLAB_BYTES = 1 << 25
+
+def default_slab(n, dim):
+    r"""The number of slices per read such that a slab of the potential takes ~32 MiB."""
+    return max(1, SLAB_BYTES // (8 * (n + 2)**(dim - 1)))
+
+class _Window(object):
+    r"""A sliding window of padded slices of the potential phi and the charge density rho.
+
+    Slices are addressed by their padded index g along the first axis, i.e., g=0 and g=n+1
+    are the ghost slices; the window holds the slices lo <= g < hi, reads the interior
+    slices in slabs (prefetching the next slab in the background) and writes evicted
+    interior slices back to phi.
+
+    """
+    def __init__(self, phi, rho, depth, slab, executor):
+        self.phi, self.rho, self.slab, self.executor = phi, rho, slab, executor
+        self.n, self.dim = rho.shape[0], rho.ndim
+        self.inner = (slice(1, -1),) * (self.dim - 1)
+        capacity = depth + slab + 2
+        self.buf = np.zeros((capacity,) + (self.n + 2,) * (self.dim - 1))
+        self.rbuf = np.zeros((capacity,) + (self.n,) * (self.dim - 1))
+        self.lo = self.hi = 0
+        self.pending = None
+    def _read(self, a, b):
+        return np.array(self.phi[a:b], dtype=np.float64), np.array(self.rho[a:b], dtype=np.float64)
+    def _submit(self, a):
+        b = min(a + self.slab, self.n)
+        if a >= b:
+            self.pending = None
+        elif self.executor is None:
+            self.pending = (a, b, None)
+        else:
+            self.pending = (a, b, self.executor.submit(self._read, a, b))
+    def _load(self):
+        if self.hi == 0:
+            self.hi = 1
+            return
+        a, b, future = self.pending
+        assert a == self.hi - 1
+        phi, rho = self._read(a, b) if future is None else future.result()
+        self._submit(b)
+        if self.hi + b - a + 1 - self.lo > self.buf.shape[0]:
+            raise RuntimeError("window overflow")
+        self.buf[(slice(self.hi - self.lo, self.hi - self.lo + b - a),) + self.inner] = phi
+        self.rbuf[self.hi - self.lo:self.hi - self.lo + b - a] = rho
+        self.hi += b - a
+        if b == self.n:
+            self.hi += 1
+    def _evict(self, keep):
+        self._write(self.lo, keep)
+        self.buf[:self.hi - keep] = self.buf[keep - self.lo:self.hi - self.lo]
+        self.rbuf[:self.hi - keep] = self.rbuf[keep - self.lo:self.hi - self.lo]
+        self.lo = keep
+    def _write(self, lo, hi):
+        a, b = max(lo, 1), min(hi, self.n + 1)
+        if a < b:
+            self.phi[a - 1:b - 1] = self.buf[(slice(a - self.lo, b - self.lo),) + self.inner]
+    def start(self):
+        self.lo = self.hi = 0
+        self._submit(0)
+    def require(self, g, keep):
+        r"""Make the slices up to g available, allowing to drop the slices below keep."""
+        while self.hi <= g:
+            if self.hi + self.slab + 1 - self.lo > self.buf.shape[0]:
+                self._evict(keep)
+            self._load()
+    def flush(self):
+        self._write(self.lo, self.hi)
+        self.pending = None
+    def slice(self, g):
+        r"""The padded slice g in the window."""
+        return self.buf[g - self.lo]
+    def sweep(self, i, w, he, parity, kinds, values):
+        r"""Update interior slice i (unpadded) with the given parity."""
+        g = i + 1 - self.lo
+        return fs.sweep_slice(self.buf[g - 1:g + 2], self.rbuf[g], w, he, parity, kinds, values)
+
+def _refresh_low(window, kinds, values, last):
+    ghost = window.slice(0)
+    if kinds[0] == bc.PERIODIC:
+        ghost[window.inner] = last
+    elif kinds[0] == bc.DIRICHLET:
+        ghost[window.inner] = values[0, 0]
+    else:
+        ghost[window.inner] = window.slice(1)[window.inner] + values[0, 0]
+
+def _refresh_high(window, kinds, values, top):
+    n = window.n
+    ghost = window.slice(n + 1)
+    if kinds[0] == bc.PERIODIC:
+        ghost[window.inner] = window.slice(1)[window.inner] if top is None else top
+    elif kinds[0] == bc.DIRICHLET:
+        ghost[window.inner] = values[0, 1]
+    else:
+        ghost[window.inner] = window.slice(n)[window.inner] + values[0, 1]
+
+def _stream(window, colors, w, he, kinds, values):
+    r"""One pass over the grid applying the half-sweeps of the given colors as a wavefront;
+    returns the squared changes per half-sweep and slice."""
+    n, depth = window.n, len(colors)
+    errors = np.zeros((depth, n))
+    last, top = None, None
+    window.start()
+    if kinds[0] == bc.PERIODIC:
+        #   the low ghost mirrors the last slice as of before this pass
+        last = np.array(window.phi[n - 1], dtype=np.float64)
+    for j in range(n + depth - 1):
+        window.require(min(j + 2, n + 1), max(0, j - depth + 1))
+        for s, color in enumerate(colors):
+            i = j - s
+            if i < 0 or i >= n:
+                continue
+            if i == 0:
+                _refresh_low(window, kinds, values, last)
+            if i == n - 1:
+                _refresh_high(window, kinds, values, top)
+            errors[s, i] = window.sweep(i, w, he, (i + color) % 2, kinds, values)
+            if i == 0 and kinds[0] == bc.PERIODIC:
+                #   the high ghost mirrors the first slice as soon as it is updated
+                top = window.slice(1)[window.inner].copy()
+    window.flush()
+    return errors
+
+def _total(errors):
+    r"""Sum the squared changes in the order of the in-core sweep."""
+    return np.cumsum(errors)[-1] if errors.size > 0 else 0.0
+
+def sor_slabs(rho, out, w, he, kinds, values, maxiter=1000, maxerr=1.0E-7,
+    slab=None, fuse=4, prefetch=True, phi0=None, cancel=None,
+    deadline=None, info=None):
+    r"""Run SOR on a grid streamed slab by slab from rho into out.
+
+    Parameters
+    ----------
+    rho : numpy.ndarray(shape=(n,) * dim) or numpy.memmap
+        The charge density grid, dim=2 or dim=3.
+    out : numpy.ndarray(shape=(n,) * dim, dtype=numpy.float64) or numpy.memmap
+        The potential grid; it is overwritten with the solution.
+    w : float
+        The SOR parameter.
+    he : float
+        The scaled grid spacing, see api.sor().
+    kinds : numpy.ndarray(shape=(dim,), dtype=numpy.intc)
+        The boundary type codes, see boundary.parse().
+    values : numpy.ndarray(shape=(dim, 2), dtype=numpy.float64)
+        The encoded boundary values, see boundary.parse().
+    maxiter : int, optional, default=1000
+        The number of iterations.
+    maxerr : float, optional, default=1.0E-7
+        The convergence criterion.
+    slab : int, optional, default=None
+        The number of slices read at once; by default ~32 MiB worth of slices.
+    fuse : int, optional, default=4
+        The number of iterations fused into one pass over the grid; a periodic first axis
+        couples the first and last slices, so each pass is a single half-sweep there.
+    prefetch : boolean, optional, default=True
+        Read the next slab in a background thread while the current one is updated.
+    phi0 : numpy.ndarray(shape=(n,) * dim) or numpy.memmap, optional, default=None
+        The initial guess for the potential; zero by default.
+    cancel : numpy.ndarray(shape=(1,), dtype=numpy.intc), optional, default=None
+        Stop before the next pass once cancel[0] is nonzero.
+    deadline : float, optional, default=None
+        Stop before the next pass once time.monotonic() reaches this value.
+    info : dict, optional, default=None
+        Store the number of iterations and the squared change of the last one under the
+        keys 'iterations' and 'error'.
+
+    Returns
+    -------
+    numpy.ndarray(shape=(n,) * dim)
+        The potential grid out.
+
+    Notes
+    -----
+    The convergence criterion is evaluated for each iteration but only checked at the end
+    of a pass, so up to fuse - 1 iterations more than in-core may be carried out; with the
+    same number of iterations, the potential is identical to the in-core result.
+
+    """
+    dim, n = rho.ndim, rho.shape[0]
+    if dim not in (2, 3) or rho.shape != (n,) * dim:
+        raise ValueError("rho must be of shape=(n, n) or (n, n, n); got %s" % (rho.shape,))
+    if out.shape != rho.shape or out.dtype != np.float64:
+        raise ValueError("out must be of shape=rho.shape and dtype=numpy.float64")
+    if slab is None:
+        slab = default_slab(n, dim)
+    if kinds[0] == bc.PERIODIC:
+        passes = [[1], [0]]
+    else:
+        fuse = max(1, int(fuse))
+        passes = [[1, 0] * fuse]
+    for a in range(0, n, slab):
+        out[a:a + slab] = 0.0 if phi0 is None else phi0[a:a + slab]
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        window = _Window(out, rho, max(len(colors) for colors in passes), slab, executor)
+        iteration, error = 0, np.inf
+        while iteration < maxiter:
+            if (cancel is not None and cancel[0]) or \
+                (deadline is not None and time.monotonic() >= deadline):
+                break
+            errors = []
+            for colors in passes:
+                colors = colors[:2 * (maxiter - iteration)]
+                errors.extend(_stream(window, colors, w, he, kinds, values))
+            errors = [_total(e) for e in errors]
+            converged = False
+            for t in range(len(errors) // 2):
+                iteration += 1
+                error = errors[2 * t] + errors[2 * t + 1]
+                converged = converged or error < maxerr
+            if converged:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if isinstance(out, np.memmap):
+        out.flush()
+    if info is not None:
+        info.update(iterations=iteration, error=error)
+    return out
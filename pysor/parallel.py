@@ -0,0 +1,134 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Batch solves on a pool of worker processes.
+
+The densities and potentials are passed through blocks of multiprocessing.shared_memory,
+so only their names and shapes are pickled. This yields multi-core throughput for every
+code path of api.sor(), including the pure Python one and builds without OpenMP.
+
+"""
+
+import os
+import queue
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import numpy as np
+from . import api
+
+def _attach(name, shape):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape=shape, dtype=np.float64, buffer=block.buf)
+
+def _solve(task):
+    index, rho_name, phi_name, shape, h, kwargs = task
+    rho_block, rho = _attach(rho_name, shape)
+    phi_block, phi = _attach(phi_name, shape)
+    try:
+        api.sor(rho, h, out=phi, **kwargs)
+    finally:
+        del rho, phi
+        rho_block.close()
+        phi_block.close()
+    return index
+
+def _release(*blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+def map_solve(rhos, h, processes=None, window=None, **kwargs):
+    r"""Solve Poisson's equation for many densities on a pool of processes.
+
+    Parameters
+    ----------
+    rhos : iterable of numpy.ndarray
+        The charge densities; they may differ in shape.
+    h : float
+        The grid spacing along each axis.
+    processes : int, optional, default=None
+        The number of worker processes; None uses all CPUs.
+    window : int, optional, default=None
+        The maximal number of densities in flight, which bounds the shared memory taken;
+        None uses twice the number of processes.
+    **kwargs
+        Further keyword arguments of api.sor(), except out.
+
+    Yields
+    ------
+    index : int
+        The position of the density in rhos.
+    phi : numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+        The potential; results are yielded in the order of completion.
+
+    Examples
+    --------
+    >>> phis = [None] * len(rhos)
+    >>> for index, phi in pysor.parallel.map_solve(rhos, 0.1, fast=False):
+    ...     phis[index] = phi
+
+    """
+    if 'out' in kwargs:
+        raise TypeError("map_solve() does not support out")
+    processes = processes or os.cpu_count() or 1
+    window = window or 2 * processes
+    if window < 1:
+        raise ValueError("window must be positive; got %d" % window)
+    tasks = enumerate(rhos)
+    done = queue.Queue()
+    pending = {}
+    #   The workers must share the tracker of this process; otherwise, each would start its
+    #   own tracker, which unlinks the blocks it attached when the worker exits.
+    resource_tracker.ensure_running()
+    pool = multiprocessing.Pool(processes)
+    def submit():
+        try:
+            index, rho = next(tasks)
+        except StopIteration:
+            return False
+        rho = np.ascontiguousarray(rho, dtype=np.float64)
+        size = max(rho.nbytes, 1)
+        rho_block = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            phi_block = shared_memory.SharedMemory(create=True, size=size)
+        except Exception:
+            _release(rho_block)
+            raise
+        pending[index] = (rho_block, phi_block, rho.shape)
+        np.ndarray(shape=rho.shape, dtype=np.float64, buffer=rho_block.buf)[...] = rho
+        pool.apply_async(
+            _solve, ((index, rho_block.name, phi_block.name, rho.shape, h, kwargs),),
+            callback=done.put, error_callback=done.put)
+        return True
+    try:
+        while len(pending) < window and submit():
+            pass
+        while pending:
+            index = done.get()
+            if isinstance(index, BaseException):
+                raise index
+            rho_block, phi_block, shape = pending.pop(index)
+            phi = np.ndarray(shape=shape, dtype=np.float64, buffer=phi_block.buf).copy()
+            _release(rho_block, phi_block)
+            submit()
+            yield index, phi
+    finally:
+        pool.terminate()
+        pool.join()
+        for rho_block, phi_block, _ in pending.values():
+            _release(rho_block, phi_block)
@@ -0,0 +1,163 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Micro-batching of concurrent solve requests.
+
+Requests submitted from any thread are queued per group of equal shape and parameters; a
+dispatcher thread runs a group as one api.sor_batch() call as soon as it holds max_batch
+requests or its oldest request has waited max_delay seconds.
+
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from . import api
+
+class BatchingSolver(object):
+    r"""Coalesce concurrent solve requests into batched kernel calls.
+
+    Parameters
+    ----------
+    h : float
+        The default grid spacing along each axis.
+    epsilon, maxiter, maxerr, w, boundary, boundary_value : optional
+        The default solver parameters, see api.sor_batch(); each request may override them.
+    max_batch : int, optional, default=64
+        The maximal number of requests solved by one kernel call.
+    max_delay : float, optional, default=1.0E-3
+        The maximal time in seconds a request waits for others to join its batch.
+    threads : int, optional, default=0
+        The number of threads of the batched kernel; 0 uses all available threads.
+
+    Examples
+    --------
+    >>> with BatchingSolver(0.1, boundary='dirichlet') as solver:
+    ...     future = solver.submit(rho)
+    ...     phi = future.result()
+
+    """
+    def __init__(self, h, epsilon=1.0, maxiter=1000, maxerr=1.0E-7, w=None,
+        boundary='periodic', boundary_value=0.0, max_batch=64, max_delay=1.0E-3, threads=0):
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive; got %d" % max_batch)
+        self.params = dict(
+            h=h, epsilon=epsilon, maxiter=maxiter, maxerr=maxerr, w=w,
+            boundary=boundary, boundary_value=boundary_value)
+        self.max_batch = int(max_batch)
+        self.max_delay = float(max_delay)
+        self.threads = threads
+        self._condition = threading.Condition()
+        self._groups = OrderedDict()
+        self._closed = False
+        self.depth = 0
+        self.max_depth = 0
+        self.submitted = 0
+        self.batches = 0
+        self.solved = 0
+        self._thread = threading.Thread(target=self._run, name='pysor-batching', daemon=True)
+        self._thread.start()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    @property
+    def queue_depth(self):
+        r"""The number of requests waiting for their batch to start."""
+        return self.depth
+    def stats(self):
+        r"""The queue depth (current and maximal) and the request and batch counters."""
+        with self._condition:
+            return dict(
+                depth=self.depth, max_depth=self.max_depth, groups=len(self._groups),
+                submitted=self.submitted, batches=self.batches, solved=self.solved,
+                mean_batch=self.solved / float(self.batches) if self.batches else 0.0)
+    def submit(self, rho, **kwargs):
+        r"""Queue the charge density rho; kwargs override the default parameters.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            The future of the potential grid.
+
+        """
+        unknown = set(kwargs) - set(self.params)
+        if unknown:
+            raise TypeError("unknown parameters %s" % ', '.join(sorted(unknown)))
+        params = dict(self.params, **kwargs)
+        rho = np.array(rho, dtype=np.float64)
+        key = (rho.shape, repr(sorted(params.items())))
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("cannot submit to a closed BatchingSolver")
+            _, pending = self._groups.setdefault(key, (params, []))
+            pending.append((rho, future, time.monotonic() + self.max_delay))
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            self.submitted += 1
+            self._condition.notify()
+        return future
+    def close(self, wait=True):
+        r"""Stop accepting requests; the queued ones are still solved."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if wait:
+            self._thread.join()
+    def _take(self):
+        now = time.monotonic()
+        timeout = None
+        for key, (params, pending) in self._groups.items():
+            if len(pending) >= self.max_batch or pending[0][2] <= now or self._closed:
+                batch = pending[:self.max_batch]
+                del pending[:self.max_batch]
+                if not pending:
+                    del self._groups[key]
+                self.depth -= len(batch)
+                return params, batch, None
+            wait = pending[0][2] - now
+            timeout = wait if timeout is None else min(timeout, wait)
+        return None, None, timeout
+    def _run(self):
+        while True:
+            with self._condition:
+                params, batch, timeout = self._take()
+                while batch is None:
+                    if self._closed:
+                        return
+                    self._condition.wait(timeout)
+                    params, batch, timeout = self._take()
+            self._solve(params, batch)
+    def _solve(self, params, batch):
+        batch = [(rho, future) for rho, future, _ in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            phi = api.sor_batch(
+                np.stack([rho for rho, _ in batch]), threads=self.threads, **params)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+        else:
+            for i, (_, future) in enumerate(batch):
+                future.set_result(phi[i])
+        with self._condition:
+            self.batches += 1
+            self.solved += len(batch)
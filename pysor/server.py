@@ -0,0 +1,276 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""A local solver daemon and its client.
+
+The server keeps Solver plans, an optional SolutionCache, and the OpenMP thread pool warm
+across requests. Requests and replies are single JSON lines on a Unix domain socket; the
+grids themselves never pass the socket: the client writes rho into a shared memory segment
+and the server writes phi into a second one, both created and unlinked by the client.
+
+Requests are objects with an 'op' of 'solve', 'stats', 'ping', or 'shutdown'; a solve
+request names the segments and shape of rho and phi and carries the parameters of api.sor().
+Each reply has 'ok' and, on failure, the 'error' type and 'message'.
+
+"""
+
+import os
+import sys
+import errno
+import json
+import signal
+import argparse
+import tempfile
+import threading
+import socket
+import socketserver
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import numpy as np
+from . import api
+from .solver import Solver
+from .cache import SolutionCache
+
+#   The parameters a request may set; all others are fixed by the server.
+PARAMETERS = (
+    'h', 'epsilon', 'maxiter', 'maxerr', 'w', 'boundary', 'boundary_value', 'layout')
+
+def default_socket():
+    r"""The socket path from $PYSOR_SOCKET or a per-user path in the temporary directory."""
+    return os.environ.get(
+        'PYSOR_SOCKET', os.path.join(tempfile.gettempdir(), 'pysor-%d.sock' % os.getuid()))
+
+def _attach(name):
+    r"""Attach to a segment owned by another process without handing it to the resource
+    tracker of this one, which would unlink it when this process exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+def _array(block, shape):
+    return np.ndarray(shape=tuple(shape), dtype=np.float64, buffer=block.buf)
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = dict(self.server.dispatch(json.loads(line.decode())), ok=True)
+            except Exception as error:
+                reply = dict(ok=False, error=type(error).__name__, message=str(error))
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+            self.wfile.flush()
+            if reply.get('stopping'):
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    r"""Serve solve requests on a Unix domain socket.
+
+    The server runs in a process of its own, see main(); it attaches to the segments of its
+    clients without tracking them.
+
+    Parameters
+    ----------
+    path : str
+        The socket path; a stale socket file is replaced, while a live one raises OSError.
+    threads : int, optional, default=1
+        The number of threads of each solve, see api.sor().
+    cache_bytes : int, optional, default=0
+        The capacity of the SolutionCache; 0 disables caching, and plans are used instead.
+    plans : int, optional, default=16
+        The number of Solver plans kept, least recently used first out.
+
+    """
+    daemon_threads = True
+    def __init__(self, path, threads=1, cache_bytes=0, plans=16):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.remove(path)
+            else:
+                raise OSError(errno.EADDRINUSE, "a server is listening on %r" % path)
+            finally:
+                probe.close()
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        self.path = path
+        self.threads = threads
+        self.cache = SolutionCache(maxbytes=cache_bytes) if cache_bytes > 0 else None
+        self.maxplans = plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+    def plan(self, shape, params):
+        r"""The Solver for shape and params with its lock, built on first use."""
+        key = (shape, repr(sorted(params.items())))
+        with self._lock:
+            entry = self._plans.pop(key, None)
+            if entry is None:
+                entry = (Solver(shape, threads=self.threads, **params), threading.Lock())
+            self._plans[key] = entry
+            while len(self._plans) > self.maxplans:
+                self._plans.popitem(last=False)
+        return entry
+    def stats(self):
+        stats = dict(requests=self.requests, plans=len(self._plans), threads=self.threads)
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+    def dispatch(self, request):
+        op = request.get('op')
+        with self._lock:
+            self.requests += 1
+        if op == 'ping':
+            return dict(pid=os.getpid())
+        if op == 'stats':
+            return self.stats()
+        if op == 'shutdown':
+            return dict(stopping=True)
+        if op != 'solve':
+            raise ValueError("unknown op %r" % (op,))
+        params = request.get('params', {})
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise TypeError("unknown parameters %s" % ', '.join(sorted(unknown)))
+        shape = tuple(request['shape'])
+        rho_block, phi_block = _attach(request['rho']), _attach(request['phi'])
+        try:
+            rho, phi = _array(rho_block, shape), _array(phi_block, shape)
+            if self.cache is not None:
+                api.sor(rho, out=phi, threads=self.threads, cache=self.cache, **params)
+            else:
+                solver, lock = self.plan(shape, params)
+                with lock:
+                    solver.solve(rho, out=phi)
+            del rho, phi
+        finally:
+            rho_block.close()
+            phi_block.close()
+        return dict()
+
+class ServerError(RuntimeError):
+    r"""A request failed on the server; the attribute error names the original type."""
+    def __init__(self, error, message):
+        RuntimeError.__init__(self, "%s: %s" % (error, message))
+        self.error = error
+
+class Client(object):
+    r"""A connection to a pysor server.
+
+    Parameters
+    ----------
+    path : str, optional, default=None
+        The socket path; default_socket() by default.
+
+    Examples
+    --------
+    >>> with Client() as client:
+    ...     phi = client.solve(rho, 0.1, boundary='dirichlet')
+
+    """
+    def __init__(self, path=None):
+        self.path = default_socket() if path is None else path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.path)
+        self._file = self._socket.makefile('rwb')
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def close(self):
+        self._file.close()
+        self._socket.close()
+    def request(self, **request):
+        r"""Send one request and return the reply; raises ServerError on failure."""
+        self._file.write((json.dumps(request) + '\n').encode())
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        reply = json.loads(line.decode())
+        if not reply.pop('ok'):
+            raise ServerError(reply['error'], reply['message'])
+        return reply
+    def ping(self):
+        return self.request(op='ping')
+    def stats(self):
+        return self.request(op='stats')
+    def shutdown(self):
+        r"""Stop the server after it has answered this request."""
+        return self.request(op='shutdown')
+    def solve(self, rho, h, **params):
+        r"""Solve on the server; params as in api.sor() except out, threads, and cache.
+
+        Returns
+        -------
+        numpy.ndarray(shape=rho.shape, dtype=numpy.float64)
+            The potential grid.
+
+        """
+        rho = np.asarray(rho, dtype=np.float64)
+        size = max(rho.nbytes, 1)
+        rho_block = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            phi_block = shared_memory.SharedMemory(create=True, size=size)
+            try:
+                _array(rho_block, rho.shape)[...] = rho
+                self.request(
+                    op='solve', rho=rho_block.name, phi=phi_block.name,
+                    shape=list(rho.shape), params=dict(params, h=h))
+                return _array(phi_block, rho.shape).copy()
+            finally:
+                phi_block.close()
+                phi_block.unlink()
+        finally:
+            rho_block.close()
+            rho_block.unlink()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='pysor-server', description="Serve pysor solves on a Unix domain socket.")
+    parser.add_argument(
+        '--socket', default=default_socket(), help="the socket path (default: %(default)s)")
+    parser.add_argument(
+        '--threads', type=int, default=1, help="threads per solve; 0 uses all")
+    parser.add_argument(
+        '--cache-bytes', type=int, default=0, help="capacity of the solution cache")
+    parser.add_argument(
+        '--plans', type=int, default=16, help="number of solver plans kept warm")
+    args = parser.parse_args(argv)
+    server = Server(
+        args.socket, threads=args.threads, cache_bytes=args.cache_bytes, plans=args.plans)
+    signal.signal(
+        signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
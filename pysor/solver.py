@@ -0,0 +1,148 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from ._ext import fast_sor as fs
+from . import boundary as bc
+from .api import allocate
+from .api import scaled_spacing
+
+METHODS = ('sor',)
+
+class Solver(object):
+    r"""A reusable plan for solving many Poisson equations on the same grid.
+
+    All parameters of sor() are validated and translated once; the solver owns its work
+    buffers, so each call only resets the potential and runs the sweeps.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The grid shape; allowed are (n,), (n, n), and (n, n, n).
+    h : float
+        The grid spacing along each axis.
+    epsilon : float, optional, default=1.0
+        The vacuum permittivity.
+    method : str, optional, default='sor'
+        The solution method; only 'sor' is available.
+    maxiter : int, optional, default=1000
+        The number of iterations.
+    maxerr : float, optional, default=1.0E-7
+        The convergence criterion.
+    w : float, optional, default=None
+        Overwrite the automatically computed SOR parameter.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition along each axis, see sor().
+    boundary_value : float or sequence, optional, default=0.0
+        The boundary values, see sor().
+    layout : str, optional, default='natural'
+        The storage layout, 'natural' or 'redblack', see sor().
+    threads : int, optional, default=1
+        The number of threads for 2D and 3D grids in the natural layout, see sor().
+
+    Examples
+    --------
+    >>> solver = Solver((32, 32), 0.1)
+    >>> phi = solver(rho)
+    >>> solver.solve(rho, out=phi)
+
+    """
+    def __init__(self, shape, h, epsilon=1.0, method='sor', maxiter=1000, maxerr=1.0E-7,
+        w=None, boundary='periodic', boundary_value=0.0, layout='natural', threads=1):
+        shape = tuple(int(s) for s in np.atleast_1d(shape))
+        dim = len(shape)
+        if dim not in (1, 2, 3):
+            raise ValueError("dimensionality must be 1, 2, 3; got %d" % dim)
+        if shape != (shape[0],) * dim:
+            raise ValueError("the grid must have the same size along each axis; got %s" % (shape,))
+        if method not in METHODS:
+            raise ValueError("method must be one of %s; got %r" % (METHODS, method))
+        if layout not in ('natural', 'redblack'):
+            raise ValueError("layout must be 'natural' or 'redblack'; got %r" % (layout,))
+        n = shape[0]
+        self.shape, self.h, self.epsilon, self.method = shape, h, epsilon, method
+        self.maxiter, self.maxerr, self.layout, self.threads = maxiter, maxerr, layout, threads
+        self.kinds, self.values = bc.parse(boundary, boundary_value, dim, h)
+        self.w = 2.0 / (1.0 + np.pi / float(n)) if w is None else float(w)
+        self.he = scaled_spacing(h, epsilon, dim)
+        if layout == 'natural':
+            self._phi = allocate(tuple(s + 2 for s in shape), threads, ghosts=True)
+            self._interior = bc.interior(self._phi)
+            self._rho = None if threads == 1 or dim == 1 else allocate(shape, threads)
+            self._kernel = (fs.sor_1d, fs.sor_2d, fs.sor_3d)[dim - 1]
+        else:
+            self._phi = np.zeros(shape=fs.rb_shape(n, dim), dtype=np.float64)
+            self._rho = np.zeros_like(self._phi)
+    def __call__(self, rho, out=None, phi0=None):
+        return self.solve(rho, out=out, phi0=phi0)
+    def solve(self, rho, out=None, phi0=None):
+        r"""Solve the Poisson equation for one charge density grid.
+
+        Parameters
+        ----------
+        rho : numpy.ndarray(shape=self.shape)
+            The charge density grid.
+        out : numpy.ndarray(shape=self.shape, dtype=numpy.float64), optional, default=None
+            Write the potential into this array instead of a new one.
+        phi0 : numpy.ndarray(shape=self.shape), optional, default=None
+            The initial guess for the potential; zero by default.
+
+        Returns
+        -------
+        numpy.ndarray(shape=self.shape, dtype=numpy.float64)
+            The potential grid.
+
+        """
+        if type(rho) is not np.ndarray or rho.dtype != np.float64 or not rho.flags.c_contiguous:
+            rho = np.ascontiguousarray(rho, dtype=np.float64)
+        if rho.shape != self.shape:
+            raise ValueError("rho must be of shape=%s; got %s" % (self.shape, rho.shape))
+        if out is None:
+            out = np.empty(shape=self.shape, dtype=np.float64)
+        elif out.shape != self.shape:
+            raise ValueError("out must be of shape=%s; got %s" % (self.shape, out.shape))
+        n, dim = self.shape[0], len(self.shape)
+        if self.layout == 'natural':
+            if self.threads == 1 or dim == 1:
+                self._phi.fill(0.0)
+            else:
+                fs.first_touch(self._phi, None, True, self.threads)
+                rho = fs.first_touch(self._rho, rho, False, self.threads)
+            if phi0 is not None:
+                self._interior[...] = phi0
+            if dim == 1:
+                self._kernel(
+                    self._phi, rho, self.w, self.he, self.maxiter, self.maxerr,
+                    self.kinds, self.values)
+            else:
+                self._kernel(
+                    self._phi, rho, self.w, self.he, self.maxiter, self.maxerr,
+                    self.kinds, self.values, self.threads)
+            out[...] = self._interior
+        else:
+            self._phi.fill(0.0)
+            if phi0 is not None:
+                fs.pack_rb(np.ascontiguousarray(phi0, dtype=np.float64), self._phi, False)
+            fs.pack_rb(rho, self._rho, False)
+            fs.sor_rb(
+                self._phi, self._rho, n, self.w, self.he, self.maxiter, self.maxerr,
+                self.kinds, self.values)
+            if out.dtype == np.float64 and out.flags.c_contiguous:
+                fs.unpack_rb(self._phi, out, False)
+            else:
+                out[...] = fs.unpack_rb(self._phi, np.empty(shape=self.shape), False)
+        return out
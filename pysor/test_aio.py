@@ -0,0 +1,55 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from .api import sor
+from .aio import sor_async
+
+def test_sor_async():
+    rho = np.random.rand(8, 8) - 0.5
+    phi = asyncio.run(sor_async(rho, 0.1, boundary='dirichlet'))
+    assert_array_equal(phi, sor(rho, 0.1, boundary='dirichlet'))
+    with pytest.raises(TypeError):
+        asyncio.run(sor_async(rho, 0.1, cancel=np.zeros(1, dtype=np.intc)))
+
+@pytest.mark.parametrize('kwargs', [
+    dict(), dict(threads=2), dict(layout='redblack'), dict(fast=False)])
+def test_sor_cancelled(kwargs):
+    rho = np.random.rand(6, 6, 6) - 0.5
+    phi0 = np.random.rand(6, 6, 6)
+    cancel = np.ones(shape=(1,), dtype=np.intc)
+    assert_array_equal(sor(rho, 0.1, phi0=phi0, cancel=cancel, **kwargs), phi0)
+
+def test_sor_async_timeout():
+    rho = np.random.rand(64, 64, 64) - 0.5
+    pool = ThreadPoolExecutor(max_workers=1)
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                sor_async(rho, 0.1, executor=pool, maxiter=10**9, maxerr=0.0), timeout=0.1)
+        start = time.monotonic()
+        await sor_async(rho[:4, :4, :4], 0.1, executor=pool)
+        return time.monotonic() - start
+    try:
+        assert asyncio.run(run()) < 5.0
+    finally:
+        pool.shutdown()
@@ -15,7 +15,9 @@
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
+import pytest
 from .api import sor
+from .api import sor_batch
 from .api import laplacian
 from numpy.testing import assert_array_equal
 from numpy.testing import assert_array_almost_equal
@@ -45,11 +47,13 @@ def test_laplacian_3d():
 #   product with the corresponding laplacian. If the computed rho is close
 #   enough to the original rho, the test ist passed.
 
-def check_poisson_consistency(rho, h, maxiter, maxerr):
+def check_poisson_consistency(rho, h, maxiter, maxerr, boundary='periodic', fast=False):
     assert_array_almost_equal(
         np.dot(
-            laplacian(rho.shape[0], rho.ndim),
-            sor(rho, h, maxiter=maxiter, maxerr=maxerr, fast=False).reshape((-1,))).reshape(rho.shape),
+            laplacian(rho.shape[0], rho.ndim, boundary=boundary),
+            sor(
+                rho, h, maxiter=maxiter, maxerr=maxerr, fast=fast,
+                boundary=boundary).reshape((-1,))).reshape(rho.shape),
         h**rho.ndim * (-rho),
         decimal=4)
 
@@ -113,3 +117,151 @@ def test_sor_3d_random_fast():
         sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=True),
         sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=False),
         decimal=12)
+
+#   These tests cover the non-periodic boundary conditions of the ghost layer
+
+def test_sor_1d_dirichlet_linear_profile():
+    n = np.random.randint(10, 20)
+    for fast in (True, False):
+        assert_array_almost_equal(
+            sor(np.zeros(n), 1.0, maxiter=100000, maxerr=1.0E-20, fast=fast,
+                boundary='dirichlet', boundary_value=(0.0, 1.0)),
+            np.arange(1, n + 1) / float(n + 1),
+            decimal=8)
+
+def test_sor_1d_neumann_slope():
+    n = np.random.randint(10, 20)
+    h = 0.1
+    phi = sor(
+        np.zeros(n), h, maxiter=100000, maxerr=1.0E-20,
+        boundary=['neumann'], boundary_value=[(-1.0, 1.0)])
+    assert_array_almost_equal(np.diff(phi), h * np.ones(n - 1), decimal=8)
+
+def test_sor_2d_random_boundaries():
+    n = np.random.randint(20, 30)
+    g = np.linspace(0, 1, n, endpoint=False)
+    x, y = np.meshgrid(g, g)
+    rho = np.exp((-100.0) * ((x - 0.3)**2 + (y - 0.3)**2))
+    for boundary in (('dirichlet', 'periodic'), ('dirichlet', 'neumann'), 'dirichlet'):
+        check_poisson_consistency(rho, g[1] - g[0], 100000, 1.0E-12, boundary=boundary, fast=True)
+        assert_array_almost_equal(
+            sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=True, boundary=boundary),
+            sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=False, boundary=boundary),
+            decimal=12)
+
+def test_sor_3d_random_boundaries():
+    n = np.random.randint(8, 12)
+    g = np.linspace(0, 1, n, endpoint=False)
+    x, y, z = np.meshgrid(g, g, g)
+    rho = np.exp((-100.0) * ((x - 0.3)**2 + (y - 0.3)**2 + (z - 0.3)**2))
+    boundary = ('dirichlet', 'neumann', 'periodic')
+    check_poisson_consistency(rho, g[1] - g[0], 100000, 1.0E-12, boundary=boundary, fast=True)
+    assert_array_almost_equal(
+        sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=True,
+            boundary=boundary, boundary_value=[0.5, 0.0, 0.0]),
+        sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, fast=False,
+            boundary=boundary, boundary_value=[0.5, 0.0, 0.0]),
+        decimal=12)
+
+def test_sor_invalid_boundary():
+    with pytest.raises(ValueError):
+        sor(np.zeros(4), 1.0, boundary='open')
+    with pytest.raises(ValueError):
+        sor(np.zeros((4, 4)), 1.0, boundary=('dirichlet',))
+    with pytest.raises(ValueError):
+        sor(np.zeros((4, 4)), 1.0, boundary='dirichlet', boundary_value=np.zeros(3))
+
+def test_sor_layouts():
+    n = np.random.randint(10, 20)
+    g = np.linspace(0, 1, n, endpoint=False)
+    x, y, z = np.meshgrid(g, g, g)
+    rho = np.exp((-100.0) * ((x - 0.3)**2 + (y - 0.3)**2 + (z - 0.3)**2))
+    rho -= rho.mean()
+    assert_array_almost_equal(
+        sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, layout='redblack'),
+        sor(rho, g[1] - g[0], maxiter=100000, maxerr=1.0E-10, layout='natural'),
+        decimal=12)
+    with pytest.raises(ValueError):
+        sor(rho, g[1] - g[0], layout='blocked')
+
+def test_sor_memmap(tmp_path):
+    n = 12
+    rho = np.memmap(str(tmp_path / 'rho.dat'), dtype=np.float64, mode='w+', shape=(n, n, n))
+    rho[:] = np.random.rand(n, n, n) - 0.5
+    for boundary in ('periodic', 'dirichlet'):
+        out = np.memmap(str(tmp_path / 'phi.dat'), dtype=np.float64, mode='w+', shape=(n, n, n))
+        phi = sor(rho, 0.1, maxiter=20, maxerr=-1.0, boundary=boundary, out=out)
+        assert phi is out
+        assert_array_equal(out, sor(np.array(rho), 0.1, maxiter=20, maxerr=-1.0, boundary=boundary))
+
+def test_sor_threads():
+    rho = np.random.rand(9, 9, 9) - 0.5
+    assert_array_equal(sor(rho, 0.1, threads=3), sor(rho, 0.1))
+
+def test_sor_batch():
+    for dim in (1, 2, 3):
+        rho = np.random.rand(*((5,) + (6,) * dim)) - 0.5
+        for threads in (1, 3):
+            phi = sor_batch(rho, 0.1, boundary='dirichlet', threads=threads)
+            assert phi.shape == rho.shape
+            for i in range(rho.shape[0]):
+                assert_array_equal(phi[i], sor(rho[i], 0.1, boundary='dirichlet'))
+    with pytest.raises(ValueError):
+        sor_batch(np.zeros(4), 0.1)
+
+def test_sor_full_output():
+    rho = np.random.rand(8, 8) - 0.5
+    kwargs = dict(boundary='dirichlet', maxerr=1.0E-12, full_output=True)
+    phi, info = sor(rho, 0.1, **kwargs)
+    assert info['status'] == 'converged' and info['error'] < 1.0E-12
+    assert_array_equal(phi, sor(rho, 0.1, boundary='dirichlet', maxerr=1.0E-12))
+    for options in (dict(layout='redblack'), dict(fast=False)):
+        _, other = sor(rho, 0.1, **dict(kwargs, **options))
+        assert other['iterations'] == info['iterations']
+    _, info = sor(rho, 0.1, boundary='dirichlet', maxiter=3, maxerr=0.0, full_output=True)
+    assert (info['iterations'], info['status']) == (3, 'maxiter')
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_sor_deadline(fast):
+    import time
+    rho = np.random.rand(24, 24, 24) - 0.5
+    phi, info = sor(rho, 0.1, fast=fast, time_budget=0.0, full_output=True)
+    assert_array_equal(phi, 0.0)
+    assert (info['iterations'], info['status']) == (0, 'deadline')
+    start = time.monotonic()
+    phi, info = sor(
+        rho, 0.1, fast=fast, maxiter=10**9, maxerr=0.0, deadline=start + 0.2,
+        full_output=True)
+    assert time.monotonic() - start < 5.0
+    assert info['status'] == 'deadline' and info['iterations'] > 0
+    assert np.isfinite(info['error']) and np.any(phi != 0.0)
+
+@pytest.mark.parametrize('n', [6, 7])
+@pytest.mark.parametrize('dim,boundary', [
+    (1, 'periodic'), (1, 'neumann'), (2, 'periodic'), (2, ('periodic', 'dirichlet')),
+    (3, 'periodic'), (3, ('neumann', 'periodic', 'periodic')), (3, 'dirichlet')])
+def test_sor_numpy_backend(n, dim, boundary):
+    rho = np.random.rand(*(n,) * dim) - 0.5
+    phi0 = np.random.rand(*(n,) * dim)
+    kwargs = dict(
+        boundary=boundary, boundary_value=0.5, maxiter=300, maxerr=1.0E-10, phi0=phi0,
+        full_output=True)
+    phi, info = sor(rho, 0.1, backend='numpy', **kwargs)
+    phi_ref, info_ref = sor(rho, 0.1, backend='c', **kwargs)
+    assert_array_equal(phi, phi_ref)
+    assert info == info_ref
+    with pytest.raises(ValueError):
+        sor(rho, 0.1, backend='fortran')
+
+@pytest.mark.parametrize('n', [6, 7])
+@pytest.mark.parametrize('dim,boundary', [
+    (1, 'periodic'), (2, ('periodic', 'neumann')), (3, 'periodic'), (3, 'dirichlet')])
+def test_sor_numba_backend(n, dim, boundary):
+    pytest.importorskip('numba')
+    rho = np.random.rand(*(n,) * dim) - 0.5
+    kwargs = dict(
+        boundary=boundary, boundary_value=0.5, maxiter=300, maxerr=1.0E-10, full_output=True)
+    phi, info = sor(rho, 0.1, backend='numba', threads=2, **kwargs)
+    phi_ref, info_ref = sor(rho, 0.1, backend='c', **kwargs)
+    assert_array_equal(phi, phi_ref)
+    assert info == info_ref
@@ -0,0 +1,89 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+from .api import sor
+from . import backends as bk
+
+@pytest.fixture
+def plugin():
+    calls = []
+    def function(rho, h, **kwargs):
+        calls.append(kwargs['threads'])
+        kwargs['info'].update(iterations=1, error=0.0)
+        return np.full(rho.shape, rho.dtype.itemsize, dtype=rho.dtype)
+    backend = bk.Backend(
+        'plugin', function, priority=100, dims=(2,), dtypes=('float32', 'float64'),
+        boundaries=('periodic',), threads=True)
+    bk.register(backend)
+    yield backend, calls
+    bk.unregister('plugin')
+
+def test_builtin_backends():
+    assert set(bk.names()) >= {'openmp', 'c', 'numba', 'numpy', 'python'}
+    assert 'python' in bk.names(available=True)
+    with pytest.raises(ValueError):
+        bk.register(bk.get('python'))
+    with pytest.raises(ValueError):
+        bk.select(3, np.complex128)
+    with pytest.raises(ValueError):
+        sor(np.zeros(4), 1.0, backend='auto', boundary='open')
+
+def test_auto_prefers_capable_plugin(plugin):
+    backend, calls = plugin
+    assert bk.select(2) is backend
+    assert bk.select(2, np.float32, threads=4) is backend
+    assert bk.select(3) is not backend
+    assert bk.select(2, boundary='dirichlet') is not backend
+    assert bk.select(2, layout='redblack') is not backend
+    phi = sor(np.zeros((4, 4), dtype=np.float32), 1.0, threads=3)
+    assert phi.dtype == np.float32 and np.all(phi == 4) and calls == [3]
+    phi = sor(np.zeros((4, 4)), 1.0, backend='auto')
+    assert np.all(phi == 8)
+    assert_array_equal(sor(np.ones(4), 1.0, backend='auto'), sor(np.ones(4), 1.0, backend='c'))
+
+def test_unavailable_backend(plugin):
+    backend, calls = plugin
+    backend._available = lambda: False
+    assert bk.select(2) is not backend
+    assert 'plugin' not in bk.names(available=True)
+    with pytest.raises(ImportError):
+        sor(np.zeros((4, 4)), 1.0, backend='plugin')
+    assert calls == []
+
+def test_explicit_backend_capabilities(plugin):
+    rho = np.random.rand(6, 6) - 0.5
+    with pytest.raises(ValueError):
+        sor(rho, 1.0, backend='numpy', layout='bogus')
+    with pytest.raises(ValueError):
+        sor(rho, 1.0, backend='numpy', layout='redblack')
+    with pytest.raises(ValueError):
+        sor(rho, 1.0, backend='numpy', threads=4)
+    with pytest.raises(ValueError):
+        sor(rho, 1.0, backend='c', threads=0)
+    with pytest.raises(ValueError):
+        sor(rho.astype(np.complex128), 1.0, backend='python')
+    with pytest.raises(ValueError):
+        sor(np.zeros((4, 4, 4)), 1.0, backend='plugin')
+    with pytest.raises(ValueError):
+        sor(rho, 1.0, backend='plugin', boundary='dirichlet')
+    backend, calls = plugin
+    sor(rho, 1.0, backend='plugin', threads=4)
+    assert calls == [4]
+    sor(rho, 1.0, backend='c', layout='redblack')
@@ -0,0 +1,82 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import numpy as np
+from .benchmarks import Case
+from .benchmarks import cases
+from .benchmarks import density
+from .benchmarks import measure
+from .benchmarks import main
+
+def test_cases():
+    selected = cases(dims=(2,), sizes=(8, 64), backends=['c', 'numpy'], threads=(1, 2),
+        layouts=('natural', 'redblack'))
+    assert Case(2, 8, 'sor', 'c', 'redblack', 1) in selected
+    assert Case(2, 8, 'sor', 'numpy', 'redblack', 1) not in selected
+    assert Case(2, 8, 'direct', None, None, 1) in selected
+    assert Case(2, 64, 'direct', None, None, 1) not in selected
+    assert all(c.threads == 1 for c in selected if c.backend == 'numpy')
+
+def test_density():
+    rho, h = density(10, 3)
+    assert rho.shape == (10, 10, 10) and h == 0.1 and abs(rho.mean()) < 1.0E-15
+
+def test_measure():
+    record = measure(Case(2, 16, 'sor', 'c', 'natural', 1), sweeps=7, repeat=1)
+    assert record['sweeps'] == 7 and record['cells'] == 256 and record['status'] == 'maxiter'
+    assert np.isclose(record['updates_per_second'], 7 * 256 / record['seconds'])
+    assert np.isclose(record['bandwidth'], 24 * record['updates_per_second'])
+    assert record['peak_rss'] is None or record['peak_rss'] > 0
+    record = measure(Case(1, 32, 'fft', None, None, 1), repeat=1)
+    assert record['sweeps'] == 1 and record['bandwidth'] is None
+
+def test_cli(tmpdir):
+    output = str(tmpdir.join('results.json'))
+    main(['--dims', '1', '--sizes', '16', '--methods', 'sor', 'fft', '--backends', 'c',
+        '--sweeps', '3', '--repeat', '1', '-o', output])
+    with open(output) as f:
+        report = json.load(f)
+    assert report['parameters']['sweeps'] == 3
+    assert [(r['method'], r['backend']) for r in report['results']] == [('sor', 'c'), ('fft', None)]
+    assert 'c' in report['machine']['backends']
+
+def test_ratio_interval():
+    from .benchmarks.compare import ratio_interval, verdict
+    random = np.random.RandomState(1)
+    baseline = 1.0 + 0.01 * random.rand(20)
+    ratio, low, high = ratio_interval(baseline, 1.2 * baseline)
+    assert np.isclose(ratio, 1.2) and low <= ratio <= high and low > 1.1
+    assert verdict(low, high, 0.05) == 'regression'
+    ratio, low, high = ratio_interval(baseline, 0.5 * baseline[::-1])
+    assert verdict(low, high, 0.05) == 'improvement'
+    ratio, low, high = ratio_interval(baseline, baseline[::-1])
+    assert verdict(low, high, 0.05) == 'unchanged'
+
+def test_compare_builds():
+    import os
+    from .benchmarks.compare import Build, compare, markdown
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    build = Build(root)
+    report = compare(build, build, [Case(1, 16, 'sor', 'c', 'natural', 1),
+        Case(1, 16, 'sor', 'missing', 'natural', 1)], repeat=3, warmup=1, rounds=1, sweeps=5,
+        threshold=10.0)
+    first, second = report['results']
+    assert len(first['baseline']) == 3 and first['sweeps'] == 5
+    assert first['verdict'] == 'unchanged' and second['verdict'] == 'skipped'
+    assert report['regressions'] == 0
+    assert "| 1D n=16 sor c/natural/1 |" in markdown(report)
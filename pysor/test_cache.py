@@ -0,0 +1,147 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import numpy as np
+from numpy.testing import assert_array_equal
+from numpy.testing import assert_allclose
+from .api import sor
+from .cache import SolutionCache
+from .cache import DiskCache
+
+def test_cache_rescales_hits():
+    cache = SolutionCache()
+    rho = np.random.rand(12, 12)
+    rho -= rho.mean()
+    for boundary in ('periodic', 'dirichlet'):
+        phi = sor(rho, 0.1, boundary=boundary, maxerr=1.0E-20, cache=cache)
+        phi_ref = sor(rho, 0.1, boundary=boundary, maxerr=1.0E-20)
+        assert_allclose(phi, phi_ref, rtol=0.0, atol=1.0E-12 * np.abs(phi_ref).max())
+        for factor, h, epsilon in ((3.0, 0.1, 1.0), (0.5, 0.2, 2.0)):
+            phi = sor(factor * rho, h, epsilon=epsilon, boundary=boundary, cache=cache)
+            phi_ref = sor(factor * rho, h, epsilon=epsilon, boundary=boundary, maxerr=1.0E-20)
+            assert_allclose(phi, phi_ref, rtol=0.0, atol=1.0E-7 * np.abs(phi_ref).max())
+    assert cache.stats()['hits'] == 4 and cache.stats()['misses'] == 2 and len(cache) == 2
+
+def test_cache_tolerance():
+    cache = SolutionCache()
+    rho = np.random.rand(8, 8, 8)
+    rho -= rho.mean()
+    sor(rho, 0.1, maxerr=1.0E-6, cache=cache)
+    sor(rho, 0.1, maxerr=1.0E-9, cache=cache)
+    sor(rho, 0.1, maxerr=1.0E-7, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 2) and len(cache) == 1
+
+def test_cache_inhomogeneous():
+    cache = SolutionCache()
+    rho = np.random.rand(10) - 0.5
+    kwargs = dict(boundary='dirichlet', boundary_value=(0.0, 1.0))
+    phi = sor(rho, 0.1, cache=cache, **kwargs)
+    assert_array_equal(phi, sor(rho, 0.1, **kwargs))
+    assert_array_equal(sor(rho, 0.1, cache=cache, **kwargs), phi)
+    sor(rho, 0.2, cache=cache, **kwargs)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_cache_skips_unconverged():
+    cache = SolutionCache()
+    rho = np.random.rand(12, 12) - 0.5
+    for i in range(2):
+        _, info = sor(rho, 0.1, maxiter=2, maxerr=1.0E-20, cache=cache, full_output=True)
+        assert info['status'] == 'maxiter' and not info['converged']
+    assert (cache.hits, cache.misses) == (0, 2) and len(cache) == 0
+
+def test_cache_lru():
+    cache = SolutionCache(maxbytes=2 * 8 * 16)
+    rhos = [rho - rho.mean() for rho in np.random.rand(3, 16)]
+    for rho in rhos:
+        sor(rho, 0.1, cache=cache)
+    assert len(cache) == 2 and cache.evictions == 1 and cache.nbytes == 2 * 8 * 16
+    sor(rhos[2], 0.1, cache=cache)
+    sor(rhos[0], 0.1, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+def test_sor_phi0():
+    rho = np.random.rand(12, 12)
+    rho -= rho.mean()
+    phi = sor(rho, 0.1, maxerr=1.0E-20)
+    assert_allclose(sor(rho, 0.1, maxiter=1, phi0=phi), phi, rtol=0.0, atol=1.0E-6 * np.abs(phi).max())
+    assert_allclose(sor(rho, 0.1, maxiter=1, phi0=phi, fast=False), phi, rtol=0.0,
+        atol=1.0E-6 * np.abs(phi).max())
+
+def test_cache_warm_start():
+    cache = SolutionCache()
+    rho = np.random.rand(16, 16)
+    rho -= rho.mean()
+    sor(rho, 0.1, maxerr=1.0E-20, cache=cache)
+    perturbed = rho + 1.0E-6 * np.random.rand(16, 16)
+    perturbed -= perturbed.mean()
+    phi = sor(perturbed, 0.1, maxiter=5, cache=cache)
+    phi_ref = sor(perturbed, 0.1, maxerr=1.0E-20)
+    assert cache.warm_starts == 1
+    assert_allclose(phi, phi_ref, rtol=0.0, atol=1.0E-4 * np.abs(phi_ref).max())
+
+def test_disk_cache(tmp_path):
+    rho = np.random.rand(8, 8, 8) - 0.5
+    cache = DiskCache(str(tmp_path))
+    phi = sor(rho, 0.1, boundary='dirichlet', cache=cache)
+    other = DiskCache(str(tmp_path))
+    assert_array_equal(sor(rho, 0.1, boundary='dirichlet', cache=other), phi)
+    assert_allclose(
+        sor(0.5 * rho, 0.1, boundary='dirichlet', cache=other), 0.5 * phi,
+        rtol=1.0E-12)
+    assert (other.hits, other.misses) == (2, 0) and len(other) == 1
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
+    other.clear()
+    assert len(cache) == 0
+
+def test_disk_cache_lru(tmp_path):
+    buf = io.BytesIO()
+    np.save(buf, np.zeros(16))
+    size = len(buf.getvalue())
+    cache = DiskCache(str(tmp_path), maxbytes=2 * size)
+    rhos = [rho - rho.mean() for rho in np.random.rand(3, 16)]
+    for i, rho in enumerate(rhos):
+        seen = set(os.listdir(str(tmp_path)))
+        sor(rho, 0.1, cache=cache)
+        for name in set(os.listdir(str(tmp_path))) - seen:
+            if name.endswith('.npy'):
+                os.utime(os.path.join(str(tmp_path), name), (i, i))
+    assert len(cache) == 2 and cache.evictions == 1 and cache.stats()['nbytes'] == 2 * size
+    sor(rhos[2], 0.1, cache=cache)
+    sor(rhos[0], 0.1, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+def test_cache_shared_by_threads():
+    import threading
+    cache = SolutionCache(maxbytes=6 * 8 * 10 * 10)
+    rhos = [np.random.rand(10, 10) - 0.5 for i in range(12)]
+    errors = []
+    def work(index):
+        try:
+            for r in range(20):
+                sor(rhos[(index * 5 + r) % len(rhos)], 0.1, boundary='dirichlet', cache=cache)
+        except Exception as e:
+            errors.append(e)
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stats = cache.stats()
+    assert errors == [] and stats['hits'] + stats['misses'] == 160
+    assert stats['entries'] <= 6 and stats['nbytes'] == 8 * 100 * stats['entries']
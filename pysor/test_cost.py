@@ -0,0 +1,86 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+from .api import sor
+from .api import laplacian
+from . import cost
+
+@pytest.fixture(autouse=True)
+def defaults(tmpdir, monkeypatch):
+    monkeypatch.setenv('PYSOR_COST', str(tmpdir.join('cost.json')))
+
+@pytest.mark.parametrize('dim,n', [(1, 17), (2, 12), (3, 6)])
+@pytest.mark.parametrize('method,boundary', [
+    ('fft', 'periodic'), ('direct', 'periodic'), ('direct', 'dirichlet'),
+    ('direct', ('neumann', 'dirichlet', 'periodic'))])
+def test_direct_methods_solve_the_sor_system(dim, n, method, boundary):
+    boundary = boundary if isinstance(boundary, str) else boundary[:dim]
+    rho = np.random.rand(*(n,) * dim) - 0.5
+    rho -= rho.mean()
+    kwargs = dict(boundary=boundary, boundary_value=0.0)
+    phi, info = sor(rho, 0.1, method=method, full_output=True, **kwargs)
+    assert info['status'] == 'converged'
+    assert_array_almost_equal(
+        np.dot(laplacian(n, dim, boundary=boundary), phi.reshape(-1)).reshape(rho.shape),
+        -0.1**dim * rho, decimal=12)
+    phi_sor = sor(rho, 0.1, maxerr=1.0E-24, maxiter=100000, **kwargs)
+    if np.all([b != 'dirichlet' for b in np.atleast_1d(boundary)]):
+        phi_sor -= phi_sor.mean()
+    assert_array_almost_equal(phi, phi_sor, decimal=8)
+
+def test_fft_requires_periodic_boundaries():
+    with pytest.raises(ValueError):
+        sor(np.zeros((4, 4)), 1.0, boundary='dirichlet', method='fft')
+    with pytest.raises(ValueError):
+        sor(np.zeros(4), 1.0, method='multigrid')
+
+def test_plan_cost():
+    plans = cost.plan_cost((64, 64), h=1.0 / 64)
+    assert set(plans) == {'sor', 'fft', 'direct'}
+    assert plans['direct']['bytes'] == 16 * 64**4
+    assert 'fft' not in cost.plan_cost((64, 64), boundary='dirichlet')
+    loose = cost.plan_cost((64, 64), maxerr=1.0E-3, methods=['sor'])['sor']
+    tight = cost.plan_cost((64, 64), maxerr=1.0E-12, maxiter=10, methods=['sor'])['sor']
+    assert loose['iterations'] < cost.plan_cost((64, 64), methods=['sor'])['sor']['iterations']
+    assert tight['iterations'] == 10
+    assert cost.choose((64, 64), h=1.0 / 64) == 'fft'
+    assert cost.choose((64, 64), boundary='dirichlet', memory=1 << 20) == 'sor'
+    assert cost.choose((4, 4), boundary='dirichlet') in ('sor', 'direct')
+
+def test_sor_method_auto():
+    rho = np.random.rand(16, 16, 16) - 0.5
+    rho -= rho.mean()
+    phi, info = sor(rho, 0.1, method='auto', full_output=True)
+    assert info['iterations'] == 1
+    assert_array_almost_equal(phi, sor(rho, 0.1, method='fft'), decimal=14)
+
+def test_method_with_cache():
+    from .cache import SolutionCache
+    cache = SolutionCache()
+    rho = np.random.rand(12, 12) - 0.5
+    rho -= rho.mean()
+    phi, info = sor(rho, 0.1, method='fft', cache=cache, full_output=True)
+    assert info['iterations'] == 1 and info['status'] == 'converged'
+    assert_array_almost_equal(phi, sor(rho, 0.1, method='fft'), decimal=14)
+    assert cache.hits + cache.misses == 0
+    with pytest.raises(ValueError):
+        sor(rho, 0.1, method='bogus', cache=cache)
+    sor(rho, 0.1, method='sor', cache=cache)
+    assert cache.misses == 1
@@ -0,0 +1,33 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from .api import sor
+from .distributed import launch
+
+@pytest.mark.parametrize('n,dim,boundary,ranks', [
+    (9, 2, 'periodic', 3), (7, 3, 'periodic', 2), (8, 3, 'periodic', 1), (5, 2, 'periodic', 1),
+    (10, 2, ('dirichlet', 'neumann'), 4), (6, 3, ('neumann', 'periodic', 'dirichlet'), 2)])
+def test_launch(n, dim, boundary, ranks):
+    rho = np.random.rand(*(n,) * dim) - 0.5
+    kwargs = dict(boundary=boundary, boundary_value=0.25, maxiter=200, maxerr=1.0E-9)
+    phi_ref, info = sor(rho, 0.1, full_output=True, **kwargs)
+    phi, iterations = launch(rho, 0.1, ranks=ranks, full_output=True, timeout=60, **kwargs)
+    assert iterations == info['iterations']
+    assert_array_equal(phi, phi_ref)
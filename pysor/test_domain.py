@@ -0,0 +1,38 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from .api import sor
+from .domain import sor_domains
+
+@pytest.mark.parametrize('n,dim,boundary', [
+    (9, 2, 'periodic'), (8, 3, 'periodic'), (7, 3, 'periodic'),
+    (10, 2, ('dirichlet', 'neumann')), (7, 3, ('neumann', 'periodic', 'dirichlet'))])
+def test_sor_domains(n, dim, boundary):
+    rho = np.random.rand(*(n,) * dim) - 0.5
+    kwargs = dict(boundary=boundary, boundary_value=0.25, maxiter=200, maxerr=1.0E-9)
+    phi_ref, info = sor(rho, 0.1, full_output=True, **kwargs)
+    for workers in (1, 3):
+        phi, iterations = sor_domains(rho, 0.1, workers=workers, full_output=True, **kwargs)
+        assert iterations == info['iterations']
+        assert_array_equal(phi, phi_ref)
+
+def test_sor_domains_invalid():
+    with pytest.raises(ValueError):
+        sor_domains(np.zeros(8), 0.1)
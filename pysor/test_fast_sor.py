@@ -0,0 +1,136 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+from ._ext import fast_sor as fs
+from . import boundary as bc
+
+#   These tests cover the red/black storage layout of the extension
+
+def test_pack_unpack_rb():
+    for dim in (1, 2, 3):
+        n = np.random.randint(4, 10)
+        for ghosts in (True, False):
+            natural = np.random.rand(*((n + 2 * ghosts,) * dim))
+            rb = fs.pack_rb(natural, np.zeros(fs.rb_shape(n, dim)), ghosts)
+            assert_array_equal(fs.unpack_rb(rb, np.zeros_like(natural), ghosts), natural)
+
+def test_sor_rb_matches_natural():
+    sor_natural = (fs.sor_1d, fs.sor_2d, fs.sor_3d)
+    for dim in (1, 2, 3):
+        for n in (6, 7):
+            rho = np.random.rand(*((n,) * dim))
+            for boundary in ('periodic', 'dirichlet', 'neumann', ('periodic', 'neumann', 'dirichlet')[:dim]):
+                kinds, values = bc.parse(boundary, np.random.rand(dim, 2), dim, 0.1)
+                phi = np.zeros((n + 2,) * dim)
+                sor_natural[dim - 1](phi, rho, 1.5, 0.1, 25, -1.0, kinds, values)
+                phi_rb = np.zeros(fs.rb_shape(n, dim))
+                rho_rb = fs.pack_rb(rho, np.zeros_like(phi_rb), False)
+                fs.sor_rb(phi_rb, rho_rb, n, 1.5, 0.1, 25, -1.0, kinds, values)
+                assert_array_equal(
+                    fs.unpack_rb(phi_rb, np.zeros_like(rho), False), bc.interior(phi))
+
+def test_sweep_slabs():
+    n, w, he = 7, 1.5, 0.1
+    rho = np.random.rand(n, n, n)
+    kinds, values = bc.parse('dirichlet', 0.0, 3, 0.1)
+    phi = np.zeros((n + 2,) * 3)
+    fs.sor_3d(phi, rho, w, he, 1, -1.0, kinds, values)
+    phi_slabs = np.zeros_like(phi)
+    for color in (1, 0):
+        for start, stop in ((0, 3), (3, 4), (4, n)):
+            fs.sweep_3d(phi_slabs, rho, w, he, color, kinds, start, stop)
+    assert_array_equal(phi_slabs, phi)
+    with pytest.raises(ValueError):
+        fs.sweep_3d(phi_slabs, rho, w, he, 0, kinds, 3, n + 1)
+
+@pytest.mark.skipif(sys.maxsize < 2**32, reason="requires 64-bit addressing")
+def test_sweep_large_grid(tmp_path):
+    #   (n + 2)**3 > 2**31: the last plane is only reachable with 64-bit offsets;
+    #   the sparse memmaps only allocate the pages that are actually touched
+    n, w, he = 1300, 1.5, 0.1
+    try:
+        phi = np.memmap(str(tmp_path / 'phi.dat'), dtype=np.float64, mode='w+', shape=(n + 2,) * 3)
+        rho = np.memmap(str(tmp_path / 'rho.dat'), dtype=np.float64, mode='w+', shape=(n,) * 3)
+    except (OSError, ValueError, OverflowError):
+        pytest.skip("cannot create a sparse memmap of %d bytes" % (8 * (n + 2)**3))
+    rho[-1, -1, -1] = 1.0
+    kinds, values = bc.parse('dirichlet', 0.0, 3, 0.1)
+    fs.sweep_3d(phi, rho, w, he, (3 * (n - 1)) % 2, kinds, n - 1, n)
+    assert phi[-2, -2, -2] == w * (0.166666666666666657 * he)
+    assert phi[-2, -2, -3] == 0.0
+    del phi, rho
+
+def test_empty_aligned():
+    for huge_pages in (False, True):
+        phi = fs.empty_aligned((5, 7, 3), huge_pages=huge_pages)
+        assert phi.shape == (5, 7, 3) and phi.dtype == np.float64 and phi.flags.c_contiguous
+        assert phi.ctypes.data % fs.ALIGNMENT == 0
+    assert fs.empty_aligned(4, alignment=256).ctypes.data % 256 == 0
+    with pytest.raises(ValueError):
+        fs.empty_aligned(4, alignment=48)
+
+def test_first_touch():
+    src = np.random.rand(6, 5)
+    assert_array_equal(fs.first_touch(fs.empty_aligned((6, 5)), src, False, 3), src)
+    phi = fs.first_touch(np.full((8, 5), np.nan), src, True, 2)
+    assert_array_equal(phi[1:-1], src)
+    assert_array_equal(phi[[0, -1]], 0.0)
+    assert_array_equal(fs.first_touch(np.ones((4, 4)), None, False, 0), 0.0)
+
+def test_sor_parallel_matches_serial():
+    sor_natural = (fs.sor_2d, fs.sor_3d)
+    for dim in (2, 3):
+        for n in (6, 7):
+            rho = np.random.rand(*((n,) * dim))
+            for boundary in ('periodic', 'dirichlet', ('neumann', 'periodic', 'periodic')[:dim]):
+                kinds, values = bc.parse(boundary, np.random.rand(dim, 2), dim, 0.1)
+                phi = np.zeros((n + 2,) * dim)
+                sor_natural[dim - 2](phi, rho, 1.5, 0.1, 10, -1.0, kinds, values)
+                for threads in (2, 3, 0):
+                    phi_parallel = np.zeros_like(phi)
+                    sor_natural[dim - 2](phi_parallel, rho, 1.5, 0.1, 10, -1.0, kinds, values, threads)
+                    assert_array_equal(phi_parallel, phi)
+
+def test_sor_batch_stops_members_early():
+    n = 8
+    rho = np.random.rand(3, n, n) - 0.5
+    rho[1] = 0.0
+    kinds, values = bc.parse('periodic', 0.0, 2, 0.1)
+    phi = np.zeros((3, n + 2, n + 2))
+    iterations = fs.sor_batch(phi, rho, 1.5, 0.01, 500, 1.0E-10, kinds, values, 2)
+    assert iterations[1] == 1 and iterations[0] > 1 and iterations[2] > 1
+    for i in (0, 2):
+        phi_single = np.zeros((n + 2, n + 2))
+        fs.sor_2d(phi_single, rho[i], 1.5, 0.01, iterations[i], -1.0, kinds, values)
+        assert_array_equal(phi[i], phi_single)
+
+def test_sor_multi_matches_single():
+    for n in (6, 7):
+        for boundary in ('periodic', 'dirichlet', ('neumann', 'periodic', 'dirichlet')):
+            kinds, values = bc.parse(boundary, np.random.rand(3, 2), 3, 0.1)
+            rho = np.random.rand(n, n, n, 7) - 0.5
+            rho[..., 3] *= 1.0E-3
+            phi = np.zeros((n + 2, n + 2, n + 2, 7))
+            iterations = fs.sor_multi_3d(phi, rho, 1.5, 0.1, 200, 1.0E-10, kinds, values)
+            for l in range(7):
+                phi_single = np.zeros((n + 2, n + 2, n + 2))
+                fs.sor_3d(phi_single, np.ascontiguousarray(rho[..., l]), 1.5, 0.1, 200, 1.0E-10, kinds, values)
+                assert_array_equal(bc.interior(phi[..., l]), bc.interior(phi_single))
+            assert iterations.shape == (7,) and iterations.min() >= 1
@@ -0,0 +1,54 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import subprocess
+
+def run(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode().split()
+
+def test_import_is_lazy():
+    modules = run(
+        "import subprocess\n"
+        "def fail(*args, **kwargs):\n"
+        "    raise AssertionError('import pysor started a subprocess')\n"
+        "subprocess.Popen = fail\n"
+        "import sys, pysor\n"
+        "print(' '.join(m for m in sys.modules if m.startswith('pysor') or m == 'numpy'))")
+    assert modules == ['pysor']
+
+def test_lazy_attributes():
+    import pysor
+    from .api import sor
+    from . import server
+    assert pysor.sor is sor and pysor.server is server
+    assert 'Solver' in dir(pysor) and isinstance(pysor.__version__, str)
+    try:
+        pysor.missing
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('pysor.missing did not raise')
+
+def test_import_without_extension():
+    output = run(
+        "import sys\n"
+        "sys.modules['pysor._ext.fast_sor'] = None\n"
+        "import numpy as np, pysor\n"
+        "phi, info = pysor.sor(np.ones(4), 1.0, boundary='dirichlet', full_output=True)\n"
+        "print(pysor.backends.select(1).name, info['converged'])")
+    assert output == ['numba', 'True'] or output == ['numpy', 'True']
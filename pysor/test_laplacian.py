@@ -65,3 +65,28 @@ def test_laplacian_3d_2():
             [0, 2, 0, 0, 2, -6, 0, 2],
             [0, 0, 2, 0, 2, 0, -6, 2],
             [0, 0, 0, 2, 0, 2, 2, -6]]))
+
+def test_laplacian_1d_3_dirichlet():
+    assert_array_equal(
+        laplacian_1d(3, boundary='dirichlet'),
+        np.asarray([
+            [-2, 1, 0],
+            [1, -2, 1],
+            [0, 1, -2]]))
+
+def test_laplacian_1d_3_neumann():
+    assert_array_equal(
+        laplacian_1d(3, boundary='neumann'),
+        np.asarray([
+            [-1, 1, 0],
+            [1, -2, 1],
+            [0, 1, -1]]))
+
+def test_laplacian_2d_2_mixed():
+    assert_array_equal(
+        laplacian_2d(2, boundary=('dirichlet', 'neumann')),
+        np.asarray([
+            [-3, 1, 1, 0],
+            [1, -3, 0, 1],
+            [1, 0, -3, 1],
+            [0, 1, 1, -3]]))
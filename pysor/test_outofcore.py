@@ -0,0 +1,38 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from numpy.testing import assert_array_equal
+from ._ext import fast_sor as fs
+from . import boundary as bc
+from . import outofcore as ooc
+
+def test_sor_slabs_matches_in_core():
+    sor_in_core = (fs.sor_2d, fs.sor_3d)
+    for dim in (2, 3):
+        for n in (6, 7):
+            rho = np.random.rand(*((n,) * dim))
+            for boundary in ('periodic', 'dirichlet', 'neumann', ('neumann', 'periodic', 'dirichlet')[:dim]):
+                kinds, values = bc.parse(boundary, np.random.rand(dim, 2), dim, 0.1)
+                phi = np.zeros((n + 2,) * dim)
+                sor_in_core[dim - 2](phi, rho, 1.5, 0.1, 5, -1.0, kinds, values)
+                for slab, fuse in ((1, 1), (2, 2), (n, 3)):
+                    out = np.full_like(rho, np.nan)
+                    ooc.sor_slabs(
+                        rho, out, 1.5, 0.1, kinds, values, maxiter=5, maxerr=-1.0,
+                        slab=slab, fuse=fuse)
+                    assert_array_equal(out, bc.interior(phi))
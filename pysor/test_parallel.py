@@ -0,0 +1,42 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from .api import sor
+from .parallel import map_solve
+
+def test_map_solve():
+    rhos = [np.random.rand(*shape) - 0.5 for shape in ((16,), (8, 8), (6, 6, 6), (10, 10))]
+    kwargs = dict(boundary='dirichlet', maxiter=50)
+    results = {}
+    for index, phi in map_solve(rhos, 0.1, processes=2, window=3, **kwargs):
+        assert index not in results
+        results[index] = phi
+    assert sorted(results) == list(range(len(rhos)))
+    for index, rho in enumerate(rhos):
+        assert_array_equal(results[index], sor(rho, 0.1, **kwargs))
+    naive = dict(map_solve(rhos[:2], 0.1, processes=2, fast=False, **kwargs))
+    for index, rho in enumerate(rhos[:2]):
+        assert_array_equal(naive[index], sor(rho, 0.1, fast=False, **kwargs))
+
+def test_map_solve_errors():
+    with pytest.raises(ValueError):
+        list(map_solve([np.zeros((4, 5))], 0.1, processes=1))
+    with pytest.raises(TypeError):
+        list(map_solve([np.zeros(4)], 0.1, out=np.zeros(4)))
@@ -0,0 +1,51 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import numpy as np
+from numpy.testing import assert_array_equal
+from .api import sor
+from .scheduler import BatchingSolver
+
+def test_batching_solver_coalesces():
+    rhos = [np.random.rand(8, 8) - 0.5 for i in range(6)]
+    futures = [None] * len(rhos)
+    with BatchingSolver(0.1, boundary='dirichlet', max_batch=len(rhos),
+        max_delay=10.0) as solver:
+        def submit(i):
+            futures[i] = solver.submit(rhos[i])
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(rhos))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for rho, future in zip(rhos, futures):
+            assert_array_equal(future.result(), sor(rho, 0.1, boundary='dirichlet'))
+        stats = solver.stats()
+    assert (stats['batches'], stats['solved'], stats['max_depth']) == (1, 6, 6)
+
+def test_batching_solver_groups():
+    with BatchingSolver(0.1, max_batch=3, max_delay=10.0) as solver:
+        a = [solver.submit(np.random.rand(6) - 0.5) for i in range(7)]
+        b = solver.submit(np.random.rand(4, 4) - 0.5)
+        c = solver.submit(np.random.rand(6) - 0.5, boundary='dirichlet')
+        bad = solver.submit(np.zeros((4, 5)))
+        for future in a[:6]:
+            future.result(timeout=5.0)
+    assert a[6].done() and b.done() and c.done()
+    assert isinstance(bad.exception(), ValueError)
+    assert solver.stats()['batches'] == 6 and solver.queue_depth == 0
@@ -0,0 +1,120 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from numpy.testing import assert_allclose
+from .api import sor
+from .server import Client
+from .server import Server
+from .server import ServerError
+
+def start(path, *args):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'pysor.server', '--socket', path] + list(args), env=env)
+    for i in range(300):
+        if os.path.exists(path):
+            return process
+        time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("the server did not start")
+
+@pytest.mark.parametrize('cache_bytes', [0, 1 << 20])
+def test_server_solve(tmp_path, cache_bytes):
+    path = str(tmp_path / 'pysor.sock')
+    process = start(path, '--cache-bytes', str(cache_bytes), '--plans', '2')
+    try:
+        rhos = [np.random.rand(8, 8) - 0.5, np.random.rand(6, 6, 6) - 0.5, np.random.rand(10)]
+        with Client(path) as client:
+            assert client.ping()['pid'] == process.pid
+            for rho in rhos:
+                rho -= rho.mean()
+                for kwargs in (dict(boundary='dirichlet'), dict(layout='redblack', maxerr=1.0E-9)):
+                    phi, phi_ref = client.solve(rho, 0.1, **kwargs), sor(rho, 0.1, **kwargs)
+                    if cache_bytes:
+                        assert_allclose(phi, phi_ref, rtol=0.0, atol=1.0E-3 * np.abs(phi_ref).max())
+                    else:
+                        assert_array_equal(phi, phi_ref)
+            with pytest.raises(ServerError):
+                client.solve(rhos[0], 0.1, threads=2)
+            with pytest.raises(ServerError):
+                client.solve(np.zeros((4, 5)), 0.1)
+            stats = client.stats()
+            assert stats['requests'] == 10 and stats['plans'] <= 2
+            client.shutdown()
+        assert process.wait(timeout=10.0) == 0 and not os.path.exists(path)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+def test_server_concurrent_cached_clients(tmp_path):
+    import threading
+    path = str(tmp_path / 'pysor.sock')
+    process = start(path, '--cache-bytes', str(1 << 16))
+    rhos = [np.random.rand(12, 12) - 0.5 for i in range(6)]
+    errors = []
+    def work(index):
+        try:
+            with Client(path) as client:
+                for r in range(8):
+                    rho = (r + 1.0) * rhos[(index + r) % len(rhos)]
+                    phi_ref = sor(rho, 0.1, boundary='dirichlet', maxerr=1.0E-16)
+                    phi = client.solve(rho, 0.1, boundary='dirichlet', maxerr=1.0E-16)
+                    assert_allclose(phi, phi_ref, rtol=0.0, atol=1.0E-3 * np.abs(phi_ref).max())
+        except Exception as e:
+            errors.append(e)
+    try:
+        workers = [threading.Thread(target=work, args=(i,)) for i in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert errors == []
+        with Client(path) as client:
+            stats = client.stats()
+            assert stats['cache']['hits'] + stats['cache']['misses'] == 48
+            client.shutdown()
+        assert process.wait(timeout=10.0) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+def test_server_keeps_live_socket(tmp_path):
+    import socket
+    path = str(tmp_path / 'pysor.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    Server(path).server_close()
+    assert not os.path.exists(path)
+    process = start(path)
+    try:
+        with pytest.raises(OSError):
+            Server(path)
+        with Client(path) as client:
+            assert client.ping()['pid'] == process.pid
+            client.shutdown()
+        assert process.wait(timeout=10.0) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
@@ -0,0 +1,48 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from .api import sor
+from .solver import Solver
+
+def test_solver_matches_sor():
+    for dim in (1, 2, 3):
+        for layout, threads in (('natural', 1), ('natural', 2), ('redblack', 1)):
+            kwargs = dict(boundary='dirichlet', boundary_value=0.3, layout=layout, threads=threads)
+            solver = Solver((7,) * dim, 0.1, epsilon=2.0, **kwargs)
+            for i in range(2):
+                rho = np.random.rand(*((7,) * dim)) - 0.5
+                assert_array_equal(solver(rho), sor(rho, 0.1, epsilon=2.0, **kwargs))
+
+def test_solver_out():
+    solver = Solver((6, 6), 0.1)
+    rho = np.random.rand(6, 6) - 0.5
+    out = np.zeros((6, 6))
+    assert solver.solve(rho, out=out) is out
+    assert_array_equal(out, sor(rho, 0.1))
+    with pytest.raises(ValueError):
+        solver(np.zeros((5, 5)))
+
+def test_solver_invalid():
+    with pytest.raises(ValueError):
+        Solver((4, 5), 0.1)
+    with pytest.raises(ValueError):
+        Solver((4, 4), 0.1, method='multigrid')
+    with pytest.raises(ValueError):
+        Solver((4, 4, 4, 4), 0.1)
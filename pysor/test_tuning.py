@@ -0,0 +1,83 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+from .api import sor
+from . import backends as bk
+from . import tuning
+
+@pytest.fixture
+def path(tmpdir, monkeypatch):
+    path = str(tmpdir.join('tuning.json'))
+    monkeypatch.setenv('PYSOR_TUNING', path)
+    yield path
+    tuning._entries.pop(path, None)
+
+def test_tune_persists_winner(path):
+    result = tuning.tune((12, 12), iterations=2, repeat=1, threads=2)
+    timings = result['timings']
+    assert len(timings) == len(tuning.candidates(2, 2)) and 'python' not in [t[0] for t in timings]
+    assert result['seconds'] == min(t[3] for t in timings)
+    with open(path) as f:
+        entry = json.load(f)['2d/12']
+    assert entry['backend'] == result['backend'] and entry['threads'] == result['threads']
+    assert tuning.lookup((20, 20)) == entry
+    assert tuning.lookup((30, 30)) is None and tuning.lookup((12,)) is None
+
+def test_sor_uses_tuned_configuration(path):
+    calls = []
+    def function(rho, h, **kwargs):
+        calls.append((kwargs['layout'], kwargs['threads']))
+        return bk.get('numpy').function(rho, h, **kwargs)
+    bk.register(bk.Backend('tuned', function, priority=-1, threads=True))
+    try:
+        tuning.tune((8, 8, 8), configurations=[('tuned', 'natural', 3)], iterations=1, repeat=1)
+        rho = np.random.rand(8, 8, 8) - 0.5
+        calls[:] = []
+        phi = sor(rho, 0.1)
+        assert calls == [('natural', 3)]
+        sor(rho, 0.1, threads=2)
+        assert calls[-1] == ('natural', 2)
+        sor(rho, 0.1, layout='redblack')
+        assert len(calls) == 2
+        assert_array_equal(phi, sor(rho, 0.1, backend='c'))
+    finally:
+        bk.unregister('tuned')
+    assert_array_equal(phi, sor(rho, 0.1))
+    assert tuning.lookup((8, 8, 8))['backend'] == 'tuned'
+
+def test_sor_skips_single_threaded_tuned_backend(path):
+    calls = []
+    def single(rho, h, **kwargs):
+        calls.append(kwargs['threads'])
+        return bk.get('numpy').function(rho, h, **kwargs)
+    bk.register(bk.Backend('single', single, priority=-1))
+    bk.register(bk.Backend('multi', bk.get('numpy').function, priority=-2, threads=True))
+    try:
+        tuning.tune((8, 8), configurations=[('single', 'natural', 1)], iterations=1, repeat=1)
+        rho = np.random.rand(8, 8) - 0.5
+        calls[:] = []
+        phi = sor(rho, 0.1, threads=1)
+        assert calls == [1]
+        assert_array_equal(sor(rho, 0.1, threads=4), phi)
+        assert calls == [1]
+    finally:
+        bk.unregister('single')
+        bk.unregister('multi')
@@ -0,0 +1,167 @@
+#   PySOR - solve Poisson's equation with successive over-relaxation.
+#   Copyright (C) 2017  Christoph Wehmeyer
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+r"""Tune the backend, layout, and thread count of api.sor() per grid size and machine.
+
+tune() times a few iterations of each candidate configuration on a random density and
+stores the fastest one in a JSON file per host (by default
+$XDG_CACHE_HOME/pysor/tuning-<hostname>.json, or the file named by $PYSOR_TUNING). Later
+calls of api.sor() with backend='auto' use the stored configuration of the closest tuned
+grid size of the same dimension for every parameter (layout, threads) left at None. All
+candidates produce the same potential, so tuning only changes the run time.
+
+"""
+
+import os
+import json
+import time
+import socket
+import tempfile
+import numpy as np
+from . import backends as bk
+
+#   Tuned sizes serve requests within this factor of their n.
+REACH = 2.0
+
+_entries = dict()
+
+def default_path():
+    r"""The per-host tuning file."""
+    path = os.environ.get('PYSOR_TUNING')
+    if path:
+        return path
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'pysor', 'tuning-%s.json' % socket.gethostname())
+
+def load(path=None):
+    r"""The tuned configurations keyed by '<dim>d/<n>', read once per path and process."""
+    path = default_path() if path is None else path
+    if path not in _entries:
+        try:
+            with open(path) as f:
+                _entries[path] = json.load(f)
+        except (IOError, ValueError):
+            _entries[path] = dict()
+    return _entries[path]
+
+def save(entries, path=None):
+    r"""Write the tuned configurations atomically and refresh the in-process copy."""
+    path = default_path() if path is None else path
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entries, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    _entries[path] = entries
+
+def lookup(shape, path=None):
+    r"""The tuned configuration (dict with 'backend', 'layout', 'threads') for grids of
+    this shape, taken from the closest tuned n of the same dimension within a factor of
+    REACH; None if there is none."""
+    entries = load(path)
+    if not entries or len(shape) == 0:
+        return None
+    dim, n = len(shape), shape[0]
+    best, distance = None, np.log(REACH)
+    for key, entry in entries.items():
+        d, size = key.split('d/')
+        if int(d) == dim and n > 0:
+            gap = abs(np.log(float(size) / n))
+            if gap <= distance:
+                best, distance = entry, gap
+    return best
+
+def candidates(dim, threads=None):
+    r"""The (backend, layout, threads) triples worth timing for dim-D grids: every
+    available backend but the reference one, each supported layout, and for threaded
+    backends powers of two up to the given or available number of threads."""
+    if threads is None:
+        threads = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= threads:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != threads:
+        counts.append(threads)
+    triples = []
+    for name in bk.names(available=True):
+        backend = bk.get(name)
+        if name == 'python' or not backend.supports(dim):
+            continue
+        for layout in backend.layouts:
+            for count in (counts if backend.threads and layout == 'natural' else [1]):
+                triples.append((name, layout, count))
+    return triples
+
+def tune(shape, h=1.0, boundary='periodic', iterations=20, repeat=3, threads=None,
+    configurations=None, path=None, save_result=True):
+    r"""Find the fastest configuration of api.sor() for grids of this shape.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The grid shape (n,) * dim.
+    h : float, optional, default=1.0
+        The grid spacing of the benchmark problem.
+    boundary : str or sequence of str, optional, default='periodic'
+        The boundary condition of the benchmark problem.
+    iterations : int, optional, default=20
+        The number of SOR iterations per timing.
+    repeat : int, optional, default=3
+        The number of timings per configuration; the fastest one counts.
+    threads : int, optional, default=None
+        The largest thread count to try; all available cores by default.
+    configurations : sequence of (str, str, int), optional, default=None
+        The (backend, layout, threads) triples to time instead of candidates().
+    path : str, optional, default=None
+        The tuning file, default_path() by default.
+    save_result : boolean, optional, default=True
+        Store the winner in the tuning file.
+
+    Returns
+    -------
+    dict
+        The winning 'backend', 'layout', and 'threads', its 'seconds' per iteration, and
+        the 'timings' of all configurations as (backend, layout, threads, seconds).
+
+    """
+    from .api import sor
+    shape = tuple(shape)
+    dim = len(shape)
+    if dim not in (1, 2, 3) or shape != (shape[0],) * dim:
+        raise ValueError("shape must be (n,) * dim with dim=1, 2, 3; got %s" % (shape,))
+    if configurations is None:
+        configurations = candidates(dim, threads)
+    rho = np.random.RandomState(0).rand(*shape) - 0.5
+    timings = []
+    for backend, layout, count in configurations:
+        kwargs = dict(
+            boundary=boundary, maxerr=0.0, backend=backend, layout=layout, threads=count)
+        sor(rho, h, maxiter=1, **kwargs)
+        best = np.inf
+        for r in range(repeat):
+            start = time.perf_counter()
+            sor(rho, h, maxiter=iterations, **kwargs)
+            best = min(best, (time.perf_counter() - start) / iterations)
+        timings.append((backend, layout, count, best))
+    backend, layout, count, seconds = min(timings, key=lambda t: t[3])
+    winner = dict(backend=backend, layout=layout, threads=count, seconds=seconds)
+    if save_result:
+        entries = dict(load(path))
+        entries['%dd/%d' % (dim, shape[0])] = winner
+        save(entries, path)
+    return dict(winner, timings=timings)
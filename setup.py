@@ -33,14 +33,38 @@ class lazy_cythonize(list):
     def __getitem__(self, ii): return self.c_list()[ii]
     def __len__(self): return len(self.c_list())
 
+def openmp_flags():
+    """compile and link flags for OpenMP; falls back to the simd pragmas only
+    if the compiler cannot build a minimal OpenMP program"""
+    import tempfile
+    import shutil
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    tmp = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp, 'omp.c')
+        with open(src, 'w') as f:
+            f.write("#include <omp.h>\nint main(void) { return omp_get_max_threads() < 1; }\n")
+        objs = compiler.compile([src], output_dir=tmp, extra_postargs=["-fopenmp"])
+        compiler.link_executable(objs, os.path.join(tmp, 'omp'), extra_postargs=["-fopenmp"])
+    except Exception:
+        return ["-fopenmp-simd"], []
+    finally:
+        shutil.rmtree(tmp)
+    return ["-fopenmp"], ["-fopenmp"]
+
 def extensions():
     from numpy import get_include
     from Cython.Build import cythonize
+    compile_omp, link_omp = openmp_flags()
     ext_fast_sor = Extension(
         "pysor._ext.fast_sor",
         sources=["pysor/_ext/fast_sor.pyx", "pysor/_ext/src_fast_sor.c"],
         include_dirs=[get_include()],
-        extra_compile_args=["-O3", "-std=c99"])
+        extra_compile_args=["-O3", "-std=c99"] + compile_omp,
+        extra_link_args=link_omp)
     exts = [ext_fast_sor]
     return cythonize(exts)
 
@@ -105,10 +129,15 @@ setup(
     license='GPLv3+',
     packages=[
         'pysor',
-        'pysor._ext'],
+        'pysor._ext',
+        'pysor.benchmarks'],
     setup_requires=[
         'numpy>=1.7.0',
         'cython>=0.22',
         'setuptools>=0.6'],
     install_requires=['numpy>=1.7.0'],
+    extras_require={'numba': ['numba>=0.49']},
+    entry_points={'console_scripts': [
+        'pysor-server = pysor.server:main',
+        'pysor-benchmarks = pysor.benchmarks.suite:main']},
     tests_require=['pytest'])